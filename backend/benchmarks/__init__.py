@@ -0,0 +1,5 @@
+"""
+Script Name : __init__.py
+Description : Marks benchmarks/ as a package
+Author      : @tonybnya
+"""
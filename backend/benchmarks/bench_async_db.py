@@ -0,0 +1,84 @@
+"""
+Script Name : bench_async_db.py
+Description : p50/p99 latency of /bmi/categories/{id}, sync vs async DB stack
+Author      : @tonybnya
+
+Usage: python -m benchmarks.bench_async_db [--requests N] [--concurrency C]
+
+The category cache is disabled so every request reaches the database.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{Path(_tmp.name) / 'bench.db'}"
+
+import httpx  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+from bmi_app.core.cache import category_cache  # noqa: E402
+from bmi_app.core.category_index import DEFAULT_CATEGORIES  # noqa: E402
+from bmi_app.core.config import get_settings  # noqa: E402
+from bmi_app.database import create_tables, engine  # noqa: E402
+from bmi_app.main import app  # noqa: E402
+from bmi_app.models import Category  # noqa: E402
+
+
+async def measure(requests: int, concurrency: int) -> list[float]:
+    """
+    Fire `requests` GETs, at most `concurrency` in flight, return latencies.
+    """
+    latencies: list[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one(i: int):
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.get(f"/bmi/categories/{i % 6 + 1}")
+                latencies.append(time.perf_counter() - start)
+                response.raise_for_status()
+
+        await asyncio.gather(*(one(i) for i in range(requests)))
+    return latencies
+
+
+def percentile(values: list[float], q: float) -> float:
+    return statistics.quantiles(values, n=100, method="inclusive")[int(q) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    args = parser.parse_args()
+
+    create_tables()
+    with engine.begin() as conn:
+        conn.execute(insert(Category), DEFAULT_CATEGORIES)
+    category_cache.ttl = 0
+
+    settings = get_settings()
+    print(f"{args.requests} requests, {args.concurrency} concurrent")
+    print(f"{'stack':>6} {'req/s':>10} {'p50 ms':>9} {'p99 ms':>9}")
+    for db_async in (False, True):
+        settings.db_async = db_async
+        start = time.perf_counter()
+        latencies = asyncio.run(measure(args.requests, args.concurrency))
+        elapsed = time.perf_counter() - start
+        print(
+            f"{'async' if db_async else 'sync':>6} "
+            f"{args.requests / elapsed:>10,.0f} "
+            f"{percentile(latencies, 50) * 1000:>9.2f} "
+            f"{percentile(latencies, 99) * 1000:>9.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
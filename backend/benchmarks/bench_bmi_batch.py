@@ -0,0 +1,66 @@
+"""
+Script Name : bench_bmi_batch.py
+Description : Rows/second of POST /bmi/batch against the scalar POST /bmi/
+Author      : @tonybnya
+
+Usage: python -m benchmarks.bench_bmi_batch [--rows N]
+"""
+import argparse
+import random
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from bmi_app.api import routes_bmi
+
+HEIGHTS = {"m": (1.45, 2.05), "cm": (145, 205), "in": (57, 81)}
+WEIGHTS = {"kg": (40, 150), "lb": (88, 330)}
+
+
+def make_records(rows: int, seed: int = 42) -> list[dict]:
+    """
+    Build random height/weight records with mixed units.
+    """
+    rng = random.Random(seed)
+    records = []
+    for _ in range(rows):
+        height_unit = rng.choice(list(HEIGHTS))
+        weight_unit = rng.choice(list(WEIGHTS))
+        records.append({
+            "height": round(rng.uniform(*HEIGHTS[height_unit]), 2),
+            "height_unit": height_unit,
+            "weight": round(rng.uniform(*WEIGHTS[weight_unit]), 1),
+            "weight_unit": weight_unit,
+        })
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=5000)
+    args = parser.parse_args()
+
+    # Only the BMI router: the benchmark must not depend on a database
+    app = FastAPI()
+    app.include_router(routes_bmi.router, prefix="/bmi")
+    client = TestClient(app)
+    records = make_records(args.rows)
+
+    start = time.perf_counter()
+    for record in records:
+        client.post("/bmi/", json=record).raise_for_status()
+    scalar = time.perf_counter() - start
+
+    start = time.perf_counter()
+    client.post("/bmi/batch", json={"records": records}).raise_for_status()
+    batch = time.perf_counter() - start
+
+    print(f"rows            : {args.rows}")
+    print(f"POST /bmi/      : {args.rows / scalar:12,.0f} rows/s ({scalar:.3f}s)")
+    print(f"POST /bmi/batch : {args.rows / batch:12,.0f} rows/s ({batch:.3f}s)")
+    print(f"speedup         : {scalar / batch:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
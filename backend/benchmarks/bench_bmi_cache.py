@@ -0,0 +1,55 @@
+"""
+Script Name : bench_bmi_cache.py
+Description : Latency of POST /bmi/ with and without the response cache
+Author      : @tonybnya
+
+Usage: python -m benchmarks.bench_bmi_cache [--requests N] [--distinct K]
+
+Calls the route function directly (no HTTP client in the way), cycling
+over K distinct inputs, once with the cache disabled and once enabled.
+"""
+import argparse
+import time
+
+from bmi_app.api import routes_bmi
+from bmi_app.core.cache import bmi_cache
+from bmi_app.schemas import BMICalculateRequest
+
+
+def run(requests: list[BMICalculateRequest], capacity: int) -> float:
+    """
+    Call the endpoint for every request, return microseconds per call.
+    """
+    bmi_cache.capacity = capacity
+    bmi_cache.clear()
+    bmi_cache.hits = bmi_cache.misses = bmi_cache.evictions = 0
+    started = time.perf_counter()
+    for request in requests:
+        routes_bmi.calculate_bmi_endpoint(request)
+    return (time.perf_counter() - started) / len(requests) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200_000)
+    parser.add_argument("--distinct", type=int, default=50)
+    args = parser.parse_args()
+
+    inputs = [
+        BMICalculateRequest(
+            height=150 + i % 50, height_unit="cm",
+            weight=50 + i % 40, weight_unit="kg"
+        )
+        for i in range(args.distinct)
+    ]
+    requests = [inputs[i % args.distinct] for i in range(args.requests)]
+
+    uncached = run(requests, capacity=0)
+    cached = run(requests, capacity=args.distinct)
+    print(f"{'uncached':>9} {uncached:8.2f} us/request")
+    print(f"{'cached':>9} {cached:8.2f} us/request  ({uncached / cached:.1f}x)")
+    print(bmi_cache.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Script Name : bench_db_concurrency.py
+Description : Concurrent read throughput of the engine, per thread count
+Author      : @tonybnya
+
+Usage: python -m benchmarks.bench_db_concurrency [--rows N] [--seconds S]
+
+Runs the same read query from 1..N threads against a seeded file
+database, once with the old single shared connection (StaticPool) and
+once with the pooled, WAL-mode engine built from Settings.
+"""
+import argparse
+import random
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from bmi_app.core.category_index import DEFAULT_CATEGORIES
+from bmi_app.core.config import Settings
+from bmi_app.database import build_engine
+from bmi_app.models import Base, Category, HeightUnit, Measurement, User, WeightUnit
+
+
+def seed(engine, rows: int, users: int = 1000) -> list[str]:
+    """
+    Fill the database with categories, users and measurements.
+    """
+    rng = random.Random(7)
+    user_ids = [str(uuid.uuid4()) for _ in range(users)]
+    with engine.begin() as conn:
+        conn.execute(insert(Category), DEFAULT_CATEGORIES)
+        conn.execute(insert(User), [
+            {"id": user_id, "username": f"user{i}", "email": f"user{i}@example.com", "password_hash": "x"}
+            for i, user_id in enumerate(user_ids)
+        ])
+        batch = []
+        for _ in range(rows):
+            height_m = rng.uniform(1.5, 2.0)
+            weight_kg = rng.uniform(45, 120)
+            batch.append({
+                "user_id": rng.choice(user_ids),
+                "category_id": 1,
+                "height": height_m, "height_unit": HeightUnit.M,
+                "weight": weight_kg, "weight_unit": WeightUnit.KG,
+                "height_m": height_m, "weight_kg": weight_kg,
+                "bmi": weight_kg / height_m ** 2,
+            })
+            if len(batch) == 10000:
+                conn.execute(insert(Measurement), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(Measurement), batch)
+    return user_ids
+
+
+def run(session_factory, user_ids: list[str], threads: int, seconds: float) -> float:
+    """
+    Hammer the database from `threads` threads, return queries per second.
+    """
+    counts = [0] * threads
+    deadline = time.perf_counter() + seconds
+
+    def worker(slot: int):
+        rng = random.Random(slot)
+        while time.perf_counter() < deadline:
+            with session_factory() as db:
+                db.execute(
+                    select(func.avg(Measurement.bmi), func.count())
+                    .where(Measurement.user_id == rng.choice(user_ids))
+                ).one()
+            counts[slot] += 1
+
+    pool = [threading.Thread(target=worker, args=(slot,)) for slot in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return sum(counts) / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--max-threads", type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{Path(tmp) / 'bench.db'}"
+        pooled = build_engine(Settings(database_url=url, db_pool_size=args.max_threads))
+        Base.metadata.create_all(pooled)
+        user_ids = seed(pooled, args.rows)
+
+        shared = create_engine(
+            url, connect_args={"check_same_thread": False}, poolclass=StaticPool
+        )
+        lock = threading.Lock()
+        shared_factory = sessionmaker(bind=shared)
+
+        def serialized_session():
+            # One sqlite3 connection cannot run statements from two threads
+            # at once; this is what sharing it amounts to
+            class Locked:
+                def __enter__(self):
+                    lock.acquire()
+                    self.db = shared_factory()
+                    return self.db
+
+                def __exit__(self, *exc):
+                    self.db.close()
+                    lock.release()
+            return Locked()
+
+        pooled_factory = sessionmaker(bind=pooled)
+        print(f"{'threads':>7} {'StaticPool q/s':>15} {'pooled+WAL q/s':>15}")
+        threads = 1
+        while threads <= args.max_threads:
+            before = run(serialized_session, user_ids, threads, args.seconds)
+            after = run(pooled_factory, user_ids, threads, args.seconds)
+            print(f"{threads:>7} {before:>15,.0f} {after:>15,.0f}")
+            threads *= 2
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Script Name : bench_import.py
+Description : Import time of the API process, checked against a budget
+Author      : @tonybnya
+
+Usage: python -m benchmarks.bench_import [--repeat R] [--budget-ms MS] [--top N]
+
+Imports bmi_app.main in fresh interpreters under `-X importtime` and
+reports the best total, the share of each top-level package and the
+slowest modules by self time. Exits with status 1 when the best total
+exceeds --budget-ms, or when a module that should load on first use
+(numpy, the async SQLite driver, CRUD modules) was imported.
+"""
+import argparse
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+# The app imports in ~800 ms on a small single-core VM, and took ~100 ms
+# more when numpy, the CRUD modules and the engines were loaded eagerly
+DEFAULT_BUDGET_MS = 1000.0
+# Loaded on first use, never by the import of the app
+DEFERRED = ("numpy", "aiosqlite", "bmi_app.crud.")
+
+
+def import_times(module: str) -> list[tuple[str, int, int]]:
+    """
+    (module, self us, cumulative us) for `module` and everything its
+    import pulled in, in a fresh interpreter; `module` comes last.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=Path(__file__).parent.parent,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        # Nested imports are indented by two spaces per level
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+
+    # Modules are listed after their imports: walk back from `module` over
+    # its subtree, leaving out what the interpreter imported at startup
+    end = next(i for i, row in enumerate(rows) if row[0] == module and row[3] == 0)
+    start = end
+    while start > 0 and rows[start - 1][3] > 0:
+        start -= 1
+    return [row[:3] for row in rows[start:end + 1]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--module", default="bmi_app.main")
+    parser.add_argument("--repeat", type=int, default=5, help="Best of this many interpreters")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    runs = [import_times(args.module) for _ in range(args.repeat)]
+    best = min(runs, key=lambda rows: rows[-1][2])
+    total_ms = best[-1][2] / 1000
+
+    packages: dict[str, int] = defaultdict(int)
+    for name, self_us, _ in best:
+        packages[name.split(".")[0]] += self_us
+    print(f"import {args.module}: {total_ms:.1f} ms (best of {args.repeat})\n")
+    print(f"{'package':<30} {'ms':>8}")
+    for package, self_us in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{package:<30} {self_us / 1000:>8.1f}")
+
+    print(f"\n{'module (self time)':<50} {'ms':>8}")
+    for name, self_us, _ in sorted(best, key=lambda row: -row[1])[:args.top]:
+        print(f"{name:<50} {self_us / 1000:>8.1f}")
+
+    failures = []
+    eager = sorted({name for name, _, _ in best if name.startswith(DEFERRED) or name in DEFERRED})
+    if eager:
+        failures.append(f"imported eagerly: {', '.join(eager)}")
+    if total_ms > args.budget_ms:
+        failures.append(f"{total_ms:.1f} ms is over the {args.budget_ms:.0f} ms budget")
+    for failure in failures:
+        print(f"\nFAIL: {failure}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+    print(f"\nOK: within the {args.budget_ms:.0f} ms budget")
+
+
+if __name__ == "__main__":
+    main()
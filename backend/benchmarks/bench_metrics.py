@@ -0,0 +1,72 @@
+"""
+Script Name : bench_metrics.py
+Description : Overhead of the metrics middleware and SQL instrumentation
+Author      : @tonybnya
+
+Usage: python -m benchmarks.bench_metrics [--seconds S] [--repeat R]
+
+Requests/second of POST /bmi/ through the ASGI app with and without
+MetricsMiddleware, and statements/second on an in-memory engine with and
+without the cursor-execute listeners.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from fastapi import FastAPI
+from sqlalchemy import create_engine, text
+
+from bmi_app.api import routes_bmi
+from bmi_app.core.metrics import MetricsMiddleware, instrument_engine
+
+from .bench_bmi_batch import make_records
+from .bench_serialization import requests_per_second
+
+
+def statements_per_second(engine, seconds: float) -> float:
+    """
+    Run a trivial SELECT in a loop on one connection.
+    """
+    done = 0
+    with engine.connect() as conn:
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            conn.execute(text("SELECT 1")).scalar()
+            done += 1
+    return done / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=1.0)
+    parser.add_argument("--repeat", type=int, default=5, help="Best of this many runs")
+    args = parser.parse_args()
+
+    bodies = [json.dumps(record).encode() for record in make_records(50)]
+    plain = FastAPI()
+    plain.include_router(routes_bmi.router, prefix="/bmi")
+    measured = FastAPI()
+    measured.include_router(routes_bmi.router, prefix="/bmi")
+    measured.add_middleware(MetricsMiddleware)
+
+    plain_engine = create_engine("sqlite://")
+    measured_engine = create_engine("sqlite://")
+    instrument_engine(measured_engine, "bench")
+
+    modes = (("without", plain, plain_engine), ("with metrics", measured, measured_engine))
+    best = {label: [0.0, 0.0] for label, _, _ in modes}
+    # Interleaved so warm-up and machine noise hit both modes alike
+    for _ in range(args.repeat):
+        for label, app, engine in modes:
+            rps = asyncio.run(requests_per_second(app, "/bmi/", bodies, args.seconds))
+            sps = statements_per_second(engine, args.seconds)
+            best[label] = [max(best[label][0], rps), max(best[label][1], sps)]
+
+    print(f"{'':>14} {'/bmi/ req/s':>12} {'SELECT 1/s':>11}")
+    for label, (rps, sps) in best.items():
+        print(f"{label:>14} {rps:>12,.0f} {sps:>11,.0f}")
+
+
+if __name__ == "__main__":
+    main()
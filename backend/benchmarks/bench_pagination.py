@@ -0,0 +1,108 @@
+"""
+Script Name : bench_pagination.py
+Description : OFFSET vs keyset pagination of measurement history
+Author      : @tonybnya
+
+Usage: python -m benchmarks.bench_pagination [--rows N] [--depth D] [--limit L]
+
+Seeds a file database with --rows measurements spread over a handful of
+users, then times fetching page --depth of one user's history with
+get_measurements_by_user (OFFSET) and get_measurements_by_user_page
+(cursor), plus the first page of each for reference.
+"""
+import argparse
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+
+from bmi_app.core.category_index import DEFAULT_CATEGORIES
+from bmi_app.core.config import Settings
+from bmi_app.crud.measurements import (encode_cursor, get_measurements_by_user,
+                                       get_measurements_by_user_page)
+from bmi_app.database import build_engine
+from bmi_app.models import Base, Category, HeightUnit, Measurement, User, WeightUnit
+
+
+def seed(engine, rows: int, users: int) -> list[str]:
+    """
+    Insert `rows` measurements round-robin over `users` users.
+    """
+    rng = random.Random(11)
+    user_ids = [f"user-{i}" for i in range(users)]
+    start = datetime(2015, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(insert(Category), DEFAULT_CATEGORIES)
+        conn.execute(insert(User), [
+            {"id": user_id, "username": user_id, "email": f"{user_id}@example.com", "password_hash": "x"}
+            for user_id in user_ids
+        ])
+        for chunk_start in range(0, rows, 50_000):
+            batch = []
+            for i in range(chunk_start, min(rows, chunk_start + 50_000)):
+                height_m = rng.uniform(1.5, 2.0)
+                weight_kg = rng.uniform(45, 120)
+                batch.append({
+                    "user_id": user_ids[i % users],
+                    "category_id": 1,
+                    "height": height_m, "height_unit": HeightUnit.M,
+                    "weight": weight_kg, "weight_unit": WeightUnit.KG,
+                    "height_m": height_m, "weight_kg": weight_kg,
+                    "bmi": weight_kg / height_m ** 2,
+                    "recorded_at": start + timedelta(minutes=i),
+                })
+            conn.execute(insert(Measurement), batch)
+    return user_ids
+
+
+def best_of(fn, repeat: int = 5) -> float:
+    """
+    Fastest of `repeat` runs, in milliseconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=5)
+    parser.add_argument("--depth", type=int, default=10_000, help="Page number to fetch")
+    parser.add_argument("--limit", type=int, default=20, help="Rows per page")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = build_engine(Settings(database_url=f"sqlite:///{Path(tmp) / 'bench.db'}"))
+        Base.metadata.create_all(engine)
+        print(f"seeding {args.rows:,} measurements...")
+        user_ids = seed(engine, args.rows, args.users)
+        user_id = user_ids[0]
+
+        with sessionmaker(bind=engine)() as db:
+            skip = args.depth * args.limit
+            # The cursor a client would hold after walking to this depth
+            previous = get_measurements_by_user(db, user_id, limit=1, skip=skip - 1)
+            if not previous:
+                parser.error("--depth is past the end of the user's history")
+            cursor = encode_cursor(previous[0])
+
+            print(f"page {args.depth:,} of {args.limit} rows (offset {skip:,})")
+            print(f"{'':>8} {'first page ms':>14} {'deep page ms':>13}")
+            print(f"{'OFFSET':>8} "
+                  f"{best_of(lambda: get_measurements_by_user(db, user_id, args.limit)):>14.2f} "
+                  f"{best_of(lambda: get_measurements_by_user(db, user_id, args.limit, skip)):>13.2f}")
+            print(f"{'keyset':>8} "
+                  f"{best_of(lambda: get_measurements_by_user_page(db, user_id, args.limit)):>14.2f} "
+                  f"{best_of(lambda: get_measurements_by_user_page(db, user_id, args.limit, cursor)):>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Script Name : bench_serialization.py
+Description : Requests/second per core of POST /bmi/ and /bmi/batch by encoding mode
+Author      : @tonybnya
+
+Usage: python -m benchmarks.bench_serialization [--seconds S] [--repeat R] [--batch N]
+
+Drives the ASGI app in-process from one thread (no sockets, no client
+library), so the numbers are the cost of FastAPI plus the route on one
+core. "before" is the original route returning a BMICalculateResponse
+through response_model; the other rows are the current route with the
+response cache off/on and `fast_json` off/on.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from fastapi import APIRouter, FastAPI
+
+from bmi_app.api import routes_bmi
+from bmi_app.core.cache import bmi_cache
+from bmi_app.core.config import get_settings
+from bmi_app.core.serialization import orjson
+from bmi_app.core.utils import (calculate_bmi, categorize, get_formula, to_kg,
+                                to_meters)
+from bmi_app.schemas import BMICalculateRequest, BMICalculateResponse
+
+from .bench_bmi_batch import make_records
+
+before = APIRouter()
+
+
+@before.post("/", response_model=BMICalculateResponse)
+def calculate_bmi_before(data: BMICalculateRequest):
+    height_m = to_meters(data.height, data.height_unit)
+    weight_kg = to_kg(data.weight, data.weight_unit)
+    bmi, bmi_raw = calculate_bmi(height_m, weight_kg)
+    return BMICalculateResponse(
+        height=data.height,
+        weight=data.weight,
+        bmi=bmi,
+        bmi_raw=bmi_raw,
+        category=categorize(bmi),
+        formula=get_formula(bmi_raw, height_m, weight_kg)
+    )
+
+
+async def requests_per_second(app: FastAPI, path: str, bodies: list[bytes], seconds: float) -> float:
+    """
+    Call the app with POST `path` requests, cycling over `bodies`.
+    """
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    done = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        body = bodies[done % len(bodies)]
+
+        async def receive(body=body):
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+            "method": "POST", "scheme": "http", "path": path, "raw_path": path.encode(),
+            "root_path": "", "query_string": b"",
+            "headers": [(b"content-type", b"application/json"),
+                        (b"content-length", str(len(body)).encode())],
+            "client": ("127.0.0.1", 1), "server": ("127.0.0.1", 80),
+        }
+        await app(scope, receive, send)
+        assert messages[0]["status"] == 200, messages
+        messages.clear()
+        done += 1
+    return done / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=1.0)
+    parser.add_argument("--repeat", type=int, default=5, help="Best of this many runs")
+    parser.add_argument("--distinct", type=int, default=50, help="Distinct /bmi/ inputs")
+    parser.add_argument("--batch", type=int, default=1000, help="Records per /bmi/batch request")
+    args = parser.parse_args()
+
+    settings = get_settings()
+    records = make_records(args.distinct)
+    single = [json.dumps(record).encode() for record in records]
+    batch = [json.dumps({"records": make_records(args.batch)}).encode()]
+
+    old_app = FastAPI()
+    old_app.include_router(before, prefix="/bmi")
+    # Registered second: only serves /bmi/batch, which "before" shares
+    # with "pydantic" (it returned its dict through response_model)
+    old_app.include_router(routes_bmi.router, prefix="/bmi")
+    app = FastAPI()
+    app.include_router(routes_bmi.router, prefix="/bmi")
+
+    modes = [("before", old_app, 0, False), ("pydantic", app, 0, False)]
+    if orjson is not None:
+        modes.append(("orjson", app, 0, True))
+    modes.append(("cached", app, args.distinct, False))
+    if orjson is not None:
+        modes.append(("cached+orjson", app, args.distinct, True))
+    else:
+        print("orjson is not installed: skipping the fast_json modes")
+
+    print(f"{'mode':>14} {'/bmi/ req/s':>12} {'/bmi/batch req/s':>17}")
+    for label, target, capacity, fast in modes:
+        settings.fast_json = fast
+        bmi_cache.capacity = capacity
+        bmi_cache.clear()
+        single_rps = max(
+            asyncio.run(requests_per_second(target, "/bmi/", single, args.seconds))
+            for _ in range(args.repeat)
+        )
+        batch_rps = max(
+            asyncio.run(requests_per_second(target, "/bmi/batch", batch, args.seconds))
+            for _ in range(args.repeat)
+        )
+        print(f"{label:>14} {single_rps:>12,.0f} {batch_rps:>17,.1f}")
+
+
+if __name__ == "__main__":
+    main()
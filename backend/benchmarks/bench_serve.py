@@ -0,0 +1,125 @@
+"""
+Script Name : bench_serve.py
+Description : Requests/second of `python -m bmi_app serve` by worker count
+Author      : @tonybnya
+
+Usage: python -m benchmarks.bench_serve [--workers 1,2,4] [--seconds S]
+                                        [--connections C] [--clients P]
+
+Starts the server for every worker count and drives POST /bmi/ over
+keep-alive connections from P client processes (raw HTTP/1.1 on asyncio,
+so the client costs little next to the server). Scaling is the req/s
+over (one worker's req/s x workers). Leave cores for the clients: with
+W workers and P clients, W + P should not exceed the CPU count.
+"""
+import argparse
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import time
+from multiprocessing import Pool
+from pathlib import Path
+
+BODY = b'{"height": 175, "height_unit": "cm", "weight": 70, "weight_unit": "kg"}'
+
+
+def request_bytes(host: str, port: int) -> bytes:
+    return (
+        f"POST /bmi/ HTTP/1.1\r\nHost: {host}:{port}\r\n"
+        f"Content-Type: application/json\r\nContent-Length: {len(BODY)}\r\n\r\n"
+    ).encode() + BODY
+
+
+async def drive(host: str, port: int, connections: int, seconds: float) -> int:
+    """
+    Requests completed over `connections` keep-alive connections.
+    """
+    request = request_bytes(host, port)
+    deadline = time.perf_counter() + seconds
+
+    async def connection() -> int:
+        reader, writer = await asyncio.open_connection(host, port)
+        done = 0
+        while time.perf_counter() < deadline:
+            writer.write(request)
+            head = await reader.readuntil(b"\r\n\r\n")
+            assert head.startswith(b"HTTP/1.1 200"), head
+            length = next(
+                int(line.split(b":", 1)[1])
+                for line in head.split(b"\r\n") if line.lower().startswith(b"content-length:")
+            )
+            await reader.readexactly(length)
+            done += 1
+        writer.close()
+        return done
+
+    return sum(await asyncio.gather(*(connection() for _ in range(connections))))
+
+
+def client(args: tuple) -> int:
+    return asyncio.run(drive(*args))
+
+
+def wait_for_port(host: str, port: int, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            asyncio.run(asyncio.wait_for(asyncio.open_connection(host, port), 1))
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default=None, help="Comma-separated worker counts (default: 1, 2, 4... up to CPUs / 2)")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--connections", type=int, default=32, help="Connections per client process")
+    parser.add_argument("--clients", type=int, default=None, help="Client processes (default: worker count)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--reuse-port", action="store_true")
+    args = parser.parse_args()
+
+    if args.workers:
+        counts = [int(count) for count in args.workers.split(",")]
+    else:
+        counts = [1]
+        while counts[-1] * 2 <= max(1, (os.cpu_count() or 1) // 2):
+            counts.append(counts[-1] * 2)
+
+    host = "127.0.0.1"
+    base = None
+    print(f"{'workers':>8} {'req/s':>10} {'scaling':>8}")
+    for workers in counts:
+        command = [
+            sys.executable, "-m", "bmi_app", "serve", "--host", host, "--port", str(args.port),
+            "--workers", str(workers), "--preload",
+        ]
+        if args.reuse_port:
+            command.append("--reuse-port")
+        server = subprocess.Popen(
+            command, cwd=Path(__file__).parent.parent,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            env={**os.environ, "METRICS_ENABLED": "false"}
+        )
+        try:
+            wait_for_port(host, args.port)
+            # Warm up every worker (category index, caches)
+            client((host, args.port, workers * 4, 1.0))
+            clients = args.clients or workers
+            with Pool(clients) as pool:
+                total = sum(pool.map(client, [(host, args.port, args.connections, args.seconds)] * clients))
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait()
+        rps = total / args.seconds
+        base = base or rps / workers
+        print(f"{workers:>8} {rps:>10,.0f} {rps / (base * workers):>8.0%}")
+
+
+if __name__ == "__main__":
+    main()
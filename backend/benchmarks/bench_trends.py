@@ -0,0 +1,117 @@
+"""
+Script Name : bench_trends.py
+Description : BMI trend aggregation: Python vs SQL vs rollups
+Author      : @tonybnya
+
+Usage: python -m benchmarks.bench_trends [--users N] [--per-day K]
+
+Seeds a year of measurements (--per-day per user per day) and times a
+user's daily trend computed three ways: pulling the rows through
+get_measurements_by_user and bucketing in Python, get_bmi_trend
+aggregating in SQL, and get_bmi_trend reading the rollup tables.
+"""
+import argparse
+import random
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+
+from bmi_app.core.category_index import DEFAULT_CATEGORIES
+from bmi_app.core.config import Settings
+from bmi_app.crud.measurements import get_measurements_by_user
+from bmi_app.crud.trends import get_bmi_trend, rebuild_rollups
+from bmi_app.database import build_engine
+from bmi_app.models import Base, Category, HeightUnit, Measurement, User, WeightUnit
+
+
+def seed(engine, users: int, per_day: int) -> list[str]:
+    """
+    Insert a year of measurements for each of `users` users.
+    """
+    rng = random.Random(5)
+    user_ids = [f"user-{i}" for i in range(users)]
+    start = datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(insert(Category), DEFAULT_CATEGORIES)
+        conn.execute(insert(User), [
+            {"id": user_id, "username": user_id, "email": f"{user_id}@example.com", "password_hash": "x"}
+            for user_id in user_ids
+        ])
+        for user_id in user_ids:
+            batch = []
+            for minute in range(0, 365 * 24 * 60, 24 * 60 // per_day):
+                height_m = rng.uniform(1.5, 2.0)
+                weight_kg = rng.uniform(45, 120)
+                batch.append({
+                    "user_id": user_id,
+                    "category_id": rng.randint(1, 6),
+                    "height": height_m, "height_unit": HeightUnit.M,
+                    "weight": weight_kg, "weight_unit": WeightUnit.KG,
+                    "height_m": height_m, "weight_kg": weight_kg,
+                    "bmi": weight_kg / height_m ** 2,
+                    "recorded_at": start + timedelta(minutes=minute),
+                })
+            conn.execute(insert(Measurement), batch)
+    return user_ids
+
+
+def python_trend(db, user_id: str) -> dict:
+    """
+    The pre-existing way: every row through the ORM, bucketed in Python.
+    """
+    buckets = defaultdict(list)
+    for measurement in get_measurements_by_user(db, user_id, limit=10 ** 9):
+        buckets[measurement.recorded_at.date()].append(measurement)
+    return {
+        day: (len(rows), sum(row.bmi for row in rows) / len(rows),
+              min(row.bmi for row in rows), max(row.bmi for row in rows))
+        for day, rows in buckets.items()
+    }
+
+
+def best_of(fn, repeat: int = 5) -> float:
+    """
+    Fastest of `repeat` runs, in milliseconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--per-day", type=int, default=24, help="Measurements per user per day")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = build_engine(Settings(database_url=f"sqlite:///{Path(tmp) / 'bench.db'}"))
+        Base.metadata.create_all(engine)
+        print(f"seeding {args.users} users x 365 days x {args.per_day}/day...")
+        user_id = seed(engine, args.users, args.per_day)[0]
+
+        with sessionmaker(bind=engine)() as db:
+            rebuild_rollups(db)
+            db.commit()
+
+            print(f"{'':>10} {'user/day ms':>12} {'user/month ms':>14} {'all/month ms':>13}")
+            print(f"{'Python':>10} {best_of(lambda: python_trend(db, user_id), 3):>12.2f} {'':>14} {'':>13}")
+            for label, use_rollups in (("SQL", False), ("rollups", True)):
+                print(
+                    f"{label:>10} "
+                    f"{best_of(lambda: get_bmi_trend(db, 'day', user_id, use_rollups=use_rollups)):>12.2f} "
+                    f"{best_of(lambda: get_bmi_trend(db, 'month', user_id, use_rollups=use_rollups)):>14.2f} "
+                    f"{best_of(lambda: get_bmi_trend(db, 'month', use_rollups=use_rollups)):>13.2f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,449 @@
+"""
+Script Name : suite.py
+Description : Benchmark suite with JSON baselines and regression checks
+Author      : @tonybnya
+
+Usage:
+    python -m benchmarks.suite run [--groups core,crud,api] [--sizes 10000,1000000]
+                                   [--save results.json] [--compare baseline.json]
+    python -m benchmarks.suite compare baseline.json results.json [--threshold 0.1]
+    python -m benchmarks.suite list
+
+Every benchmark is a zero-argument callable timed like timeit's
+autorange: loops are calibrated so one run lasts at least --min-time,
+and the median and best of --repeat runs are kept, in seconds per
+operation (a callable may perform several, e.g. a burst of requests).
+CRUD benchmarks run once per database size; seeded databases are kept in
+--data-dir so later runs (and other machines) measure the same rows.
+"compare" exits with status 1 when any benchmark's best time got slower
+than the baseline's by more than --threshold; the best of several runs
+is the figure least disturbed by other load on the machine.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+from pathlib import Path
+from typing import Callable, Iterator
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import sessionmaker
+
+DEFAULT_SIZES = (10_000,)
+SIZES = (10_000, 1_000_000, 10_000_000)
+GROUPS = ("core", "crud", "api")
+# Seed of the generated databases
+SEED = 1
+# Requests per timed call of the API benchmarks
+BURST = 50
+
+
+class Suite:
+    """
+    Benchmarks registered per group; each factory yields (name, callable)
+    or (name, callable, operations per call) once its fixtures are ready.
+    """
+
+    def __init__(self):
+        self.factories: dict[str, list[Callable]] = {group: [] for group in GROUPS}
+
+    def group(self, name: str):
+        def register(factory):
+            self.factories[name].append(factory)
+            return factory
+        return register
+
+
+suite = Suite()
+
+
+def measure(fn: Callable[[], object], repeat: int, min_time: float, ops: int = 1) -> dict:
+    """
+    Seconds per operation of `fn`: median and best of `repeat` calibrated runs.
+    """
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            break
+        loops *= 10 if elapsed < min_time / 10 else 2
+
+    timings = [elapsed / loops / ops]
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        timings.append((time.perf_counter() - started) / loops / ops)
+    return {"median": statistics.median(timings), "best": min(timings), "loops": loops}
+
+
+# Core math ------------------------------------------------------------------
+
+@suite.group("core")
+def core_benchmarks(config) -> Iterator[tuple[str, Callable]]:
+    from bmi_app.core.utils import (calculate_bmi, categorize, get_formula,
+                                    to_kg, to_meters)
+
+    yield "core.to_meters", lambda: to_meters(175.0, "cm")
+    yield "core.to_kg", lambda: to_kg(154.0, "lb")
+    yield "core.calculate_bmi", lambda: calculate_bmi(1.75, 70.0)
+    yield "core.categorize", lambda: categorize(27.3)
+    yield "core.get_formula", lambda: get_formula(22.857142857142858, 1.75, 70.0)
+
+
+# CRUD -------------------------------------------------------------------------
+
+def seed_database(path: Path, rows: int) -> None:
+    """
+    Fill a new database with `rows` generated measurements over
+    rows / 200 users (see scripts/generate_data.py).
+    """
+    from bmi_app.scripts.generate_data import generate
+
+    generate(f"sqlite:///{path}", max(10, rows // 200), rows, seed=SEED, log=lambda line: None)
+
+
+def open_database(data_dir: Path, rows: int):
+    """
+    Session factory on the seeded database of `rows` measurements,
+    seeding it on first use.
+    """
+    from bmi_app.core.config import Settings
+    from bmi_app.database import build_engine
+
+    path = data_dir / f"generated-{rows}-seed{SEED}.db"
+    if not path.exists():
+        data_dir.mkdir(parents=True, exist_ok=True)
+        print(f"seeding {rows:,} measurements into {path}...", file=sys.stderr)
+        partial = path.with_suffix(".partial")
+        partial.unlink(missing_ok=True)
+        seed_database(partial, rows)
+        partial.rename(path)
+    return sessionmaker(bind=build_engine(Settings(database_url=f"sqlite:///{path}")))
+
+
+@suite.group("crud")
+def crud_benchmarks(config) -> Iterator[tuple[str, Callable]]:
+    from bmi_app.core.category_index import rebuild_category_index
+    from bmi_app.core.columnar import MeasurementColumns
+    from bmi_app.crud import analytics, categories, measurements, trends, users
+    from bmi_app.crud.stats import rebuild_user_stats
+    from bmi_app.models import (BMIHistogramBin, HeightUnit, Measurement, User,
+                                WeightUnit)
+    from bmi_app.scripts.generate_data import user_id as generated_user_id
+
+    for rows in config.sizes:
+        db = open_database(config.data_dir, rows)()
+        rebuild_category_index(db)
+        user_id = generated_user_id(SEED, 0)
+        middle = db.scalar(select(Measurement.id).order_by(Measurement.id).offset(rows // 2).limit(1))
+        _, cursor = measurements.get_measurements_by_user_page(db, user_id, limit=20)
+        BMIHistogramBin.__table__.create(db.get_bind(), checkfirst=True)
+        if db.scalar(select(BMIHistogramBin.bin).limit(1)) is None:
+            # Seeded without measurement_analytics
+            analytics.rebuild_histogram(db)
+            db.commit()
+        tag = f"@{rows}"
+
+        yield f"crud.get_categories{tag}", lambda: categories.get_categories(db)
+        yield f"crud.get_category_by_id{tag}", lambda: categories.get_category_by_id(db, 3)
+        yield f"crud.get_category_by_name{tag}", lambda: categories.get_category_by_name(db, "Normal")
+        yield f"crud.get_category_by_bmi{tag}", lambda: categories.get_category_by_bmi(db, 27.3)
+
+        yield f"crud.get_users{tag}", lambda: users.get_users(db, skip=100, limit=100)
+        yield f"crud.get_user_by_id{tag}", lambda: users.get_user_by_id(db, user_id)
+        email = db.scalar(select(User.email).where(User.id == user_id))
+        yield f"crud.get_user_by_email{tag}", lambda: users.get_user_by_email(db, email)
+        yield f"crud.get_user_by_username_missing{tag}", lambda: users.get_user_by_username(db, "nobody")
+        yield f"crud.user_exists_taken{tag}", lambda: users.user_exists(db, email=email)
+        yield f"crud.user_exists_free{tag}", lambda: users.user_exists(db, username="free", email="free@example.com")
+
+        def user_write_cycle():
+            user = users.create_user(db, "bench", "bench@example.com", "x")
+            users.update_user(db, user.id, username="bench2")
+            users.delete_user(db, user.id)
+        yield f"crud.create_update_delete_user{tag}", user_write_cycle
+
+        def user_write_cycle_returning():
+            user = users.create_user(db, "bench", "bench@example.com", "x")
+            users.update_user_returning(db, user.id, username="bench2")
+            users.delete_user_returning(db, user.id)
+        yield f"crud.create_update_delete_user_returning{tag}", user_write_cycle_returning
+
+        yield f"crud.get_measurements{tag}", lambda: measurements.get_measurements(db, limit=100)
+        yield f"crud.get_measurement_by_id{tag}", lambda: measurements.get_measurement_by_id(db, middle)
+        yield f"crud.get_measurements_by_user{tag}", lambda: measurements.get_measurements_by_user(db, user_id)
+        yield (
+            f"crud.get_measurements_by_user_and_date_range{tag}",
+            lambda: measurements.get_measurements_by_user_and_date_range(
+                db, user_id, datetime(2023, 1, 1), datetime(2023, 7, 1)
+            )
+        )
+        yield f"crud.get_measurements_by_category{tag}", lambda: measurements.get_measurements_by_category(db, 2)
+        yield f"crud.get_measurements_page{tag}", lambda: measurements.get_measurements_page(db)
+        for load in measurements.LOAD_STRATEGIES:
+            def page_with_categories(load=load):
+                # A fresh session state, as in a request: lazy loads query
+                db.expunge_all()
+                items, _ = measurements.get_measurements_page(db, load=load)
+                return [item.category if load == "rows" else item.category.name for item in items]
+            yield f"crud.get_measurements_page_categories_{load}{tag}", page_with_categories
+        yield (
+            f"crud.get_measurements_by_user_page{tag}",
+            lambda: measurements.get_measurements_by_user_page(db, user_id, limit=20, cursor=cursor)
+        )
+        yield (
+            f"crud.get_measurements_by_category_page{tag}",
+            lambda: measurements.get_measurements_by_category_page(db, 2)
+        )
+        yield f"crud.get_latest_measurement_by_user{tag}", lambda: measurements.get_latest_measurement_by_user(db, user_id)
+        yield f"crud.get_user_measurement_stats{tag}", lambda: measurements.get_user_measurement_stats(db, user_id)
+        yield (
+            f"crud.get_bmi_trend_user_month{tag}",
+            lambda: trends.get_bmi_trend(db, "month", user_id=user_id, start=date(2023, 1, 1), end=date(2023, 12, 31))
+        )
+        for use_histogram in (False, True):
+            source = "histogram" if use_histogram else "scan"
+            yield (
+                f"crud.get_bmi_percentiles_{source}{tag}",
+                lambda use_histogram=use_histogram: analytics.get_bmi_percentiles(
+                    db, start=date(2023, 2, 15), end=date(2024, 8, 20), use_histogram=use_histogram
+                )
+            )
+
+        def load_columns():
+            with db.get_bind().connect() as conn:
+                return MeasurementColumns.load(conn)
+        yield f"crud.columnar_load{tag}", load_columns
+        columns = load_columns()
+        yield (
+            f"crud.mean_bmi_by_category_sql{tag}",
+            lambda: db.execute(
+                select(Measurement.category_id, func.avg(Measurement.bmi)).group_by(Measurement.category_id)
+            ).all()
+        )
+        yield f"crud.mean_bmi_by_category_columnar{tag}", lambda: columns.aggregate(by="category_id")
+        yield (
+            f"crud.user_bmi_range_columnar{tag}",
+            lambda: columns.aggregate(user_id=user_id, start=date(2023, 1, 1), end=date(2023, 12, 31))
+        )
+        yield f"crud.mean_bmi_by_user_columnar{tag}", lambda: columns.aggregate(by="user_id")
+
+        record = {
+            "user_id": user_id, "category_id": 2,
+            "height": 1.75, "height_unit": HeightUnit.M, "weight": 70.0, "weight_unit": WeightUnit.KG,
+            "height_m": 1.75, "weight_kg": 70.0, "bmi": 22.86,
+        }
+
+        def measurement_write_cycle():
+            measurement = measurements.create_measurement(db, dict(record))
+            measurements.update_measurement(db, measurement.id, {"notes": "bench"})
+            measurements.delete_measurement(db, measurement.id)
+        yield f"crud.create_update_delete_measurement{tag}", measurement_write_cycle
+
+        def measurement_write_cycle_returning():
+            measurement = measurements.create_measurement(db, dict(record))
+            measurements.update_measurement_returning(db, measurement.id, {"notes": "bench"})
+            measurements.delete_measurement_returning(db, measurement.id)
+        yield f"crud.create_update_delete_measurement_returning{tag}", measurement_write_cycle_returning
+
+        bulk_user = db.scalar(select(User).where(User.username == "benchbulk")) or users.create_user(
+            db, "benchbulk", "bench-bulk@example.com", "x"
+        )
+        bulk_rows = [
+            {"user_id": bulk_user.id, "height": 170 + i % 20, "height_unit": "cm",
+             "weight": 60 + i % 30, "weight_unit": "kg"}
+            for i in range(1000)
+        ]
+
+        def bulk_cycle():
+            measurements.bulk_create_measurements(db, bulk_rows)
+            # Keep the table at its seeded size; the rows belong to a user
+            # of their own so the stats rebuild stays small
+            db.execute(delete(Measurement).where(Measurement.user_id == bulk_user.id))
+            rebuild_user_stats(db, bulk_user.id)
+            db.commit()
+        yield f"crud.bulk_create_measurements_1000{tag}", bulk_cycle
+
+        def bulk_update_delete_cycle():
+            ids = measurements.create_measurements(
+                db, [dict(record, user_id=bulk_user.id, recorded_at=datetime(2024, 1, 1)) for _ in range(1000)]
+            )
+            measurements.update_measurements(db, ids, {"notes": "bench"})
+            measurements.update_measurements(db, ids, {"bmi": 23.5})
+            measurements.delete_measurements(db, ids)
+        yield f"crud.bulk_update_delete_measurements_1000{tag}", bulk_update_delete_cycle
+
+
+# End-to-end API -----------------------------------------------------------------
+
+async def asgi_request(app, method: str, path: str, body: bytes = b"") -> int:
+    """
+    Call the ASGI app in-process, without sockets or an HTTP client.
+    """
+    status = 0
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    await app({
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+        "root_path": "", "query_string": b"", "headers": headers,
+        "client": ("127.0.0.1", 1), "server": ("127.0.0.1", 80),
+    }, receive, send)
+    return status
+
+
+@suite.group("api")
+def api_benchmarks(config) -> Iterator[tuple[str, Callable]]:
+    from bmi_app.core.cache import bmi_cache, category_cache
+    from bmi_app.database import get_db_session
+    from bmi_app.main import app
+
+    session_factory = open_database(config.data_dir, min(config.sizes))
+
+    async def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db_session] = override_get_db
+    loop = asyncio.new_event_loop()
+
+    def call(method, path, body=b"", setup=None):
+        # A burst per call, so starting the event loop is not what we time
+        async def burst():
+            for _ in range(BURST):
+                if setup is not None:
+                    setup()
+                status = await asgi_request(app, method, path, body)
+                assert status == 200, (method, path, status)
+        return lambda: loop.run_until_complete(burst())
+
+    body = json.dumps({"height": 175, "height_unit": "cm", "weight": 70, "weight_unit": "kg"}).encode()
+    yield "api.post_bmi_cached", call("POST", "/bmi/", body), BURST
+    yield "api.post_bmi_uncached", call("POST", "/bmi/", body, setup=bmi_cache.clear), BURST
+    yield "api.get_categories_cached", call("GET", "/bmi/categories/"), BURST
+    yield (
+        "api.get_categories_uncached",
+        call("GET", "/bmi/categories/", setup=category_cache.invalidate), BURST
+    )
+
+
+# Commands -------------------------------------------------------------------------
+
+def run(config) -> dict:
+    results = {}
+    for group in config.groups:
+        for factory in suite.factories[group]:
+            for name, fn, *ops in factory(config):
+                if config.filter and config.filter not in name:
+                    continue
+                results[name] = measure(fn, config.repeat, config.min_time, *ops)
+                print(f"{name:<60} {results[name]['median'] * 1e6:>12.2f} us", flush=True)
+    return {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "sizes": list(config.sizes),
+        },
+        "results": results,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list[str]:
+    """
+    Print a comparison table (best times) and return the names that regressed.
+    """
+    regressions = []
+    print(f"{'benchmark':<60} {'baseline us':>12} {'current us':>12} {'change':>8}")
+    for name, result in current["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            print(f"{name:<60} {'-':>12} {result['best'] * 1e6:>12.2f} {'new':>8}")
+            continue
+        change = result["best"] / before["best"] - 1
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<60} {before['best'] * 1e6:>12.2f} {result['best'] * 1e6:>12.2f} {change:>+8.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run benchmarks")
+    run_parser.add_argument("--groups", default=",".join(GROUPS), help="Comma-separated: core,crud,api")
+    run_parser.add_argument(
+        "--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+        help=f"Seeded measurement counts for CRUD benchmarks (e.g. {','.join(map(str, SIZES))})"
+    )
+    run_parser.add_argument("--filter", default="", help="Only benchmarks whose name contains this")
+    run_parser.add_argument("--repeat", type=int, default=5)
+    run_parser.add_argument("--min-time", type=float, default=0.2, help="Seconds per timed run")
+    run_parser.add_argument("--data-dir", type=Path, default=Path(tempfile.gettempdir()) / "bmi_app-bench")
+    run_parser.add_argument("--save", type=Path, help="Write results JSON here")
+    run_parser.add_argument("--compare", type=Path, help="Baseline JSON to compare against")
+    run_parser.add_argument("--threshold", type=float, default=0.10, help="Allowed slowdown (0.10 = 10%%)")
+
+    compare_parser = commands.add_parser("compare", help="Compare two result files")
+    compare_parser.add_argument("baseline", type=Path)
+    compare_parser.add_argument("current", type=Path)
+    compare_parser.add_argument("--threshold", type=float, default=0.10)
+
+    commands.add_parser("list", help="List benchmark groups")
+
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for group, factories in suite.factories.items():
+            print(f"{group}: {', '.join(factory.__name__ for factory in factories)}")
+        return
+
+    if args.command == "compare":
+        regressions = compare(
+            json.loads(args.baseline.read_text()), json.loads(args.current.read_text()), args.threshold
+        )
+    else:
+        args.groups = [group for group in args.groups.split(",") if group]
+        unknown = set(args.groups) - set(GROUPS)
+        if unknown:
+            parser.error(f"unknown groups: {', '.join(sorted(unknown))}")
+        args.sizes = [int(size) for size in args.sizes.split(",")]
+        results = run(args)
+        if args.save:
+            args.save.parent.mkdir(parents=True, exist_ok=True)
+            args.save.write_text(json.dumps(results, indent=2))
+        regressions = []
+        if args.compare:
+            regressions = compare(json.loads(args.compare.read_text()), results, args.threshold)
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
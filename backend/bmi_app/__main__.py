@@ -0,0 +1,57 @@
+"""
+Script Name : __main__.py
+Description : Command line entry point (python -m bmi_app serve)
+Author      : @tonybnya
+"""
+import argparse
+import logging
+import sys
+
+from bmi_app.core.config import get_settings
+from bmi_app.server import HTTP_PROTOCOLS, LOOPS, serve
+
+
+def main(argv=None) -> int:
+    """
+    Parse the command line; options default to the settings (.env).
+    """
+    settings = get_settings()
+    parser = argparse.ArgumentParser(prog="bmi_app")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser("serve", help="Run the API with several worker processes")
+    serve_parser.add_argument("--host", default=settings.host)
+    serve_parser.add_argument("--port", type=int, default=settings.port)
+    serve_parser.add_argument(
+        "-w", "--workers", type=int, default=settings.workers,
+        help="Worker processes (default: one per CPU)"
+    )
+    serve_parser.add_argument("--loop", choices=LOOPS, default=settings.server_loop)
+    serve_parser.add_argument("--http", choices=HTTP_PROTOCOLS, default=settings.server_http)
+    serve_parser.add_argument(
+        "--preload", action=argparse.BooleanOptionalAction, default=settings.server_preload,
+        help="Import the app before forking the workers"
+    )
+    serve_parser.add_argument(
+        "--reuse-port", action=argparse.BooleanOptionalAction, default=settings.server_reuse_port,
+        help="Give every worker its own SO_REUSEPORT socket"
+    )
+    serve_parser.add_argument("--graceful-timeout", type=float, default=settings.server_graceful_timeout)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(process)d %(levelname)s %(message)s")
+    config = settings.model_copy(update={
+        "host": args.host,
+        "port": args.port,
+        "workers": args.workers,
+        "server_loop": args.loop,
+        "server_http": args.http,
+        "server_preload": args.preload,
+        "server_reuse_port": args.reuse_port,
+        "server_graceful_timeout": args.graceful_timeout,
+    })
+    return serve(config)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,13 +3,30 @@ Script Name : routes_bmi.py
 Description : Endpoints for BMI calculation
 Author      : @tonybnya
 """
-from fastapi import APIRouter
+import io
+from tempfile import SpooledTemporaryFile
 
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from bmi_app.core.cache import bmi_cache
+from bmi_app.core.category_index import get_category_index
+from bmi_app.core.config import get_settings
+from bmi_app.core.serialization import dumps, fast_json_enabled, json_response
+from bmi_app.core.streaming import (MEDIA_TYPES, get_codec, stream_scored,
+                                    to_float, to_str)
 from bmi_app.core.utils import (calculate_bmi, categorize, get_formula, to_kg,
                                 to_meters)
-from bmi_app.schemas import BMICalculateRequest, BMICalculateResponse
+from bmi_app.schemas import (BMIBatchRecord, BMIBatchRequest,
+                             BMIBatchResponse, BMICalculateRequest,
+                             BMICalculateResponse)
 
 router = APIRouter()
+settings = get_settings()
+
+# Request body bytes gathered before one spool write in the thread pool
+SPOOL_WRITE_BYTES = 256 * 1024
 
 
 @router.post("/", response_model=BMICalculateResponse)
@@ -20,16 +37,147 @@ def calculate_bmi_endpoint(data: BMICalculateRequest):
     """
     height_m: float = to_meters(data.height, data.height_unit)
     weight_kg: float = to_kg(data.weight, data.weight_unit)
-    bmi, bmi_raw = calculate_bmi(height_m, weight_kg)
-
-    category: str = categorize(bmi)
-    formula: str = get_formula(bmi_raw, height_m, weight_kg)
-
-    return BMICalculateResponse(
-        height=data.height,
-        weight=data.weight,
-        bmi=bmi,
-        bmi_raw=bmi_raw,
-        category=category,
-        formula=formula
+
+    # Everything after height/weight only depends on the normalized
+    # inputs (and the category boundaries): serialize it once per key
+    key = (height_m, weight_kg, get_category_index().version)
+    tail = bmi_cache.get(key)
+    if tail is None:
+        bmi, bmi_raw = calculate_bmi(height_m, weight_kg)
+
+        category: str = categorize(bmi)
+        formula: str = get_formula(bmi_raw, height_m, weight_kg)
+
+        if fast_json_enabled():
+            tail = b"," + dumps({
+                "bmi": bmi,
+                "bmi_raw": bmi_raw,
+                "category": category,
+                "formula": formula,
+            })[1:]
+        else:
+            body = BMICalculateResponse(
+                height=data.height,
+                weight=data.weight,
+                bmi=bmi,
+                bmi_raw=bmi_raw,
+                category=category,
+                formula=formula
+            ).model_dump_json().encode()
+            tail = body[body.index(b',"bmi":'):]
+        bmi_cache.set(key, tail)
+
+    return Response(
+        content=b'{"height":' + dumps(data.height) + b',"weight":' + dumps(data.weight) + tail,
+        media_type="application/json"
+    )
+
+
+@router.post("/batch", response_model=BMIBatchResponse)
+def calculate_bmi_batch_endpoint(data: BMIBatchRequest):
+    """
+    Calculate BMI for many height/weight pairs in one request.
+    Invalid rows are reported individually and do not fail the batch.
+    """
+    # Imported on first use: numpy is not needed to start the app
+    from bmi_app.core.vectorized import score_batch
+
+    if len(data.records) > settings.bmi_batch_max_records:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch exceeds {settings.bmi_batch_max_records} records"
+        )
+    # A row that is not an object is scored as empty: every field reported
+    records = [
+        BMIBatchRecord.model_validate(record if isinstance(record, dict) else {})
+        for record in data.records
+    ]
+
+    heights = [to_float(record.height) for record in records]
+    weights = [to_float(record.weight) for record in records]
+    scored = score_batch(
+        heights,
+        [to_str(record.height_unit) for record in records],
+        weights,
+        [to_str(record.weight_unit) for record in records]
     )
+
+    results = [
+        {
+            "index": index,
+            "height": heights[index],
+            "weight": weights[index],
+            "bmi": bmi,
+            "bmi_raw": bmi_raw,
+            "category": category,
+        }
+        for index, bmi, bmi_raw, category in zip(
+            scored.indices.tolist(),
+            scored.bmi.tolist(),
+            scored.bmi_raw.tolist(),
+            scored.category.tolist()
+        )
+    ]
+    errors = [
+        {"index": error.index, "errors": error.errors}
+        for error in scored.errors
+    ]
+
+    response = {
+        "total": len(records),
+        "succeeded": len(results),
+        "failed": len(errors),
+        "results": results,
+        "errors": errors,
+    }
+    if fast_json_enabled():
+        return json_response(response)
+    return response
+
+
+@router.post(
+    "/stream",
+    response_class=StreamingResponse,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                MEDIA_TYPES["ndjson"]: {"schema": {"type": "string"}},
+                MEDIA_TYPES["csv"]: {"schema": {"type": "string"}},
+            },
+        }
+    },
+)
+async def calculate_bmi_stream_endpoint(request: Request):
+    """
+    Score an NDJSON or CSV upload of any size (picked from Content-Type).
+    Rows come back in the same format with bmi, bmi_raw and category added.
+    The body is spooled to a temporary file (in memory up to
+    `bmi_stream_spool_bytes`) before scoring starts, so reading the request
+    never competes with sending the response. Spool writes (disk once past
+    the memory limit) run in the thread pool, off the event loop.
+    """
+    content_type = request.headers.get("content-type", "")
+    fmt = "csv" if content_type.startswith(MEDIA_TYPES["csv"]) else "ndjson"
+    codec = get_codec(fmt)
+
+    spool = SpooledTemporaryFile(max_size=settings.bmi_stream_spool_bytes)
+    pending, pending_bytes = [], 0
+    async for data in request.stream():
+        pending.append(data)
+        pending_bytes += len(data)
+        if pending_bytes >= SPOOL_WRITE_BYTES:
+            await run_in_threadpool(spool.write, b"".join(pending))
+            pending, pending_bytes = [], 0
+    await run_in_threadpool(spool.write, b"".join(pending))
+    await run_in_threadpool(spool.seek, 0)
+
+    def scored_body():
+        with spool, io.TextIOWrapper(spool, encoding="utf-8-sig", newline="") as lines:
+            yield from stream_scored(
+                (line.rstrip("\r\n") for line in lines),
+                codec,
+                settings.bmi_stream_chunk_size
+            )
+
+    return StreamingResponse(scored_body(), media_type=codec.media_type)
@@ -3,51 +3,111 @@ Script Name : routes_categories.py
 Description : Endpoints for BMI categories management
 Author      : @tonybnya
 """
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional, Union
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
-from bmi_app.crud import get_categories, get_category_by_id
-from bmi_app.database import get_db
+from bmi_app import crud
+from bmi_app.core.cache import CachedJSON, category_cache
+from bmi_app.core.serialization import dumps, fast_json_enabled
+from bmi_app.database import get_db_session
 from bmi_app.schemas import CategoriesResponse, Category
 
 router = APIRouter()
 
 
+async def run_crud(db: Union[Session, AsyncSession], sync_fn, async_fn, *args):
+    """
+    Call the async CRUD function on an AsyncSession, or the sync one in
+    the threadpool so it does not block the event loop.
+    """
+    if isinstance(db, AsyncSession):
+        return await async_fn(db, *args)
+    return await run_in_threadpool(sync_fn, db, *args)
+
+
 @router.get("/", response_model=CategoriesResponse)
-def read_categories(db: Session = Depends(get_db)):
+async def read_categories(
+    db: Union[Session, AsyncSession] = Depends(get_db_session),
+    if_none_match: Optional[str] = Header(None)
+):
     """
     Get all BMI categories from the database.
+    Served from the category cache; supports If-None-Match.
     """
-    db_categories = get_categories(db)
-
-    # Convert SQLAlchemy models to Pydantic schemas
-    categories = [
-        Category(
-            name=category.name,
-            min_value=category.min_value,
-            max_value=category.max_value
+    async def load() -> CachedJSON:
+        db_categories = await run_crud(
+            db, crud.get_categories, crud.async_categories.get_categories
         )
-        for category in db_categories
-    ]
 
-    return CategoriesResponse(categories=categories)
+        if fast_json_enabled():
+            return CachedJSON(dumps({"categories": [
+                {
+                    "name": category.name,
+                    "min_value": category.min_value,
+                    "max_value": category.max_value
+                }
+                for category in db_categories
+            ]}))
+
+        # Convert SQLAlchemy models to Pydantic schemas
+        categories = [
+            Category(
+                name=category.name,
+                min_value=category.min_value,
+                max_value=category.max_value
+            )
+            for category in db_categories
+        ]
+
+        return CachedJSON(
+            CategoriesResponse(categories=categories).model_dump_json().encode()
+        )
+
+    cached = await category_cache.aget_or_set("all", load)
+    return cached.to_response(if_none_match)
 
 
 @router.get("/{category_id}", response_model=Category)
-def read_category(category_id: int, db: Session = Depends(get_db)):
+async def read_category(
+    category_id: int,
+    db: Union[Session, AsyncSession] = Depends(get_db_session),
+    if_none_match: Optional[str] = Header(None)
+):
     """
     Get a specific BMI category by ID.
+    Served from the category cache; supports If-None-Match.
     """
-    db_category = get_category_by_id(db, category_id)
+    async def load() -> Optional[CachedJSON]:
+        db_category = await run_crud(
+            db, crud.get_category_by_id, crud.async_categories.get_category_by_id, category_id
+        )
+        if db_category is None:
+            return None
+
+        if fast_json_enabled():
+            return CachedJSON(dumps({
+                "name": db_category.name,
+                "min_value": db_category.min_value,
+                "max_value": db_category.max_value
+            }))
+
+        return CachedJSON(
+            Category(
+                name=db_category.name,
+                min_value=db_category.min_value,
+                max_value=db_category.max_value
+            ).model_dump_json().encode()
+        )
 
-    if db_category is None:
+    cached = await category_cache.aget_or_set(category_id, load)
+    if cached is None:
         raise HTTPException(
             status_code=404,
             detail=f"Category with id {category_id} not found"
         )
 
-    return Category(
-        name=db_category.name,
-        min_value=db_category.min_value,
-        max_value=db_category.max_value
-    )
+    return cached.to_response(if_none_match)
@@ -3,3 +3,292 @@ Script Name : routes_measurements.py
 Description : Endpoints for creating/fetching BMI measurements
 Author      : @tonybnya
 """
+from datetime import date
+from typing import Literal, Optional, Union
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+from bmi_app import crud
+from bmi_app.core.config import get_settings
+from bmi_app.core.export import (EXPORT_FORMATS, export_available,
+                                 export_schema, record_batches, stream_export)
+from bmi_app.database import get_db
+from bmi_app.schemas import (HistogramResponse, MeasurementBulkRequest,
+                             MeasurementBulkResponse, MeasurementCreate,
+                             MeasurementPage, MeasurementQueued,
+                             MeasurementResponse, MeasurementStats,
+                             PendingMeasurement, PercentilesResponse,
+                             TrendPeriod, TrendResponse)
+
+router = APIRouter()
+settings = get_settings()
+
+
+@router.post(
+    "/",
+    response_model=Union[MeasurementResponse, MeasurementQueued],
+    status_code=201,
+    responses={
+        202: {"model": MeasurementQueued, "description": "Queued (write-behind mode)"},
+        503: {"description": "Write queue full (write-behind mode), retry later"},
+    },
+)
+def create_measurement(
+    data: MeasurementCreate,
+    response: Response,
+    db: Session = Depends(get_db)
+):
+    """
+    Record a measurement; BMI and category are computed server-side.
+    With `measurement_write_behind` the measurement is queued and committed
+    with others shortly after: the answer is a 202 with a provisional id.
+    """
+    try:
+        values = crud.prepare_measurement(db, data.model_dump())
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if settings.measurement_write_behind:
+        from bmi_app.core.write_behind import QueueFull, WriterStopped, get_writer
+
+        writer = get_writer()
+        try:
+            if writer is None:
+                raise WriterStopped()
+            provisional_id = writer.submit(values, timeout=settings.write_behind_put_timeout)
+        except (QueueFull, WriterStopped):
+            raise HTTPException(
+                status_code=503,
+                detail="Measurement queue is full or shutting down, retry later",
+                headers={"Retry-After": "1"}
+            )
+        response.status_code = 202
+        return {"provisional_id": provisional_id, "status": "queued"}
+
+    if crud.get_user_by_id(db, data.user_id) is None:
+        raise HTTPException(status_code=404, detail=f"User {data.user_id} not found")
+    return crud.create_measurement(db, values)
+
+
+@router.get("/pending/{provisional_id}", response_model=PendingMeasurement)
+def read_pending_measurement(provisional_id: str):
+    """
+    Status of a measurement queued in write-behind mode (recent ones only).
+    """
+    from bmi_app.core.write_behind import get_writer
+
+    writer = get_writer()
+    result = writer.status(provisional_id) if writer is not None else None
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"No pending measurement {provisional_id}")
+    return {"provisional_id": provisional_id, **result}
+
+
+@router.post("/bulk", response_model=MeasurementBulkResponse)
+def create_measurements_bulk(
+    data: MeasurementBulkRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Import many measurements in a single transaction.
+    BMI, category and metric values are computed server-side; rows that
+    fail validation are reported by index and not inserted.
+    """
+    if len(data.measurements) > settings.measurement_bulk_max_rows:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Bulk import exceeds {settings.measurement_bulk_max_rows} rows"
+        )
+
+    return crud.bulk_create_measurements(
+        db,
+        [record.model_dump() for record in data.measurements],
+        chunk_size=settings.measurement_bulk_chunk_size
+    )
+
+
+@router.get("/", response_model=MeasurementPage)
+def read_measurements(
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    List measurements, most recent first, one cursor page at a time.
+    """
+    try:
+        items, next_cursor = crud.get_measurements_page(
+            db, limit=limit, cursor=cursor, load=settings.measurement_list_load
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": items, "next_cursor": next_cursor}
+
+
+@router.get("/trends", response_model=TrendResponse)
+def read_trends(
+    period: TrendPeriod = "day",
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    BMI trend of the whole population, bucketed by day, week or month.
+    """
+    buckets = crud.get_bmi_trend(
+        db, period, start=start, end=end,
+        use_rollups=settings.measurement_rollups
+    )
+    return {"period": period, "user_id": None, "buckets": buckets}
+
+
+@router.get("/percentiles", response_model=PercentilesResponse)
+def read_bmi_percentiles(
+    p: list[float] = Query([5, 25, 50, 75, 95], description="Percentiles, 0 to 100"),
+    category_id: Optional[int] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    BMI percentiles of the population, optionally for one category and
+    a date range.
+    """
+    try:
+        result = crud.get_bmi_percentiles(
+            db, p, category_id=category_id, start=start, end=end,
+            use_histogram=settings.measurement_analytics
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return {"category_id": category_id, **result}
+
+
+@router.get("/histogram", response_model=HistogramResponse)
+def read_bmi_histogram(
+    bin_width: float = Query(1.0, gt=0, description="A multiple of 0.1"),
+    category_id: Optional[int] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Number of measurements per BMI bin, optionally for one category and
+    a date range.
+    """
+    try:
+        result = crud.get_bmi_histogram(
+            db, bin_width, category_id=category_id, start=start, end=end,
+            use_histogram=settings.measurement_analytics
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return {"category_id": category_id, **result}
+
+
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    responses={200: {"content": {media_type: {} for media_type in EXPORT_FORMATS.values()}}},
+)
+def export_measurements(
+    fmt: Literal["parquet", "arrow"] = Query("parquet", alias="format"),
+    columns: Optional[list[str]] = Query(None, description="Columns to export (default: all)"),
+    category_id: Optional[int] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Download the measurements as a Parquet or Arrow IPC file, encoded
+    batch by batch while the rows are read.
+    """
+    if not export_available():
+        raise HTTPException(status_code=501, detail="Exports need pyarrow installed")
+    try:
+        schema = export_schema(columns)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    def body():
+        # The body streams after the request's session may be closed: read
+        # on a connection of its own, closed with the stream (or when the
+        # client goes away)
+        with db.get_bind().connect() as conn:
+            batches = record_batches(
+                conn, columns, category_id=category_id, start=start, end=end,
+                batch_size=settings.measurement_export_batch_size
+            )
+            yield from stream_export(batches, fmt, schema)
+
+    return StreamingResponse(
+        body(),
+        media_type=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="measurements.{fmt}"'}
+    )
+
+
+@router.get("/users/{user_id}", response_model=MeasurementPage)
+def read_user_measurements(
+    user_id: str,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    List a user's measurements, most recent first, one cursor page at a time.
+    """
+    try:
+        items, next_cursor = crud.get_measurements_by_user_page(
+            db, user_id, limit=limit, cursor=cursor, load=settings.measurement_list_load
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": items, "next_cursor": next_cursor}
+
+
+@router.get("/users/{user_id}/stats", response_model=MeasurementStats)
+def read_user_measurement_stats(user_id: str, db: Session = Depends(get_db)):
+    """
+    Get a user's measurement statistics.
+    """
+    stats = crud.get_user_measurement_stats(db, user_id)
+    if stats is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No measurements for user {user_id}"
+        )
+    return stats
+
+
+@router.get("/users/{user_id}/latest", response_model=MeasurementResponse)
+def read_latest_user_measurement(user_id: str, db: Session = Depends(get_db)):
+    """
+    Get a user's most recent measurement.
+    """
+    measurement = crud.get_latest_measurement_by_user(db, user_id)
+    if measurement is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No measurements for user {user_id}"
+        )
+    return measurement
+
+
+@router.get("/users/{user_id}/trends", response_model=TrendResponse)
+def read_user_trends(
+    user_id: str,
+    period: TrendPeriod = "day",
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    BMI trend of a user, bucketed by day, week or month.
+    """
+    buckets = crud.get_bmi_trend(
+        db, period, user_id=user_id, start=start, end=end,
+        use_rollups=settings.measurement_rollups
+    )
+    return {"period": period, "user_id": user_id, "buckets": buckets}
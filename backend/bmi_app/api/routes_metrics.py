@@ -0,0 +1,22 @@
+"""
+Script Name : routes_metrics.py
+Description : Prometheus scrape endpoint
+Author      : @tonybnya
+"""
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from bmi_app.core.metrics import registry
+
+router = APIRouter()
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def read_metrics():
+    """
+    Current metrics in the Prometheus text exposition format.
+    """
+    return PlainTextResponse(
+        registry.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -0,0 +1,223 @@
+"""
+Script Name : cache.py
+Description : In-process caches for rarely changing API responses
+Author      : @tonybnya
+"""
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+from fastapi import Response
+
+from bmi_app.core.config import get_settings
+from bmi_app.core.metrics import register_cache
+
+settings = get_settings()
+
+
+class TTLCache:
+    """
+    Thread-safe key/value cache whose entries expire after `ttl` seconds.
+    invalidate() bumps a generation counter so that a value loaded before
+    the invalidation is never stored after it.
+    """
+
+    def __init__(self, ttl: float, clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries: dict[Hashable, tuple[float, Any]] = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > self.clock():
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        return None
+
+    def get_or_set(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """
+        Return the cached value, calling `loader` on a miss.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        generation = self._generation
+        value = loader()
+        with self._lock:
+            if value is not None and generation == self._generation:
+                self._entries[key] = (self.clock() + self.ttl, value)
+        return value
+
+    async def aget_or_set(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """
+        get_or_set() for a coroutine loader.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        generation = self._generation
+        value = await loader()
+        with self._lock:
+            if value is not None and generation == self._generation:
+                self._entries[key] = (self.clock() + self.ttl, value)
+        return value
+
+    def stats(self) -> dict:
+        """
+        Counters for monitoring.
+        """
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """
+        Drop one key, or everything when no key is given.
+        """
+        with self._lock:
+            self._generation += 1
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+
+class LRUCache:
+    """
+    Thread-safe key/value cache holding at most `capacity` entries; the
+    least recently used one is evicted first. A capacity of 0 disables it.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[Hashable, Any] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.capacity <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """
+        Counters for monitoring.
+        """
+        return {
+            "size": len(self._entries),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class BloomFilter:
+    """
+    Set of strings with false positives but no false negatives: when
+    `item in bloom` is False the item was never added. Sized so that the
+    false positive rate stays under `error_rate` up to `capacity` items.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        capacity = max(1, capacity)
+        self.capacity = capacity
+        self.size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        # Double hashing: k positions out of one 128-bit digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        bits = self._bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class CachedJSON:
+    """
+    A JSON body serialized once, with its ETag.
+    """
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+    def to_response(self, if_none_match: Optional[str] = None) -> Response:
+        """
+        Build a 200 carrying the body, or a bodiless 304 when the client
+        already holds this version.
+        """
+        headers = {"ETag": self.etag}
+        if if_none_match and (
+            if_none_match.strip() == "*"
+            or self.etag in (
+                tag.strip().removeprefix("W/") for tag in if_none_match.split(",")
+            )
+        ):
+            return Response(status_code=304, headers=headers)
+        return Response(
+            content=self.body,
+            media_type="application/json",
+            headers=headers
+        )
+
+
+# Serialized /bmi/categories responses, dropped by the category CRUD writes
+category_cache = TTLCache(ttl=settings.category_cache_ttl_seconds)
+
+# Serialized tails of /bmi/ responses, keyed on the normalized inputs
+bmi_cache = LRUCache(capacity=settings.bmi_cache_size)
+
+register_cache("category", category_cache)
+register_cache("bmi", bmi_cache)
@@ -0,0 +1,166 @@
+"""
+Script Name : category_index.py
+Description : Compiled, bisect-searchable view of the categories table
+Author      : @tonybnya
+"""
+import threading
+from bisect import bisect_right
+from functools import cached_property
+from typing import TYPE_CHECKING, Iterable, Optional
+
+from sqlalchemy.orm import Session
+
+from bmi_app.models import Category
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Standard BMI categories, seeded by scripts/init_db.py and used until the
+# index is loaded from the database
+DEFAULT_CATEGORIES = [
+    {"name": "Underweight", "min_value": None, "max_value": 18.5},
+    {"name": "Normal", "min_value": 18.5, "max_value": 25},
+    {"name": "Overweight", "min_value": 25, "max_value": 30},
+    {"name": "Obesity I", "min_value": 30, "max_value": 35},
+    {"name": "Obesity II", "min_value": 35, "max_value": 40},
+    {"name": "Obesity III", "min_value": 40, "max_value": None},
+]
+
+
+class CategoryIndex:
+    """
+    Categories sorted by lower bound. A category runs from its min_value
+    (inclusive) to its max_value (exclusive), either one open when NULL;
+    a BMI between two categories (a gap in the table) has no category.
+    Instances are immutable; rebuilding swaps in a new one.
+    """
+
+    def __init__(self, categories: Iterable[dict], version: int = 0):
+        rows = sorted(
+            categories,
+            key=lambda row: float("-inf") if row["min_value"] is None else row["min_value"]
+        )
+        if not rows:
+            raise ValueError("A category index needs at least one category")
+
+        self.version = version
+        self.ids: tuple[Optional[int], ...] = tuple(row.get("id") for row in rows)
+        self.names: tuple[str, ...] = tuple(row["name"] for row in rows)
+        self.categories: tuple[dict, ...] = tuple(dict(row) for row in rows)
+        # Lower bounds of every category, and of every category but the first
+        self.lower: list[float] = [
+            float("-inf") if row["min_value"] is None else row["min_value"]
+            for row in rows
+        ]
+        self.boundaries: list[float] = self.lower[1:]
+        self.upper: list[float] = [
+            float("inf") if row["max_value"] is None else row["max_value"]
+            for row in rows
+        ]
+        # Position of "no category"
+        self.missing = len(rows)
+
+    @cached_property
+    def _arrays(self) -> tuple["np.ndarray", ...]:
+        """
+        Boundaries, names and ids as arrays (names and ids with a last
+        entry for "no category": None and -1), and the lower and upper
+        bounds, built on the first vectorized lookup so that importing the
+        app does not import numpy.
+        """
+        import numpy as np
+
+        return (
+            np.array(self.boundaries, dtype=np.float64),
+            np.array(self.names + (None,), dtype=object),
+            np.array(
+                [-1 if category_id is None else category_id for category_id in self.ids] + [-1],
+                dtype=np.int64
+            ),
+            np.array(self.lower, dtype=np.float64),
+            np.array(self.upper, dtype=np.float64),
+        )
+
+    def position(self, bmi: float) -> int:
+        """
+        Position of the category containing `bmi`, `missing` when none
+        does.
+        """
+        position = bisect_right(self.boundaries, bmi)
+        if not self.lower[position] <= bmi < self.upper[position]:
+            return self.missing
+        return position
+
+    def name_for(self, bmi: float) -> Optional[str]:
+        position = self.position(bmi)
+        return None if position == self.missing else self.names[position]
+
+    def id_for(self, bmi: float) -> Optional[int]:
+        position = self.position(bmi)
+        return None if position == self.missing else self.ids[position]
+
+    def positions(self, bmi: "np.ndarray") -> "np.ndarray":
+        """
+        Vectorized position(): one searchsorted over the whole array.
+        """
+        boundaries, _, _, lower, upper = self._arrays
+        positions = boundaries.searchsorted(bmi, side="right")
+        inside = (lower[positions] <= bmi) & (bmi < upper[positions])
+        positions[~inside] = self.missing
+        return positions
+
+    def names_for(self, bmi: "np.ndarray") -> "np.ndarray":
+        """
+        Category names for an array of BMI values, None where no category
+        contains the value.
+        """
+        return self._arrays[1][self.positions(bmi)]
+
+    def ids_for(self, bmi: "np.ndarray") -> "np.ndarray":
+        """
+        Category ids for an array of BMI values, -1 where no category
+        contains the value or the index was not built from the database.
+        """
+        return self._arrays[2][self.positions(bmi)]
+
+    @property
+    def loaded(self) -> bool:
+        """
+        Whether the index carries database ids.
+        """
+        return all(category_id is not None for category_id in self.ids)
+
+
+_lock = threading.Lock()
+_index = CategoryIndex(DEFAULT_CATEGORIES)
+
+
+def get_category_index() -> CategoryIndex:
+    """
+    Return the current index. Hold on to the returned object for a whole
+    computation to stay consistent across a concurrent rebuild.
+    """
+    return _index
+
+
+def rebuild_category_index(db: Session) -> CategoryIndex:
+    """
+    Compile the categories table into a new index and swap it in.
+    An empty table keeps the current index. The read and the swap happen
+    under the lock, so concurrent rebuilds cannot install an older read
+    over a newer one.
+    """
+    global _index
+    with _lock:
+        rows = [
+            {
+                "id": category.id,
+                "name": category.name,
+                "min_value": category.min_value,
+                "max_value": category.max_value,
+            }
+            for category in db.query(Category).all()
+        ]
+        if rows:
+            _index = CategoryIndex(rows, version=_index.version + 1)
+        return _index
@@ -0,0 +1,394 @@
+"""
+Script Name : columnar.py
+Description : Compact array-backed measurement store for in-memory analytics
+Author      : @tonybnya
+
+One NumPy array per column instead of one ORM object per row: 46 bytes a
+measurement against several hundred, and filters and aggregates run
+vectorized over whole columns.
+
+- id: int64, measurements.id
+- user: int32 code into `user_ids` (users.id, dictionary-encoded)
+- recorded_at: int64 microseconds since the epoch (naive UTC, as stored);
+  NULL is NULL_TIME, which reads as NaT through recorded_at_array()
+- height_m, weight_kg, bmi: float64
+- category_id: int16
+
+The store loads in bulk from the measurements table, then grows by
+append() (rows just written) or refresh() (rows past the highest id
+read). It is append-only: updated or deleted measurements need a reload.
+
+save() writes every column to a .npy file in a new data directory, then
+switches meta.json to it; open() maps them back with
+np.load(mmap_mode="r"), so a restart reads no data until a query touches
+it. The first append to a mapped store copies its columns into memory.
+"""
+import json
+import os
+import shutil
+import threading
+import uuid
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Iterable, Optional, Sequence, Union
+
+import numpy as np
+from sqlalchemy import String, select, type_coerce
+from sqlalchemy.engine import Connection
+
+from bmi_app.crud.stats import naive_utc
+from bmi_app.models import Measurement
+
+COLUMNS = {
+    "id": np.int64,
+    "user": np.int32,
+    "recorded_at": np.int64,
+    "height_m": np.float64,
+    "weight_kg": np.float64,
+    "bmi": np.float64,
+    "category_id": np.int16,
+}
+NULL_TIME = np.iinfo(np.int64).min
+GROUP_BY = ("user_id", "category_id")
+# Smallest allocation, in rows
+MIN_CAPACITY = 1024
+FORMAT_VERSION = 2
+
+_EPOCH = datetime(1970, 1, 1)
+
+TimeBound = Union[date, datetime, None]
+
+
+def _to_epoch(values: Sequence[Optional[datetime]]) -> np.ndarray:
+    return np.array(
+        [NULL_TIME if value is None else (naive_utc(value) - _EPOCH) // timedelta(microseconds=1)
+         for value in values],
+        dtype=np.int64
+    )
+
+
+def _bound(value: TimeBound, end: bool) -> Optional[int]:
+    """
+    Epoch microseconds of a filter bound: a date covers its whole day,
+    both bounds are inclusive. The returned end bound is exclusive.
+    """
+    if value is None:
+        return None
+    if not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day) + (timedelta(days=1) if end else timedelta())
+        return (value - _EPOCH) // timedelta(microseconds=1)
+    return (naive_utc(value) - _EPOCH) // timedelta(microseconds=1) + (1 if end else 0)
+
+
+def _load_query(after_id: int = 0):
+    return select(
+        Measurement.id,
+        Measurement.user_id,
+        # Parsed by NumPy a batch at a time rather than row by row
+        type_coerce(Measurement.recorded_at, String),
+        Measurement.height_m,
+        Measurement.weight_kg,
+        Measurement.bmi,
+        Measurement.category_id,
+    ).where(Measurement.id > after_id).order_by(Measurement.id)
+
+
+class MeasurementColumns:
+    """
+    Measurements as parallel typed arrays. Appends are serialized;
+    queries run on a consistent prefix and never block.
+    """
+
+    def __init__(self, capacity: int = 0):
+        self.size = 0
+        self.last_id = 0
+        self.user_ids: list[str] = []
+        self._user_codes: dict[str, int] = {}
+        self._arrays = {name: np.empty(capacity, dtype) for name, dtype in COLUMNS.items()}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def nbytes(self) -> int:
+        return sum(dtype().itemsize for dtype in COLUMNS.values()) * self.size
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        The `size` values of a column (a view, not a copy).
+        """
+        return self._arrays[name][:self.size]
+
+    def _snapshot(self) -> dict[str, np.ndarray]:
+        """
+        Views of every column over the same rows: `size` is read once, so
+        an append running meanwhile cannot lengthen some columns and not
+        others.
+        """
+        size = self.size
+        return {name: array[:size] for name, array in dict(self._arrays).items()}
+
+    def recorded_at_array(self) -> np.ndarray:
+        return self.column("recorded_at").view("datetime64[us]")
+
+    def user_codes(self, user_ids: Iterable[str]) -> np.ndarray:
+        """
+        Dictionary codes of user ids, adding the ones not seen yet.
+        """
+        codes = self._user_codes
+        result = []
+        for user_id in user_ids:
+            code = codes.get(user_id)
+            if code is None:
+                code = codes[user_id] = len(self.user_ids)
+                self.user_ids.append(user_id)
+            result.append(code)
+        return np.array(result, dtype=np.int32)
+
+    def _reserve(self, count: int) -> None:
+        capacity = len(self._arrays["id"])
+        if self.size + count <= capacity:
+            return
+        capacity = max(self.size + count, 2 * capacity, MIN_CAPACITY)
+        for name, dtype in COLUMNS.items():
+            grown = np.empty(capacity, dtype)
+            grown[:self.size] = self._arrays[name][:self.size]
+            self._arrays[name] = grown
+
+    def append(
+        self,
+        ids: Sequence[int],
+        user_ids: Sequence[str],
+        recorded_at: Union[Sequence[Optional[datetime]], np.ndarray],
+        height_m: Sequence[float],
+        weight_kg: Sequence[float],
+        bmi: Sequence[float],
+        category_id: Sequence[int]
+    ) -> int:
+        """
+        Add measurements, one value per row in every argument; recorded_at
+        is datetimes or an int64 array of epoch microseconds. Returns the
+        number of rows added.
+        """
+        count = len(ids)
+        if not count:
+            return 0
+        if not isinstance(recorded_at, np.ndarray):
+            recorded_at = _to_epoch(recorded_at)
+        with self._lock:
+            values = {
+                "id": ids,
+                "user": self.user_codes(user_ids),
+                "recorded_at": recorded_at,
+                "height_m": height_m,
+                "weight_kg": weight_kg,
+                "bmi": bmi,
+                "category_id": category_id,
+            }
+            if any(len(column) != count for column in values.values()):
+                raise ValueError("Every column needs one value per row")
+            self._reserve(count)
+            end = self.size + count
+            for name, column in values.items():
+                self._arrays[name][self.size:end] = column
+            self.last_id = max(self.last_id, int(np.max(self._arrays["id"][self.size:end])))
+            # Published last: queries never see a partly written row
+            self.size = end
+        return count
+
+    def refresh(self, conn: Connection, batch_size: int = 100000) -> int:
+        """
+        Append the measurements stored past the highest id held, reading
+        `batch_size` rows at a time; returns the number of rows added.
+        """
+        added = 0
+        result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(
+            _load_query(self.last_id)
+        )
+        for rows in result.partitions(batch_size):
+            ids, user_ids, recorded_at, height_m, weight_kg, bmi, category_id = zip(*rows)
+            added += self.append(
+                ids,
+                user_ids,
+                np.array(recorded_at, dtype="datetime64[us]").view(np.int64),
+                height_m,
+                weight_kg,
+                bmi,
+                category_id
+            )
+        return added
+
+    @classmethod
+    def load(cls, conn: Connection, batch_size: int = 100000) -> "MeasurementColumns":
+        """
+        Build a store of every measurement in the table.
+        """
+        store = cls()
+        store.refresh(conn, batch_size)
+        return store
+
+    # Queries --------------------------------------------------------------
+
+    def mask(
+        self,
+        user_id: Optional[str] = None,
+        category_id: Optional[int] = None,
+        start: TimeBound = None,
+        end: TimeBound = None,
+        min_bmi: Optional[float] = None,
+        max_bmi: Optional[float] = None
+    ) -> np.ndarray:
+        """
+        Boolean array selecting the rows matching every filter given:
+        recorded from `start` to `end` and BMI from `min_bmi` to `max_bmi`,
+        bounds included.
+        """
+        return self._mask(self._snapshot(), user_id, category_id, start, end, min_bmi, max_bmi)
+
+    def _mask(
+        self,
+        columns: dict[str, np.ndarray],
+        user_id: Optional[str] = None,
+        category_id: Optional[int] = None,
+        start: TimeBound = None,
+        end: TimeBound = None,
+        min_bmi: Optional[float] = None,
+        max_bmi: Optional[float] = None
+    ) -> np.ndarray:
+        size = len(columns["id"])
+        selected = np.ones(size, dtype=bool)
+        if user_id is not None:
+            code = self._user_codes.get(user_id)
+            if code is None:
+                return np.zeros(size, dtype=bool)
+            selected &= columns["user"] == code
+        if category_id is not None:
+            selected &= columns["category_id"] == category_id
+        low, high = _bound(start, end=False), _bound(end, end=True)
+        if low is not None or high is not None:
+            recorded_at = columns["recorded_at"]
+            selected &= recorded_at != NULL_TIME
+            if low is not None:
+                selected &= recorded_at >= low
+            if high is not None:
+                selected &= recorded_at < high
+        if min_bmi is not None:
+            selected &= columns["bmi"] >= min_bmi
+        if max_bmi is not None:
+            selected &= columns["bmi"] <= max_bmi
+        return selected
+
+    def aggregate(self, column: str = "bmi", by: Optional[str] = None, **filters) -> dict:
+        """
+        count, sum, mean, min and max of `column` over the rows matching
+        `filters` (see mask()); with `by` ("user_id" or "category_id"),
+        a dict of them per group.
+        """
+        if by is not None and by not in GROUP_BY:
+            raise ValueError(f"Cannot group by {by} (available: {', '.join(GROUP_BY)})")
+        columns = self._snapshot()
+        selected = self._mask(columns, **filters)
+        values = columns[column][selected].astype(np.float64)
+        if by is None:
+            if not len(values):
+                return {"count": 0, "sum": 0.0, "mean": None, "min": None, "max": None}
+            total = float(values.sum())
+            return {
+                "count": len(values),
+                "sum": total,
+                "mean": total / len(values),
+                "min": float(values.min()),
+                "max": float(values.max()),
+            }
+
+        keys = columns["user" if by == "user_id" else "category_id"][selected]
+        if not len(keys):
+            return {}
+        order = np.argsort(keys, kind="stable")
+        keys, values = keys[order], values[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        counts = np.diff(np.r_[starts, len(keys)])
+        sums = np.add.reduceat(values, starts)
+        groups = zip(
+            keys[starts].tolist(),
+            counts.tolist(),
+            sums.tolist(),
+            np.minimum.reduceat(values, starts).tolist(),
+            np.maximum.reduceat(values, starts).tolist()
+        )
+        return {
+            self.user_ids[key] if by == "user_id" else key: {
+                "count": count, "sum": total, "mean": total / count, "min": low, "max": high,
+            }
+            for key, count, total, low, high in groups
+        }
+
+    def percentiles(self, percentiles: Sequence[float], column: str = "bmi", **filters) -> list[Optional[float]]:
+        """
+        Exact percentiles (0-100, linear interpolation) of `column` over
+        the rows matching `filters`; None for each when no row matches.
+        """
+        columns = self._snapshot()
+        values = columns[column][self._mask(columns, **filters)]
+        if not len(values):
+            return [None] * len(percentiles)
+        return np.percentile(values, percentiles).tolist()
+
+    # Persistence ----------------------------------------------------------
+
+    def save(self, directory: Union[str, Path]) -> None:
+        """
+        Write the columns to `directory` (created if missing): into a new
+        data directory, which meta.json is then switched to with one
+        os.replace, so a reader sees the old save or the new, never a mix.
+        The previous data directory is removed.
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            arrays = self._snapshot()
+            arrays["user_ids"] = np.array(self.user_ids, dtype=str)
+            data = f"data-{uuid.uuid4().hex}"
+            meta = {"version": FORMAT_VERSION, "data": data, "size": len(arrays["id"]), "last_id": self.last_id}
+        (directory / data).mkdir()
+        for name, array in arrays.items():
+            np.save(directory / data / f"{name}.npy", array)
+        temporary = directory / "meta.json.tmp"
+        temporary.write_text(json.dumps(meta))
+        os.replace(temporary, directory / "meta.json")
+        for previous in directory.glob("data-*"):
+            if previous.name != data:
+                shutil.rmtree(previous, ignore_errors=True)
+
+    @classmethod
+    def open(cls, directory: Union[str, Path], mmap: bool = True) -> "MeasurementColumns":
+        """
+        A store saved by save(), its columns memory-mapped (read on
+        demand by the OS) unless `mmap` is False.
+        """
+        directory = Path(directory)
+        for attempt in range(3):
+            meta = json.loads((directory / "meta.json").read_text())
+            if meta["version"] != FORMAT_VERSION:
+                raise ValueError(f"Unsupported columnar store version: {meta['version']}")
+            data = directory / meta["data"]
+            try:
+                arrays = {
+                    name: np.load(data / f"{name}.npy", mmap_mode="r" if mmap else None)
+                    for name in COLUMNS
+                }
+                user_ids = np.load(data / "user_ids.npy").tolist()
+                break
+            except FileNotFoundError:
+                # Replaced by a save() since meta.json was read: read it again
+                if attempt == 2:
+                    raise
+        store = cls()
+        for name, array in arrays.items():
+            store._arrays[name] = array[:meta["size"]]
+        store.user_ids = user_ids
+        store._user_codes = {user_id: code for code, user_id in enumerate(store.user_ids)}
+        store.size = meta["size"]
+        store.last_id = meta["last_id"]
+        return store
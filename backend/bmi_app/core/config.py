@@ -28,6 +28,19 @@ class Settings(BaseSettings):
 
     # Database settings
     database_url: str = "sqlite:///./bmi_calculator.db"
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30.0
+    db_pool_pre_ping: bool = True
+    db_pool_recycle: int = 1800
+    db_async: bool = False  # serve DB-backed routes through AsyncSession
+
+    # SQLite pragmas, applied to every new connection
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_mmap_size: int = 256 * 1024 * 1024
+    sqlite_cache_size: int = -64000  # negative: size in KiB
+    sqlite_busy_timeout: int = 5000  # milliseconds
 
     # Security settings
     secret_key: str = "your-secret-key-here-change-in-production"
@@ -48,7 +61,60 @@ class Settings(BaseSettings):
     # Server settings
     host: str = "127.0.0.1"
     port: int = 8000
+    workers: int = 0  # worker processes, 0: one per CPU
+    server_loop: str = "auto"  # auto (uvloop if installed), asyncio or uvloop
+    server_http: str = "auto"  # auto (httptools if installed), h11 or httptools
+    server_preload: bool = False  # import the app once, before forking workers
+    server_reuse_port: bool = False  # one SO_REUSEPORT socket per worker
+    server_backlog: int = 2048
+    server_keepalive_timeout: float = 5.0
+    server_graceful_timeout: float = 30.0  # seconds to drain a stopping worker
+
+    # Monitoring settings
+    metrics_enabled: bool = True  # /metrics and request instrumentation
+    metrics_query_timing: bool = False  # time every SQL statement (~20 µs each)
+    profiling_enabled: bool = False  # sampled per-request profiles
+    profile_sample_rate: float = 0.0  # fraction of requests profiled
+    profile_header: str = "X-Profile"  # requests carrying it, set to profile_token, are profiled
+    profile_token: str = ""  # shared secret for profile_header; empty: header ignored
+    profile_interval: float = 0.001  # seconds between stack samples
+    profile_format: str = "collapsed"  # or "speedscope"
+    profile_dir: str = "./profiles"
+    profile_slow_sql_ms: float = 50.0
+
+    # Serialization settings
+    fast_json: bool = False  # encode BMI/category responses with orjson
+
+    # BMI settings
+    bmi_batch_max_records: int = 10000
+    bmi_stream_chunk_size: int = 1000
+    bmi_stream_spool_bytes: int = 8 * 1024 * 1024
+
+    # Measurement settings
+    measurement_bulk_max_rows: int = 100000
+    measurement_bulk_chunk_size: int = 1000
+    measurement_rollups: bool = False  # maintain and read trend rollups
+    measurement_analytics: bool = False  # maintain and read BMI histograms
+    measurement_export_batch_size: int = 50000  # rows per Arrow record batch
+    measurement_list_load: str = "rows"  # how list routes load rows (crud.LOAD_STRATEGIES)
+    measurement_columns_path: str = "./measurements.columns"  # saved columnar store (core/columnar.py)
+
+    # Write-behind settings (POST /measurements/ queues, a writer group-commits)
+    measurement_write_behind: bool = False
+    write_behind_queue_size: int = 10000
+    write_behind_batch_size: int = 500  # rows per group commit
+    write_behind_max_delay_ms: float = 50.0  # longest a row waits for its group
+    write_behind_put_timeout: float = 0.5  # seconds a request waits for room, then 503
+    write_behind_drain_timeout: float = 10.0  # seconds to drain at shutdown, then spill
+    write_behind_spool_path: str = "./write_behind_spool.ndjson"
 
+    # Cache settings
+    category_cache_ttl_seconds: float = 300.0
+    bmi_cache_size: int = 4096  # /bmi/ responses kept, 0 disables
+    user_cache_size: int = 10000  # username/email lookups kept, 0 disables the user index
+    user_filter_error_rate: float = 0.01  # Bloom filter false positive rate
+    user_filter_refresh_seconds: float = 1.0  # read users added by other processes
+    user_filter_rebuild_seconds: float = 300.0  # rebuild the filter from scratch
 
 
 @lru_cache()
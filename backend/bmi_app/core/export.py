@@ -0,0 +1,231 @@
+"""
+Script Name : export.py
+Description : Columnar export of measurements to Parquet / Arrow IPC
+Author      : @tonybnya
+
+Rows are read from a plain SQL cursor `batch_size` at a time and turned
+into Arrow record batches, then written to the sink one batch at a time:
+memory stays bounded by one batch whatever the table size, and no ORM
+object is built. Only the requested columns are selected (the categories
+join only when `category` is one of them).
+
+pyarrow is optional (`pip install "backend[export]"`) and only imported
+when an export runs.
+"""
+import importlib.util
+from datetime import date, datetime, timedelta
+from typing import Iterable, Iterator, Optional, Sequence
+
+from sqlalchemy import String, select, type_coerce
+from sqlalchemy.engine import Connection
+
+from bmi_app.models import Category, HeightUnit, Measurement, WeightUnit
+
+EXPORT_FORMATS = {
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.file",
+}
+EXPORT_SUFFIXES = {".parquet": "parquet", ".arrow": "arrow", ".feather": "arrow"}
+DEFAULT_COMPRESSION = {"parquet": "zstd", "arrow": None}
+
+_measurements = Measurement.__table__
+_categories = Category.__table__
+
+# Column name -> (select expression, Arrow type name). Enums and timestamps
+# are read as the raw stored strings and converted per batch by Arrow
+EXPORT_COLUMNS = {
+    "id": (_measurements.c.id, "int64"),
+    "user_id": (_measurements.c.user_id, "string"),
+    "category_id": (_measurements.c.category_id, "int32"),
+    "category": (_categories.c.name, "string"),
+    "height": (_measurements.c.height, "float64"),
+    "height_unit": (type_coerce(_measurements.c.height_unit, String), "string"),
+    "weight": (_measurements.c.weight, "float64"),
+    "weight_unit": (type_coerce(_measurements.c.weight_unit, String), "string"),
+    "height_m": (_measurements.c.height_m, "float64"),
+    "weight_kg": (_measurements.c.weight_kg, "float64"),
+    "bmi": (_measurements.c.bmi, "float64"),
+    "recorded_at": (type_coerce(_measurements.c.recorded_at, String), "timestamp"),
+    "notes": (_measurements.c.notes, "string"),
+}
+# Stored enum names -> exported values ("CM" -> "cm")
+_ENUMS = {"height_unit": HeightUnit, "weight_unit": WeightUnit}
+
+
+def export_available() -> bool:
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise RuntimeError('Exports need pyarrow: pip install "backend[export]"') from None
+    return pyarrow
+
+
+def _check_columns(columns: Optional[Sequence[str]]) -> list[str]:
+    if not columns:
+        return list(EXPORT_COLUMNS)
+    unknown = [name for name in columns if name not in EXPORT_COLUMNS]
+    if unknown:
+        raise ValueError(
+            f"Unknown columns: {', '.join(unknown)} (available: {', '.join(EXPORT_COLUMNS)})"
+        )
+    return list(dict.fromkeys(columns))
+
+
+def _arrow_type(pa, name: str):
+    return pa.timestamp("us") if name == "timestamp" else getattr(pa, name)()
+
+
+def export_schema(columns: Optional[Sequence[str]] = None):
+    """
+    Arrow schema of an export of `columns` (all of them by default).
+    """
+    pa = _pyarrow()
+    return pa.schema([
+        pa.field(name, _arrow_type(pa, EXPORT_COLUMNS[name][1]), nullable=name in ("notes", "recorded_at"))
+        for name in _check_columns(columns)
+    ])
+
+
+def export_query(
+    columns: Optional[Sequence[str]] = None,
+    category_id: Optional[int] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None
+):
+    """
+    SELECT of `columns` for the measurements of one category or all,
+    recorded from `start` to `end` inclusive, by id.
+    """
+    columns = _check_columns(columns)
+    source = _measurements
+    if "category" in columns:
+        source = source.join(_categories, _categories.c.id == _measurements.c.category_id)
+    query = select(*(EXPORT_COLUMNS[name][0].label(name) for name in columns)).select_from(source)
+    if category_id is not None:
+        query = query.where(_measurements.c.category_id == category_id)
+    if start is not None:
+        query = query.where(_measurements.c.recorded_at >= datetime(start.year, start.month, start.day))
+    if end is not None:
+        query = query.where(
+            _measurements.c.recorded_at < datetime(end.year, end.month, end.day) + timedelta(days=1)
+        )
+    return query.order_by(_measurements.c.id)
+
+
+def record_batches(
+    conn: Connection,
+    columns: Optional[Sequence[str]] = None,
+    category_id: Optional[int] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    batch_size: int = 50000
+) -> Iterator:
+    """
+    Arrow record batches of at most `batch_size` measurements, fetched
+    from the cursor as they are consumed.
+    """
+    pa = _pyarrow()
+    columns = _check_columns(columns)
+    schema = export_schema(columns)
+    result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(
+        export_query(columns, category_id, start, end)
+    )
+    for rows in result.partitions(batch_size):
+        arrays = []
+        for field, values in zip(schema, zip(*rows)):
+            if field.name in _ENUMS:
+                names = pa.array(values, pa.string()).dictionary_encode()
+                labels = pa.array([_ENUMS[field.name][name].value for name in names.dictionary.to_pylist()])
+                array = pa.DictionaryArray.from_arrays(names.indices, labels).cast(pa.string())
+            elif pa.types.is_timestamp(field.type):
+                array = pa.array(values, pa.string()).cast(field.type)
+            else:
+                array = pa.array(values, field.type)
+            arrays.append(array)
+        yield pa.record_batch(arrays, schema=schema)
+
+
+def open_writer(sink, fmt: str, schema, compression: Optional[str] = None):
+    """
+    Parquet or Arrow IPC (file format) writer on a path or file object.
+    """
+    pa = _pyarrow()
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported format: {fmt}")
+    if compression is None:
+        compression = DEFAULT_COMPRESSION[fmt]
+    elif compression == "none":
+        compression = None
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        return pq.ParquetWriter(sink, schema, compression=compression or "none")
+    return pa.ipc.new_file(sink, schema, options=pa.ipc.IpcWriteOptions(compression=compression))
+
+
+def write_export(batches: Iterable, sink, fmt: str, schema, compression: Optional[str] = None) -> int:
+    """
+    Write every batch to `sink`; returns the number of rows.
+    """
+    rows = 0
+    writer = open_writer(sink, fmt, schema, compression)
+    try:
+        for batch in batches:
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    finally:
+        writer.close()
+    return rows
+
+
+class _ChunkSink:
+    """
+    Write-only file object collecting what the writer produced since
+    the last drain().
+    """
+
+    def __init__(self):
+        self.chunks: list[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_export(batches: Iterable, fmt: str, schema, compression: Optional[str] = None) -> Iterator[bytes]:
+    """
+    Encode the batches as they come, yielding the file's bytes per batch.
+    """
+    sink = _ChunkSink()
+    writer = open_writer(sink, fmt, schema, compression)
+    try:
+        for batch in batches:
+            writer.write_batch(batch)
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
@@ -0,0 +1,372 @@
+"""
+Script Name : metrics.py
+Description : In-process metrics with Prometheus text exposition
+Author      : @tonybnya
+
+Counters, gauges and histograms are plain dicts keyed by label values,
+updated under a per-metric lock; rendering happens only when /metrics is
+scraped. Request-scoped DB statistics travel in a contextvar, which
+run_in_threadpool copies into the worker thread.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Iterable, Optional, Sequence
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Seconds; tuned for a sub-millisecond API with a SQLite backend
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0
+)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r'\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    """
+    Base class: a named metric with a fixed tuple of label names.
+    """
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """
+    Monotonically increasing value per label set.
+    """
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def samples(self) -> Iterable[str]:
+        for labels, value in list(self._values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Gauge(Counter):
+    """
+    Value per label set that can go up and down.
+    """
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels: str, value: float) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+
+class CallbackGauge(Metric):
+    """
+    Gauge whose samples are read from `callback` at scrape time; the
+    callback yields (label values, value) pairs.
+    """
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str],
+        callback: Callable[[], Iterable[tuple[tuple, float]]]
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def samples(self) -> Iterable[str]:
+        for labels, value in self.callback():
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Histogram(Metric):
+    """
+    Distribution of observed values over fixed buckets, per label set.
+    """
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return series[2] if series else 0
+
+    def sum(self, *labels: str) -> float:
+        series = self._series.get(labels)
+        return series[1] if series else 0.0
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            snapshot = [(labels, list(series[0]), series[1], series[2])
+                        for labels, series in self._series.items()]
+        for labels, counts, total, count in snapshot:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}"
+
+
+class Registry:
+    """
+    The set of metrics rendered by /metrics.
+    """
+
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.register(Counter(
+    "http_requests_total", "HTTP requests handled", ("method", "route", "status")
+))
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ("method", "route")
+))
+http_requests_in_progress = registry.register(Gauge(
+    "http_requests_in_progress", "HTTP requests being handled", ("method",)
+))
+http_request_db_queries = registry.register(Histogram(
+    "http_request_db_queries", "SQL statements executed per HTTP request", ("route",),
+    buckets=QUERY_COUNT_BUCKETS
+))
+http_request_db_duration = registry.register(Histogram(
+    "http_request_db_duration_seconds", "Time spent in SQL per HTTP request", ("route",)
+))
+db_query_duration = registry.register(Histogram(
+    "db_query_duration_seconds", "SQL statement latency", ("engine", "operation")
+))
+db_query_errors = registry.register(Counter(
+    "db_query_errors_total", "SQL statements that raised", ("engine", "operation")
+))
+
+
+class RequestStats:
+    """
+    SQL statements issued while handling the current request. When
+    `slow_queries` is a list (see core/profiling.py), statements taking
+    at least `slow_threshold` seconds are appended to it.
+    """
+    __slots__ = ("queries", "db_seconds", "slow_queries", "slow_threshold")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.slow_queries: Optional[list[tuple[str, float]]] = None
+        self.slow_threshold = 0.0
+
+
+request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+# Engine name -> pool, exported by db_pool_connections
+_pools: dict = {}
+# Engines whose statements are timed; without one, RequestStats stays at
+# zero and the per-request SQL series are not observed
+_timed_engines: set[str] = set()
+
+
+def instrument_engine(engine: Engine, name: str, query_timing: bool = True) -> None:
+    """
+    Export the pool usage of `engine` (pass `async_engine.sync_engine` for
+    an AsyncEngine); with `query_timing`, also time every statement it
+    runs and count the ones that fail.
+    """
+    _pools[name] = engine.pool
+    if not query_timing:
+        return
+    _timed_engines.add(name)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        operation = statement.split(None, 1)[0].upper() if statement else ""
+        db_query_duration.observe(elapsed, name, operation)
+        stats = request_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_seconds += elapsed
+            if stats.slow_queries is not None and elapsed >= stats.slow_threshold:
+                stats.slow_queries.append((statement, elapsed))
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        # after_cursor_execute does not run for a failed statement
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if context.execution_context is not None and started:
+            started.pop()
+        statement = context.statement
+        operation = statement.split(None, 1)[0].upper() if statement else ""
+        db_query_errors.inc(name, operation)
+
+
+def _pool_samples():
+    for name, pool in _pools.items():
+        # StaticPool and friends do not report usage
+        for state in ("size", "checkedout", "checkedin", "overflow"):
+            method = getattr(pool, state, None)
+            if method is not None:
+                yield (name, state), method()
+
+
+registry.register(CallbackGauge(
+    "db_pool_connections", "Connection pool usage", ("engine", "state"), _pool_samples
+))
+
+# Cache name -> object with a stats() method
+_caches: dict = {}
+
+
+def register_cache(name: str, cache) -> None:
+    """
+    Export a cache's stats() (hits, misses, evictions, size) and hit ratio.
+    """
+    _caches[name] = cache
+
+
+def _cache_samples():
+    for name, cache in _caches.items():
+        for key, value in cache.stats().items():
+            yield (name, key), value
+
+
+def _cache_ratio_samples():
+    for name, cache in _caches.items():
+        stats = cache.stats()
+        lookups = stats["hits"] + stats["misses"]
+        yield (name,), stats["hits"] / lookups if lookups else 0.0
+
+
+registry.register(CallbackGauge(
+    "cache_stats", "Cache counters and sizes", ("cache", "stat"), _cache_samples
+))
+registry.register(CallbackGauge(
+    "cache_hit_ratio", "Cache hits over lookups since start", ("cache",), _cache_ratio_samples
+))
+
+
+def route_template(scope) -> str:
+    """
+    The path template of the route that handled the request (e.g.
+    /measurements/users/{user_id}), to keep label cardinality bounded.
+    """
+    # Recent FastAPI versions resolve included routers lazily: the route
+    # in the scope is the router-relative one, the prefixed context is here
+    route = scope.get("fastapi", {}).get("effective_route_context") or scope.get("route")
+    return getattr(route, "path_format", None) or "<unmatched>"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording latency, in-flight requests and per-request
+    SQL statistics, labelled with the matched route template.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        stats = RequestStats()
+        token = request_stats.set(stats)
+        # Per method only: the route is not known before routing ran
+        http_requests_in_progress.inc(method)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            request_stats.reset(token)
+            http_requests_in_progress.dec(method)
+            route = route_template(scope)
+            http_requests.inc(method, route, str(status))
+            http_request_duration.observe(elapsed, method, route)
+            if _timed_engines:
+                http_request_db_queries.observe(stats.queries, route)
+                http_request_db_duration.observe(stats.db_seconds, route)
@@ -0,0 +1,235 @@
+"""
+Script Name : profiling.py
+Description : Sampled per-request profiling with flamegraph output
+Author      : @tonybnya
+
+A background thread snapshots every thread's stack (sys._current_frames)
+while at least one profiled request is in flight. A stack belongs to a
+request when it runs through that request's middleware frame (code on
+the event loop) or through its endpoint function (sync endpoints in the
+threadpool). Two concurrent profiled requests to the same sync endpoint
+cannot be told apart in the threadpool and share those samples.
+"""
+import hmac
+import inspect
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from bmi_app.core.config import Settings
+from bmi_app.core.metrics import RequestStats, request_stats, route_template
+
+logger = logging.getLogger(__name__)
+
+PROFILE_FORMATS = ("collapsed", "speedscope")
+
+
+def frame_name(code) -> str:
+    return f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class RequestProfile:
+    """
+    Stack samples collected for one request.
+    """
+
+    def __init__(self, scope, frame):
+        self.scope = scope
+        self.frame = frame
+        self.samples: Counter[tuple] = Counter()
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        self._endpoint_code = None
+
+    def endpoint_code(self):
+        if self._endpoint_code is None:
+            endpoint = self.scope.get("endpoint")
+            if endpoint is not None:
+                self._endpoint_code = getattr(inspect.unwrap(endpoint), "__code__", None)
+        return self._endpoint_code
+
+    def owns(self, stack: list) -> bool:
+        endpoint_code = self.endpoint_code()
+        return any(
+            frame is self.frame or frame.f_code is endpoint_code
+            for frame in stack
+        )
+
+
+class Sampler:
+    """
+    Stack sampling thread, running only while requests are profiled.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._profiles: set[RequestProfile] = set()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, profile: RequestProfile) -> None:
+        with self._lock:
+            self._profiles.add(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="request-profiler", daemon=True
+                )
+                self._thread.start()
+
+    def remove(self, profile: RequestProfile) -> None:
+        with self._lock:
+            self._profiles.discard(profile)
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while True:
+            with self._lock:
+                if not self._profiles:
+                    self._thread = None
+                    return
+                profiles = list(self._profiles)
+
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame)
+                    frame = frame.f_back
+                owners = [profile for profile in profiles if profile.owns(stack)]
+                if owners:
+                    key = tuple(frame_name(frame.f_code) for frame in reversed(stack))
+                    for profile in owners:
+                        profile.samples[key] += 1
+            # Do not keep other threads' frames alive while sleeping
+            stack = frame = None
+            time.sleep(self.interval)
+
+
+def to_collapsed(profile: RequestProfile) -> str:
+    """
+    Brendan Gregg's collapsed-stack format (flamegraph.pl, speedscope).
+    """
+    return "".join(
+        f"{';'.join(stack)} {count}\n" for stack, count in profile.samples.items()
+    )
+
+
+def to_speedscope(profile: RequestProfile, name: str, interval: float) -> str:
+    """
+    speedscope's JSON file format, one sampled profile.
+    """
+    frames: dict[str, int] = {}
+    samples, weights = [], []
+    for stack, count in profile.samples.items():
+        samples.append([frames.setdefault(frame, len(frames)) for frame in stack])
+        weights.append(count * interval)
+    return json.dumps({
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "bmi_app",
+        "activeProfileIndex": 0,
+        "shared": {"frames": [{"name": frame} for frame in frames]},
+        "profiles": [{
+            "type": "sampled",
+            "name": name,
+            "unit": "seconds",
+            "startValue": 0,
+            "endValue": profile.duration,
+            "samples": samples,
+            "weights": weights,
+        }],
+    })
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware profiling `profile_sample_rate` of the requests, and
+    every request whose `profile_header` header holds `profile_token`
+    (the header is ignored while no token is configured). Profiles are
+    written to `profile_dir`, named after the route; SQL statements over
+    `profile_slow_sql_ms` go to a .sql.json file next to them.
+    """
+
+    def __init__(self, app, config: Settings):
+        if config.profile_format not in PROFILE_FORMATS:
+            raise ValueError(f"Unknown profile format {config.profile_format!r}")
+        self.app = app
+        self.config = config
+        self.header = config.profile_header.lower().encode("latin-1")
+        self.token = config.profile_token.encode("latin-1")
+        self.sampler = Sampler(config.profile_interval)
+
+    def should_profile(self, scope) -> bool:
+        if random.random() < self.config.profile_sample_rate:
+            return True
+        if not self.token:
+            return False
+        return any(
+            name == self.header and hmac.compare_digest(value, self.token)
+            for name, value in scope["headers"]
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        stats = request_stats.get()
+        token = None
+        if stats is None:
+            stats = RequestStats()
+            token = request_stats.set(stats)
+        stats.slow_queries = []
+        stats.slow_threshold = self.config.profile_slow_sql_ms / 1000
+
+        profile = RequestProfile(scope, sys._getframe())
+        self.sampler.add(profile)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.sampler.remove(profile)
+            profile.duration = time.perf_counter() - profile.started
+            slow_queries, stats.slow_queries = stats.slow_queries, None
+            if token is not None:
+                request_stats.reset(token)
+            await run_in_threadpool(self.write, profile, scope, slow_queries)
+
+    def write(self, profile: RequestProfile, scope, slow_queries: list) -> Path:
+        """
+        Save the profile (and slow statements) under `profile_dir`.
+        """
+        route = route_template(scope)
+        name = f"{scope['method']} {route}"
+        slug = route.strip("/").replace("/", "_").replace("{", "").replace("}", "") or "root"
+        stem = f"{time.strftime('%Y%m%dT%H%M%S')}-{scope['method']}-{slug}-{uuid.uuid4().hex[:8]}"
+
+        directory = Path(self.config.profile_dir)
+        directory.mkdir(parents=True, exist_ok=True)
+        if self.config.profile_format == "speedscope":
+            path = directory / f"{stem}.speedscope.json"
+            path.write_text(to_speedscope(profile, name, self.config.profile_interval))
+        else:
+            path = directory / f"{stem}.collapsed"
+            path.write_text(to_collapsed(profile))
+
+        if slow_queries:
+            (directory / f"{stem}.sql.json").write_text(json.dumps([
+                {"statement": statement, "seconds": seconds}
+                for statement, seconds in slow_queries
+            ], indent=2))
+            for statement, seconds in slow_queries:
+                logger.warning("slow SQL in %s (%.1f ms): %s", name, seconds * 1000, statement)
+
+        logger.info("profiled %s in %.1f ms -> %s", name, profile.duration * 1000, path)
+        return path
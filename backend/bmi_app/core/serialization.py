@@ -0,0 +1,44 @@
+"""
+Script Name : serialization.py
+Description : JSON encoding of hand-built API responses
+Author      : @tonybnya
+"""
+from typing import Any
+
+from fastapi import Response
+from pydantic_core import to_json
+
+from bmi_app.core.config import get_settings
+
+try:
+    import orjson
+except ImportError:  # optional, see the "fast" extra
+    orjson = None
+
+settings = get_settings()
+
+
+def fast_json_enabled() -> bool:
+    """
+    Whether routes should skip their response models and encode plain
+    data with orjson (`fast_json` is on and orjson is installed).
+    """
+    return settings.fast_json and orjson is not None
+
+
+def dumps(value: Any) -> bytes:
+    """
+    Encode `value` to JSON: orjson in fast mode, pydantic's encoder
+    otherwise.
+    """
+    if fast_json_enabled():
+        return orjson.dumps(value)
+    return to_json(value)
+
+
+def json_response(value: Any) -> Response:
+    """
+    A JSON response for data that already matches the route's
+    response_model, so FastAPI does not validate it again.
+    """
+    return Response(content=dumps(value), media_type="application/json")
@@ -0,0 +1,152 @@
+"""
+Script Name : streaming.py
+Description : Incremental NDJSON/CSV scoring shared by the API and scripts
+Author      : @tonybnya
+"""
+import csv
+import io
+import json
+from typing import Iterable, Iterator, Optional
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+SCORE_FIELDS = ["bmi", "bmi_raw", "category", "errors"]
+
+
+def to_float(value) -> Optional[float]:
+    """
+    Coerce a JSON/CSV cell to float, None when it is not a number.
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def to_str(value) -> Optional[str]:
+    """
+    A JSON/CSV cell holding a unit, None when it is not a string.
+    """
+    return value if isinstance(value, str) else None
+
+
+def score_rows(rows: list[dict]) -> list[dict]:
+    """
+    Add bmi, bmi_raw, category and errors to every row, in place.
+    """
+    # Imported on first use: numpy is not needed to start the app
+    from bmi_app.core.vectorized import score_batch
+
+    scored = score_batch(
+        [to_float(row.get("height")) for row in rows],
+        [to_str(row.get("height_unit")) for row in rows],
+        [to_float(row.get("weight")) for row in rows],
+        [to_str(row.get("weight_unit")) for row in rows]
+    )
+    for index, bmi, bmi_raw, category in zip(
+        scored.indices.tolist(),
+        scored.bmi.tolist(),
+        scored.bmi_raw.tolist(),
+        scored.category.tolist()
+    ):
+        rows[index].update(bmi=bmi, bmi_raw=bmi_raw, category=category, errors=[])
+    for error in scored.errors:
+        row = rows[error.index]
+        # Keep errors raised while parsing the line (see NDJSONCodec.parse)
+        previous = row.get("errors")
+        row.update(
+            bmi=None,
+            bmi_raw=None,
+            category=None,
+            errors=(previous if isinstance(previous, list) else []) + error.errors
+        )
+    return rows
+
+
+class NDJSONCodec:
+    """
+    One JSON object per line in, the same object enriched out.
+    """
+    media_type = MEDIA_TYPES["ndjson"]
+
+    def parse(self, line: str) -> Optional[dict]:
+        if not line.strip():
+            return None
+        try:
+            row = json.loads(line)
+        except ValueError:
+            return {"errors": ["line is not valid JSON"]}
+        if not isinstance(row, dict):
+            return {"errors": ["line is not a JSON object"]}
+        return row
+
+    def encode(self, rows: list[dict]) -> str:
+        return "".join(json.dumps(row) + "\n" for row in rows)
+
+
+class CSVCodec:
+    """
+    Header line first, then one record per line; quoted fields must not
+    span lines. Output repeats the input columns plus the score columns.
+    """
+    media_type = MEDIA_TYPES["csv"]
+
+    def __init__(self):
+        self.fieldnames: Optional[list[str]] = None
+        self.header_sent = False
+
+    def parse(self, line: str) -> Optional[dict]:
+        if not line.strip():
+            return None
+        values = next(csv.reader([line]))
+        if self.fieldnames is None:
+            self.fieldnames = [name.strip() for name in values]
+            return None
+        return dict(zip(self.fieldnames, values))
+
+    def encode(self, rows: list[dict]) -> str:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        columns = [
+            name for name in (self.fieldnames or []) if name not in SCORE_FIELDS
+        ] + SCORE_FIELDS
+        if not self.header_sent:
+            writer.writerow(columns)
+            self.header_sent = True
+        for row in rows:
+            row["errors"] = "; ".join(row["errors"])
+            writer.writerow([row.get(name) for name in columns])
+        return buffer.getvalue()
+
+
+def get_codec(fmt: str):
+    """
+    Return a fresh codec for 'ndjson' or 'csv'.
+    """
+    if fmt == "ndjson":
+        return NDJSONCodec()
+    if fmt == "csv":
+        return CSVCodec()
+    raise ValueError(f"Unsupported format: {fmt}")
+
+
+def stream_scored(lines: Iterable[str], codec, chunk_size: int) -> Iterator[str]:
+    """
+    Score an iterable of input lines, yielding encoded output per chunk.
+    At most `chunk_size` rows are held in memory at any time.
+    """
+    chunk: list[dict] = []
+    for line in lines:
+        row = codec.parse(line)
+        if row is None:
+            continue
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield codec.encode(score_rows(chunk))
+            chunk = []
+    if chunk:
+        yield codec.encode(score_rows(chunk))
@@ -0,0 +1,185 @@
+"""
+Script Name : user_index.py
+Description : Cached lookups over the unique username and email columns
+Author      : @tonybnya
+
+Two layers answer "which user has this username / email":
+- a Bloom filter of every username and email: a value it rules out is
+  absent, answered without a query (availability checks at signup);
+- a bounded LRU of recent answers, value -> user id, or "" when absent.
+
+The user CRUD writes update both. Users added by other processes (server
+workers, scripts) are read at most every `user_filter_refresh_seconds`
+(one query for the rows past the last rowid seen); until then such a
+user can look absent. The filter is rebuilt from scratch every
+`user_filter_rebuild_seconds`, which also drops the names deleted or
+renamed elsewhere. A cached id whose user is gone or renamed is checked
+by the caller (see crud/users.py), so stale positives cost one query.
+"""
+import threading
+import time
+from typing import Callable, Optional
+
+from sqlalchemy import literal_column, select
+from sqlalchemy.orm import Session
+
+from bmi_app.core.cache import BloomFilter, LRUCache
+from bmi_app.core.config import Settings, get_settings
+from bmi_app.core.metrics import register_cache
+from bmi_app.models import User
+
+FIELDS = ("username", "email")
+# Smallest filter built, in keys
+MIN_FILTER_CAPACITY = 1024
+
+
+class UserIndex:
+    """
+    Bloom filter and LRU of user ids by username / email.
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        error_rate: float = 0.01,
+        refresh_seconds: float = 1.0,
+        rebuild_seconds: float = 300.0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.enabled = capacity > 0
+        self.answers = LRUCache(capacity)
+        # user id -> the answers cached for it, to forget a user whose
+        # names are not known (UPDATE/DELETE ... RETURNING)
+        self.keys_by_id = LRUCache(capacity)
+        self.error_rate = error_rate
+        self.refresh_seconds = refresh_seconds
+        self.rebuild_seconds = rebuild_seconds
+        self.clock = clock
+        self.filtered = 0  # lookups the filter answered alone
+        self.queries = 0
+        self._filter: Optional[BloomFilter] = None
+        self._last_rowid = 0
+        self._refresh_at = 0.0
+        self._rebuild_at = 0.0
+        self._lock = threading.Lock()
+
+    def user_id_for(self, db: Session, field: str, value: str) -> Optional[str]:
+        """
+        Id of the user whose `field` ("username" or "email") is `value`.
+        """
+        column = getattr(User, field)
+        if not self.enabled:
+            return db.scalar(select(User.id).where(column == value))
+
+        self._sync(db)
+        if f"{field}:{value}" not in self._filter:
+            self.filtered += 1
+            return None
+        key = (field, value)
+        cached = self.answers.get(key)
+        if cached is not None:
+            return cached or None
+        self.queries += 1
+        user_id = db.scalar(select(User.id).where(column == value))
+        self._set(key, user_id)
+        return user_id
+
+    def _set(self, key: tuple[str, str], user_id: Optional[str]) -> None:
+        self.answers.set(key, user_id or "")
+        if user_id:
+            keys = self.keys_by_id.get(user_id)
+            if keys is None:
+                self.keys_by_id.set(user_id, {key})
+            else:
+                keys.add(key)
+
+    def add(self, user: User) -> None:
+        """
+        Record a user just created or updated (after the commit).
+        """
+        if not self.enabled:
+            return
+        for field in FIELDS:
+            value = getattr(user, field)
+            if self._filter is not None:
+                self._filter.add(f"{field}:{value}")
+            self._set((field, value), user.id)
+
+    def forget(self, field: str, value: str) -> None:
+        """
+        Drop the cached answer for a username / email that changed hands.
+        """
+        self.answers.pop((field, value))
+
+    def forget_user(self, user_id: str) -> None:
+        """
+        Drop every answer cached for a user updated or deleted.
+        """
+        for key in self.keys_by_id.get(user_id) or ():
+            self.answers.pop(key)
+        self.keys_by_id.pop(user_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._filter = None
+            self.answers.clear()
+            self.keys_by_id.clear()
+
+    def _sync(self, db: Session) -> None:
+        """
+        Build the filter, or read the users added since the last refresh.
+        """
+        now = self.clock()
+        if self._filter is not None and now < self._refresh_at:
+            return
+        with self._lock:
+            if self._filter is not None and now < self._refresh_at:
+                return
+            bloom = self._filter
+            rebuild = bloom is None or now >= self._rebuild_at or bloom.count > bloom.capacity
+            query = select(literal_column("rowid"), User.username, User.email).select_from(User)
+            if not rebuild:
+                query = query.where(literal_column("rowid") > self._last_rowid)
+            rows = db.execute(query).all()
+            if rebuild:
+                bloom = BloomFilter(max(4 * len(rows), MIN_FILTER_CAPACITY), self.error_rate)
+                self.answers.clear()
+                self.keys_by_id.clear()
+                self._last_rowid = 0
+                self._rebuild_at = now + self.rebuild_seconds
+            for rowid, username, email in rows:
+                bloom.add(f"username:{username}")
+                bloom.add(f"email:{email}")
+                # Cached as absent before this refresh saw them
+                self.answers.pop(("username", username))
+                self.answers.pop(("email", email))
+                self._last_rowid = max(self._last_rowid, rowid)
+            self._filter = bloom
+            self._refresh_at = now + self.refresh_seconds
+
+    def stats(self) -> dict:
+        """
+        Counters for monitoring: hits are answers given without a query.
+        """
+        answers = self.answers.stats()
+        return {
+            "size": answers["size"],
+            "hits": answers["hits"] + self.filtered,
+            "misses": self.queries,
+            "filtered": self.filtered,
+            "evictions": answers["evictions"],
+        }
+
+
+def build_user_index(config: Settings) -> UserIndex:
+    return UserIndex(
+        config.user_cache_size,
+        error_rate=config.user_filter_error_rate,
+        refresh_seconds=config.user_filter_refresh_seconds,
+        rebuild_seconds=config.user_filter_rebuild_seconds,
+    )
+
+
+user_index = build_user_index(get_settings())
+
+register_cache("user", user_index)
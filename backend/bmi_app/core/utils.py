@@ -3,6 +3,9 @@ Script Name : core.py
 Description : Helper functions
 Author      : @tonybnya
 """
+from typing import Optional
+
+from bmi_app.core.category_index import get_category_index
 
 
 def calculate_bmi(height_m: float, weight_kg: float) -> tuple[float, float]:
@@ -22,22 +25,12 @@ def get_formula(bmi_raw: float, height_m: float, weight_kg: float) -> str:
     return f"{weight_kg} kg / ({height_m} m) ^ 2 = {bmi_raw}"
 
 
-def categorize(bmi: float) -> str:
+def categorize(bmi: float) -> Optional[str]:
     """
-    Define the category of a BMI measure.
+    Define the category of a BMI measure (None when no category contains it).
+    Boundaries come from the categories table (see core/category_index.py).
     """
-    if bmi < 18.5:
-        return "Underweight"
-    if bmi < 25:
-        return "Normal"
-    if bmi < 30:
-        return "Overweight"
-    if bmi < 35:
-        return "Obesity I"
-    if bmi < 40:
-        return "Obesity II"
-    # bmi above 40
-    return "Obesity III"
+    return get_category_index().name_for(bmi)
 
 
 def to_kg(weight: float, unit: str) -> float:
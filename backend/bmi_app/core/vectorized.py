@@ -0,0 +1,141 @@
+"""
+Script Name : vectorized.py
+Description : NumPy counterparts of the helpers in core/utils.py
+Author      : @tonybnya
+"""
+import math
+from typing import NamedTuple, Sequence
+
+import numpy as np
+
+from bmi_app.core.category_index import get_category_index
+from bmi_app.models import HeightUnit, WeightUnit
+
+HEIGHT_UNITS = frozenset(unit.value for unit in HeightUnit)
+WEIGHT_UNITS = frozenset(unit.value for unit in WeightUnit)
+
+
+class BatchError(NamedTuple):
+    """
+    Validation error attached to a single input row.
+    """
+    index: int
+    errors: list[str]
+
+
+class BatchResult(NamedTuple):
+    """
+    Scored rows of a batch, as parallel arrays over the valid rows.
+    """
+    indices: np.ndarray
+    height_m: np.ndarray
+    weight_kg: np.ndarray
+    bmi: np.ndarray
+    bmi_raw: np.ndarray
+    category: np.ndarray
+    errors: list[BatchError]
+
+
+def to_meters_array(heights: np.ndarray, units: np.ndarray) -> np.ndarray:
+    """
+    Convert an array of heights to meters, one unit per row.
+    Same rules (and float results) as to_meters().
+    """
+    return np.where(
+        units == "m",
+        heights,
+        np.where(units == "cm", heights / 100.0, heights * 0.0254)
+    )
+
+
+def to_kg_array(weights: np.ndarray, units: np.ndarray) -> np.ndarray:
+    """
+    Convert an array of weights to kilograms, one unit per row.
+    Same rules (and float results) as to_kg().
+    """
+    return np.where(units == "kg", weights, weights * 0.45359237)
+
+
+def calculate_bmi_array(
+    height_m: np.ndarray,
+    weight_kg: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Calculate the BMI of every row.
+    `** 2` on an array is a plain multiplication while calculate_bmi() goes
+    through libm pow(), so bmi_raw can differ from it in the last bit.
+    Rounding goes through round() because np.round() disagrees with it on
+    some halfway cases, which would move rows across category boundaries.
+    """
+    bmi_raw = weight_kg / (height_m ** 2)
+    bmi = np.array([round(value, 2) for value in bmi_raw.tolist()], dtype=np.float64)
+    return (bmi, bmi_raw)
+
+
+def categorize_array(bmi: np.ndarray) -> np.ndarray:
+    """
+    Define the category of every BMI measure in the array.
+    """
+    return get_category_index().names_for(bmi)
+
+
+def validate_row(
+    height: float | None,
+    height_unit: str | None,
+    weight: float | None,
+    weight_unit: str | None
+) -> list[str]:
+    """
+    Return the list of problems with a single row (empty when valid).
+    """
+    errors = []
+    if height is None or not math.isfinite(height) or height <= 0:
+        errors.append("height must be a finite number greater than 0")
+    if height_unit not in HEIGHT_UNITS:
+        errors.append(f"height_unit must be one of {sorted(HEIGHT_UNITS)}")
+    if weight is None or not math.isfinite(weight) or weight <= 0:
+        errors.append("weight must be a finite number greater than 0")
+    if weight_unit not in WEIGHT_UNITS:
+        errors.append(f"weight_unit must be one of {sorted(WEIGHT_UNITS)}")
+    return errors
+
+
+def score_batch(
+    heights: Sequence[float | None],
+    height_units: Sequence[str | None],
+    weights: Sequence[float | None],
+    weight_units: Sequence[str | None]
+) -> BatchResult:
+    """
+    Validate and score a batch of rows given as parallel columns.
+    Invalid rows are reported in `errors` and left out of the arrays.
+    """
+    valid: list[int] = []
+    errors: list[BatchError] = []
+    for i, row in enumerate(zip(heights, height_units, weights, weight_units)):
+        row_errors = validate_row(*row)
+        if row_errors:
+            errors.append(BatchError(i, row_errors))
+        else:
+            valid.append(i)
+
+    indices = np.array(valid, dtype=np.intp)
+    height_m = to_meters_array(
+        np.array([heights[i] for i in valid], dtype=np.float64),
+        np.array([height_units[i] for i in valid], dtype=str)
+    )
+    weight_kg = to_kg_array(
+        np.array([weights[i] for i in valid], dtype=np.float64),
+        np.array([weight_units[i] for i in valid], dtype=str)
+    )
+    bmi, bmi_raw = calculate_bmi_array(height_m, weight_kg)
+
+    return BatchResult(
+        indices=indices,
+        height_m=height_m,
+        weight_kg=weight_kg,
+        bmi=bmi,
+        bmi_raw=bmi_raw,
+        category=categorize_array(bmi),
+        errors=errors
+    )
@@ -0,0 +1,394 @@
+"""
+Script Name : write_behind.py
+Description : Write-behind queue for measurements with group commit
+Author      : @tonybnya
+
+With `measurement_write_behind`, POST /measurements/ prepares the row
+(BMI, category), puts it on a bounded queue and answers 202 with a
+provisional id. A writer thread takes up to `write_behind_batch_size`
+rows, or what arrived within `write_behind_max_delay_ms` of the oldest
+one, and inserts them in one transaction (crud.create_measurements): a
+burst of N requests costs N / batch_size commits instead of N.
+
+Backpressure: when the queue is full a request waits up to
+`write_behind_put_timeout` for room, then gets a 503.
+
+Durability: queued rows live in memory only. At shutdown (app lifespan)
+the writer drains the queue for up to `write_behind_drain_timeout`, then
+appends what is left to `write_behind_spool_path` (NDJSON, fsynced); a
+group that keeps failing to commit is spilled there too. The spool is
+replayed when a writer starts; rows that fail again then go to
+`<spool path>.failed` for an operator to look at, not back to the spool
+(they would otherwise be retried at every start). A replay interrupted
+by a crash is taken over by the next start. A crash (SIGKILL, power
+loss) loses the queued rows: clients needing a durable write should use
+the synchronous mode or the bulk endpoint.
+
+Shutdown takes at most `write_behind_drain_timeout` plus ABORT_TIMEOUT:
+past the drain timeout the writer stops writing and everything still
+queued is spilled.
+
+Every worker process has its own queue and writer.
+"""
+import enum
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Optional
+
+from sqlalchemy.orm import Session
+
+from bmi_app.core.config import Settings
+from bmi_app.core.metrics import (CallbackGauge, Counter, Histogram,
+                                  registry)
+from bmi_app.models import HeightUnit, WeightUnit
+
+logger = logging.getLogger(__name__)
+
+FLUSH_ROWS_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+# Attempts at committing a group before it is spilled
+FLUSH_ATTEMPTS = 3
+RETRY_DELAY = 0.2
+# Seconds left to the writer, past the drain timeout, to finish the
+# statement in hand
+ABORT_TIMEOUT = 5.0
+
+
+class QueueFull(Exception):
+    """
+    No room in the queue within the put timeout.
+    """
+
+
+class WriterStopped(Exception):
+    """
+    The writer no longer accepts measurements (shutting down).
+    """
+
+
+class PendingWrite:
+    __slots__ = ("provisional_id", "values", "enqueued")
+
+    def __init__(self, provisional_id: str, values: dict, enqueued: float):
+        self.provisional_id = provisional_id
+        self.values = values
+        self.enqueued = enqueued
+
+
+def _encode(values: dict) -> dict:
+    return {
+        key: value.value if isinstance(value, enum.Enum)
+        else value.isoformat() if isinstance(value, datetime) else value
+        for key, value in values.items()
+    }
+
+
+def _decode(values: dict) -> dict:
+    return {
+        **values,
+        "height_unit": HeightUnit(values["height_unit"]),
+        "weight_unit": WeightUnit(values["weight_unit"]),
+        "recorded_at": datetime.fromisoformat(values["recorded_at"]),
+    }
+
+
+class MeasurementWriter:
+    """
+    Bounded queue of prepared measurements and the thread committing
+    them in groups.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        queue_size: int = 10000,
+        batch_size: int = 500,
+        max_delay: float = 0.05,
+        drain_timeout: float = 10.0,
+        spool_path: str = "./write_behind_spool.ndjson"
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.drain_timeout = drain_timeout
+        self.spool_path = spool_path
+        self.quarantine_path = f"{spool_path}.failed"
+        self.queue: queue.Queue[PendingWrite] = queue.Queue(maxsize=queue_size)
+        # provisional id -> {"status", "id", "errors"}, for the latest rows
+        self.results: OrderedDict[str, dict] = OrderedDict()
+        self.results_size = queue_size * 2
+        self._results_lock = threading.Lock()
+        self._closed = False
+        # Submits between their closed check and their put; stop() waits
+        # for them so that no row is queued after its final drain
+        self._submitting = 0
+        self._submit_done = threading.Condition()
+        self._abort = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="measurement-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, values: dict, timeout: float = 0.0) -> str:
+        """
+        Queue a prepared measurement; returns its provisional id.
+        """
+        with self._submit_done:
+            if self._closed:
+                raise WriterStopped()
+            self._submitting += 1
+        pending = PendingWrite(uuid.uuid4().hex, values, time.monotonic())
+        self._record(pending.provisional_id, "queued")
+        try:
+            self.queue.put(pending, block=timeout > 0, timeout=timeout or None)
+        except queue.Full:
+            with self._results_lock:
+                self.results.pop(pending.provisional_id, None)
+            write_behind_measurements.inc("refused")
+            raise QueueFull() from None
+        finally:
+            with self._submit_done:
+                self._submitting -= 1
+                self._submit_done.notify_all()
+        return pending.provisional_id
+
+    def status(self, provisional_id: str) -> Optional[dict]:
+        return self.results.get(provisional_id)
+
+    def stop(self) -> None:
+        """
+        Stop accepting rows, drain the queue for up to `drain_timeout`
+        seconds and spill what is left to the spool file.
+        """
+        with self._submit_done:
+            self._closed = True
+            # Bounded by the submits' put timeout
+            self._submit_done.wait_for(lambda: not self._submitting)
+        if self._thread is not None:
+            self._thread.join(self.drain_timeout)
+            if self._thread.is_alive():
+                # Stuck on a failing database: stop writing, spill the
+                # group in hand and leave the queue to the spill below
+                self._abort.set()
+                self._thread.join(ABORT_TIMEOUT)
+                if self._thread.is_alive():
+                    logger.warning("Measurement writer still busy %.0fs after the drain timeout", ABORT_TIMEOUT)
+        left = []
+        while True:
+            try:
+                left.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        if left:
+            self._spill(left, self.spool_path, "spilled")
+
+    def _record(self, provisional_id: str, status: str, measurement_id: Optional[int] = None,
+                errors: Optional[list[str]] = None) -> None:
+        with self._results_lock:
+            self.results[provisional_id] = {"status": status, "id": measurement_id, "errors": errors or []}
+            self.results.move_to_end(provisional_id)
+            while len(self.results) > self.results_size:
+                self.results.popitem(last=False)
+
+    def _run(self) -> None:
+        self._replay()
+        while not self._abort.is_set():
+            batch = self._collect()
+            if batch is None:
+                return
+            self._flush(batch)
+
+    def _collect(self) -> Optional[list[PendingWrite]]:
+        """
+        Next group: wait for a first row, then take more until the group
+        is full or the first row waited `max_delay`. None once stopped
+        and drained.
+        """
+        while True:
+            try:
+                first = self.queue.get(timeout=0.1)
+                break
+            except queue.Empty:
+                if self._closed:
+                    return None
+        batch = [first]
+        deadline = first.enqueued + self.max_delay
+        while len(batch) < self.batch_size:
+            # Once stopping, flush what is queued without waiting for more
+            remaining = 0.0 if self._closed else deadline - time.monotonic()
+            try:
+                batch.append(self.queue.get(timeout=min(remaining, 0.1)) if remaining > 0 else self.queue.get_nowait())
+            except queue.Empty:
+                if remaining <= 0.1:
+                    break
+        return batch
+
+    def _flush(self, batch: list[PendingWrite], replayed: bool = False) -> None:
+        from bmi_app.crud.measurements import create_measurements
+
+        for attempt in range(FLUSH_ATTEMPTS):
+            started = time.perf_counter()
+            db = self.session_factory()
+            try:
+                ids = create_measurements(db, [pending.values for pending in batch])
+            except Exception:
+                logger.exception("Group commit of %d measurements failed (attempt %d)", len(batch), attempt + 1)
+                if self._abort.wait(RETRY_DELAY * 2 ** attempt):
+                    break
+                continue
+            finally:
+                db.close()
+            now = time.monotonic()
+            write_behind_flush_duration.observe(time.perf_counter() - started)
+            write_behind_flush_rows.observe(len(batch))
+            for pending, measurement_id in zip(batch, ids):
+                if measurement_id is None:
+                    write_behind_measurements.inc("rejected")
+                    self._record(pending.provisional_id, "rejected",
+                                 errors=[f"user {pending.values['user_id']} does not exist"])
+                else:
+                    write_behind_measurements.inc("written")
+                    write_behind_delay.observe(now - pending.enqueued)
+                    self._record(pending.provisional_id, "written", measurement_id)
+            return
+        if replayed and not self._abort.is_set():
+            self._spill(batch, self.quarantine_path, "quarantined")
+        else:
+            self._spill(batch, self.spool_path, "spilled")
+
+    def _spill(self, batch: list[PendingWrite], path: str, status: str) -> None:
+        """
+        Append rows that could not be written to `path` (the spool file or
+        the quarantine file).
+        """
+        lines = "".join(
+            json.dumps({"provisional_id": pending.provisional_id, "values": _encode(pending.values)}) + "\n"
+            for pending in batch
+        )
+        with open(path, "a", encoding="utf-8") as spool:
+            spool.write(lines)
+            spool.flush()
+            os.fsync(spool.fileno())
+        write_behind_measurements.inc(status, amount=len(batch))
+        for pending in batch:
+            self._record(pending.provisional_id, status)
+        logger.warning("%s %d measurements to %s", status.capitalize(), len(batch), path)
+
+    def _claim_spools(self) -> list[str]:
+        """
+        Rename the spool, and the replay files of processes that died
+        replaying, to replay files of this process: a rename succeeds for
+        one worker process only.
+        """
+        candidates = [self.spool_path]
+        for path in glob.glob(f"{glob.escape(self.spool_path)}.*.replay"):
+            pid = path[len(self.spool_path) + 1:].split(".", 1)[0]
+            if pid.isdigit() and not _process_alive(int(pid)):
+                candidates.append(path)
+        claimed = []
+        for path in candidates:
+            replay = f"{self.spool_path}.{os.getpid()}.{uuid.uuid4().hex}.replay"
+            try:
+                os.rename(path, replay)
+            except FileNotFoundError:
+                continue
+            claimed.append(replay)
+        return claimed
+
+    def _replay(self) -> None:
+        """
+        Write the rows previous writers spilled (see _claim_spools());
+        groups failing again are quarantined. Stopped midway, the rows
+        not written yet go back to the spool.
+        """
+        for claimed in self._claim_spools():
+            with open(claimed, encoding="utf-8") as spool:
+                pending = [
+                    PendingWrite(record["provisional_id"], _decode(record["values"]), time.monotonic())
+                    for record in map(json.loads, spool) if record
+                ]
+            logger.info("Replaying %d spilled measurements", len(pending))
+            for start in range(0, len(pending), self.batch_size):
+                if self._abort.is_set():
+                    self._spill(pending[start:], self.spool_path, "spilled")
+                    break
+                self._flush(pending[start:start + self.batch_size], replayed=True)
+            os.remove(claimed)
+
+
+def _process_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        # A pid reused from a dead process (e.g. 1 in a container): this
+        # process has not replayed anything yet
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+_writer: Optional[MeasurementWriter] = None
+
+
+def get_writer() -> Optional[MeasurementWriter]:
+    return _writer
+
+
+def start_writer(config: Settings, session_factory: Callable[[], Session]) -> MeasurementWriter:
+    """
+    Create and start the process's writer (app startup).
+    """
+    global _writer
+    _writer = MeasurementWriter(
+        session_factory,
+        queue_size=config.write_behind_queue_size,
+        batch_size=config.write_behind_batch_size,
+        max_delay=config.write_behind_max_delay_ms / 1000,
+        drain_timeout=config.write_behind_drain_timeout,
+        spool_path=config.write_behind_spool_path,
+    )
+    _writer.start()
+    return _writer
+
+
+def stop_writer() -> None:
+    """
+    Drain and stop the process's writer (app shutdown).
+    """
+    global _writer
+    if _writer is not None:
+        _writer.stop()
+        _writer = None
+
+
+def _queue_depth():
+    if _writer is not None:
+        yield (), _writer.queue.qsize()
+
+
+write_behind_queue_depth = registry.register(CallbackGauge(
+    "write_behind_queue_depth", "Measurements waiting for a group commit", (), _queue_depth
+))
+write_behind_flush_duration = registry.register(Histogram(
+    "write_behind_flush_duration_seconds", "Time to insert and commit a group"
+))
+write_behind_flush_rows = registry.register(Histogram(
+    "write_behind_flush_rows", "Measurements per group commit", buckets=FLUSH_ROWS_BUCKETS
+))
+write_behind_delay = registry.register(Histogram(
+    "write_behind_delay_seconds", "Time from queueing to commit of a measurement"
+))
+write_behind_measurements = registry.register(Counter(
+    "write_behind_measurements_total", "Queued measurements by outcome", ("outcome",)
+))
@@ -5,44 +5,70 @@ Author      : @tonybnya
 
 This package provides database CRUD operations for all models.
 Import functions from specific modules or use the convenient imports below.
+The convenient imports are resolved on first access (PEP 562), so that
+importing one module, e.g. bmi_app.crud.stats, does not load them all.
 """
+from importlib import import_module
 
-# Category CRUD operations
-from .categories import (
-    get_categories,
-    get_category_by_id,
-    get_category_by_name,
-    get_category_by_bmi,
-    create_category,
-    update_category,
-    delete_category,
+# Modules of the package, also loaded on first access
+_MODULES = (
+    "categories", "users", "measurements", "stats", "trends", "analytics",
+    "async_categories", "async_users", "async_measurements",
 )
 
-# User CRUD operations
-from .users import (
-    get_users,
-    get_user_by_id,
-    get_user_by_email,
-    get_user_by_username,
-    create_user,
-    update_user,
-    delete_user,
-    user_exists,
-)
-
-# Measurement CRUD operations
-from .measurements import (
-    get_measurements,
-    get_measurement_by_id,
-    get_measurements_by_user,
-    get_measurements_by_user_and_date_range,
-    get_latest_measurement_by_user,
-    create_measurement,
-    update_measurement,
-    delete_measurement,
-    get_measurements_by_category,
-    get_user_measurement_stats,
-)
+# Exported name -> module defining it
+_EXPORTS = {
+    # Category CRUD operations
+    "get_categories": "categories",
+    "get_category_by_id": "categories",
+    "get_category_by_name": "categories",
+    "get_category_by_bmi": "categories",
+    "create_category": "categories",
+    "update_category": "categories",
+    "delete_category": "categories",
+    # User CRUD operations
+    "get_users": "users",
+    "get_user_by_id": "users",
+    "get_user_by_email": "users",
+    "get_user_by_username": "users",
+    "create_user": "users",
+    "update_user": "users",
+    "delete_user": "users",
+    "update_user_returning": "users",
+    "delete_user_returning": "users",
+    "update_users": "users",
+    "delete_users": "users",
+    "user_exists": "users",
+    # Measurement CRUD operations
+    "get_measurements": "measurements",
+    "get_measurement_by_id": "measurements",
+    "get_measurements_by_user": "measurements",
+    "get_measurements_by_user_and_date_range": "measurements",
+    "get_latest_measurement_by_user": "measurements",
+    "create_measurement": "measurements",
+    "create_measurements": "measurements",
+    "prepare_measurement": "measurements",
+    "update_measurement": "measurements",
+    "delete_measurement": "measurements",
+    "update_measurement_returning": "measurements",
+    "delete_measurement_returning": "measurements",
+    "update_measurements": "measurements",
+    "delete_measurements": "measurements",
+    "get_measurements_by_category": "measurements",
+    "get_user_measurement_stats": "measurements",
+    "get_measurements_page": "measurements",
+    "get_measurements_by_user_page": "measurements",
+    "get_measurements_by_category_page": "measurements",
+    "bulk_create_measurements": "measurements",
+    "measurement_query": "measurements",
+    "MeasurementRow": "measurements",
+    "LOAD_STRATEGIES": "measurements",
+    # Trend aggregation
+    "get_bmi_trend": "trends",
+    # Population analytics
+    "get_bmi_histogram": "analytics",
+    "get_bmi_percentiles": "analytics",
+}
 
 __all__ = [
     # Categories
@@ -61,6 +87,10 @@ __all__ = [
     "create_user",
     "update_user",
     "delete_user",
+    "update_user_returning",
+    "delete_user_returning",
+    "update_users",
+    "delete_users",
     "user_exists",
     # Measurements
     "get_measurements",
@@ -69,8 +99,42 @@ __all__ = [
     "get_measurements_by_user_and_date_range",
     "get_latest_measurement_by_user",
     "create_measurement",
+    "create_measurements",
+    "prepare_measurement",
     "update_measurement",
     "delete_measurement",
+    "update_measurement_returning",
+    "delete_measurement_returning",
+    "update_measurements",
+    "delete_measurements",
     "get_measurements_by_category",
     "get_user_measurement_stats",
+    "get_measurements_page",
+    "get_measurements_by_user_page",
+    "get_measurements_by_category_page",
+    "bulk_create_measurements",
+    "measurement_query",
+    "MeasurementRow",
+    "LOAD_STRATEGIES",
+    # Trends
+    "get_bmi_trend",
+    # Analytics
+    "get_bmi_histogram",
+    "get_bmi_percentiles",
 ]
+
+
+def __getattr__(name: str):
+    if name in _MODULES:
+        return import_module(f".{name}", __name__)
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(f".{module}", __name__), name)
+    # Cache it: later lookups do not go through __getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_MODULES) | set(_EXPORTS))
@@ -0,0 +1,266 @@
+"""
+Population BMI analytics: histograms and percentiles.
+
+Measurements are counted in fixed 0.1-wide BMI bins, per category and per
+day, month and overall ("all" period). The measurement CRUD functions keep
+the counts current when `measurement_analytics` is enabled, with atomic
+upserts like the other derived tables. A date range is answered from the
+monthly bins it covers plus the daily bins of its partial months (at most
+62 days), so the cost of a query does not depend on how many
+measurements there are.
+
+Accuracy: counts are exact. A percentile is interpolated inside the bin
+holding its rank, so it is within BIN_WIDTH of the exact value. Histogram
+bins are multiples of BIN_WIDTH, hence exact too.
+"""
+import math
+from datetime import date, datetime, timedelta
+from typing import Iterable, Optional, Sequence
+
+from sqlalchemy import (Date, Integer, and_, bindparam, cast, delete, func,
+                        insert, literal, or_, select, update)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from ..models import BMIHistogramBin, Measurement
+from .stats import MeasurementFacts
+from .trends import bucket_bounds, bucket_expression
+
+BIN_WIDTH = 0.1
+# Bucket of the single "all" period row set
+ALL_TIME = date(1970, 1, 1)
+DEFAULT_PERCENTILES = (5, 25, 50, 75, 95)
+
+
+def bmi_bin(bmi: float) -> int:
+    """
+    Bin holding `bmi`. BMI values are stored with two decimals, which
+    this rounds away before dividing, so 22.3 lands in bin 223.
+    """
+    return round(bmi * 100) // 10
+
+
+def _bin_expression():
+    """
+    SQL counterpart of bmi_bin().
+    """
+    return cast(func.round(Measurement.bmi * 100), Integer) // 10
+
+
+def _buckets(recorded_at: datetime) -> list[tuple[str, date]]:
+    return [
+        ("all", ALL_TIME),
+        ("month", bucket_bounds("month", recorded_at)[0].date()),
+        ("day", recorded_at.date()),
+    ]
+
+
+def _bucket_ranges(start: Optional[date], end: Optional[date]) -> list[tuple]:
+    """
+    (period, first bucket, bucket after the last) triples covering the days
+    from `start` to `end` inclusive; None leaves a side open.
+    """
+    if start is None and end is None:
+        return [("all", None, None)]
+    stop = None if end is None else end + timedelta(days=1)
+    first_month = None
+    if start is not None:
+        first_month = start if start.day == 1 else bucket_bounds("month", start)[1].date()
+    last_month = None if stop is None else stop.replace(day=1)
+    if first_month is not None and last_month is not None and first_month >= last_month:
+        return [("day", start, stop)]
+
+    ranges = [("month", first_month, last_month)]
+    if start is not None and start < first_month:
+        ranges.append(("day", start, first_month))
+    if stop is not None and last_month < stop:
+        ranges.append(("day", last_month, stop))
+    return ranges
+
+
+def _bin_counts(
+    db: Session,
+    category_id: Optional[int],
+    start: Optional[date],
+    end: Optional[date],
+    use_histogram: bool
+) -> list[tuple[int, int]]:
+    """
+    (bin, count) pairs of the matching measurements, by ascending bin.
+    """
+    if use_histogram:
+        table = BMIHistogramBin
+        ranges = []
+        for period, first, after in _bucket_ranges(start, end):
+            conditions = [table.period == period]
+            if first is not None:
+                conditions.append(table.bucket >= first)
+            if after is not None:
+                conditions.append(table.bucket < after)
+            ranges.append(and_(*conditions))
+        total = func.sum(table.count)
+        query = select(table.bin, total).where(or_(*ranges))
+        if category_id is not None:
+            query = query.where(table.category_id == category_id)
+        query = query.group_by(table.bin).having(total > 0).order_by(table.bin)
+    else:
+        bin_ = _bin_expression()
+        query = select(bin_, func.count())
+        if category_id is not None:
+            query = query.where(Measurement.category_id == category_id)
+        if start is not None:
+            query = query.where(Measurement.recorded_at >= datetime(start.year, start.month, start.day))
+        if end is not None:
+            query = query.where(
+                Measurement.recorded_at < datetime(end.year, end.month, end.day) + timedelta(days=1)
+            )
+        query = query.group_by(bin_).order_by(bin_)
+    return [(bin_, count) for bin_, count in db.execute(query)]
+
+
+def get_bmi_histogram(
+    db: Session,
+    bin_width: float = 1.0,
+    category_id: Optional[int] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    use_histogram: bool = False
+) -> dict:
+    """
+    Number of measurements per BMI bin of `bin_width` (a multiple of
+    BIN_WIDTH), for one category or all, recorded from `start` to `end`
+    inclusive. Empty bins are left out. With `use_histogram` the counts
+    come from bmi_histogram instead of a scan of the measurements.
+    """
+    factor = round(bin_width / BIN_WIDTH)
+    if factor < 1 or not math.isclose(factor * BIN_WIDTH, bin_width):
+        raise ValueError(f"bin_width must be a multiple of {BIN_WIDTH}")
+
+    merged: dict[int, int] = {}
+    for bin_, count in _bin_counts(db, category_id, start, end, use_histogram):
+        merged[bin_ // factor] = merged.get(bin_ // factor, 0) + count
+
+    return {
+        "count": sum(merged.values()),
+        "bin_width": round(factor * BIN_WIDTH, 1),
+        "bins": [
+            {
+                "lower": round(wide * factor * BIN_WIDTH, 1),
+                "upper": round((wide + 1) * factor * BIN_WIDTH, 1),
+                "count": count,
+            }
+            for wide, count in merged.items()
+        ],
+    }
+
+
+def get_bmi_percentiles(
+    db: Session,
+    percentiles: Sequence[float] = DEFAULT_PERCENTILES,
+    category_id: Optional[int] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    use_histogram: bool = False
+) -> dict:
+    """
+    BMI percentiles (0-100) of the measurements of one category or all,
+    recorded from `start` to `end` inclusive, each within BIN_WIDTH of the
+    exact value. None when nothing matches.
+    """
+    for percentile in percentiles:
+        if not 0 <= percentile <= 100:
+            raise ValueError(f"Percentile {percentile} is not between 0 and 100")
+
+    bins = _bin_counts(db, category_id, start, end, use_histogram)
+    total = sum(count for _, count in bins)
+    results = []
+    for percentile in percentiles:
+        value = None
+        if total:
+            rank = percentile / 100 * total
+            below = 0
+            for bin_, count in bins:
+                if below + count >= rank:
+                    # Spread the bin's measurements evenly over its width
+                    value = round((bin_ + (rank - below) / count) * BIN_WIDTH, 2)
+                    break
+                below += count
+        results.append({"percentile": percentile, "bmi": value})
+
+    return {"count": total, "max_error": BIN_WIDTH, "percentiles": results}
+
+
+def histogram_added(db: Session, facts: Iterable[MeasurementFacts]) -> None:
+    """
+    Count newly stored measurements in the histograms: one upsert per
+    period, bucket, category and bin.
+    """
+    groups: dict[tuple, int] = {}
+    for fact in facts:
+        for period, bucket in _buckets(fact.recorded_at):
+            key = (period, bucket, fact.category_id, bmi_bin(fact.bmi))
+            groups[key] = groups.get(key, 0) + 1
+    if not groups:
+        return
+
+    table = BMIHistogramBin
+    stmt = sqlite_insert(table)
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[table.period, table.bucket, table.category_id, table.bin],
+            set_={"count": table.count + stmt.excluded.count}
+        ),
+        [
+            {"period": period, "bucket": bucket, "category_id": category_id, "bin": bin_, "count": count}
+            for (period, bucket, category_id, bin_), count in groups.items()
+        ]
+    )
+
+
+def histogram_removed(db: Session, facts: Iterable[MeasurementFacts]) -> None:
+    """
+    Take measurements that are gone (or changed) out of the histograms:
+    one UPDATE per period, bucket, category and bin, run as executemany.
+    """
+    groups: dict[tuple, int] = {}
+    for fact in facts:
+        for period, bucket in _buckets(fact.recorded_at):
+            key = (period, bucket, fact.category_id, bmi_bin(fact.bmi))
+            groups[key] = groups.get(key, 0) + 1
+    if not groups:
+        return
+
+    table = BMIHistogramBin.__table__
+    db.execute(
+        update(table)
+        .where(
+            table.c.period == bindparam("b_period"),
+            table.c.bucket == bindparam("b_bucket"),
+            table.c.category_id == bindparam("b_category_id"),
+            table.c.bin == bindparam("b_bin")
+        )
+        .values(count=table.c.count - bindparam("b_count")),
+        [
+            {"b_period": period, "b_bucket": bucket, "b_category_id": category_id, "b_bin": bin_, "b_count": count}
+            for (period, bucket, category_id, bin_), count in groups.items()
+        ]
+    )
+
+
+def rebuild_histogram(db: Session) -> None:
+    """
+    Recompute the histograms from the measurements table. Run after
+    enabling `measurement_analytics` on existing data.
+    """
+    db.execute(delete(BMIHistogramBin))
+    bin_ = _bin_expression()
+    for period, bucket in (
+        ("all", literal(ALL_TIME, Date)),
+        ("month", bucket_expression("month")),
+        ("day", bucket_expression("day")),
+    ):
+        db.execute(insert(BMIHistogramBin).from_select(
+            ["period", "bucket", "category_id", "bin", "count"],
+            select(literal(period), bucket, Measurement.category_id, bin_, func.count())
+            .group_by(bucket, Measurement.category_id, bin_)
+        ))
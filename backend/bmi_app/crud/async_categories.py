@@ -0,0 +1,69 @@
+"""
+Async CRUD operations for BMI categories.
+
+Reads are native AsyncSession queries; writes run the sync versions in
+categories.py through AsyncSession.run_sync() so the category index and
+cache refresh exactly as they do there.
+"""
+from typing import List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import Category
+from . import categories
+
+
+async def get_categories(db: AsyncSession) -> List[Category]:
+    """
+    Retrieve all BMI categories from the database, in
+    categories.CATEGORY_ORDER.
+    """
+    result = await db.scalars(select(Category).order_by(*categories.CATEGORY_ORDER))
+    return list(result.all())
+
+
+async def get_category_by_id(db: AsyncSession, category_id: int) -> Optional[Category]:
+    """
+    Retrieve a specific category by ID.
+    """
+    return await db.scalar(select(Category).where(Category.id == category_id))
+
+
+async def get_category_by_name(db: AsyncSession, name: str) -> Optional[Category]:
+    """
+    Retrieve a specific category by name.
+    """
+    return await db.scalar(select(Category).where(Category.name == name))
+
+
+async def get_category_by_bmi(db: AsyncSession, bmi: float) -> Optional[Category]:
+    """
+    Retrieve the category a BMI value falls into.
+    """
+    return await db.run_sync(categories.get_category_by_bmi, bmi)
+
+
+async def create_category(db: AsyncSession, category_data: dict) -> Category:
+    """
+    Create a new category.
+    """
+    return await db.run_sync(categories.create_category, category_data)
+
+
+async def update_category(
+    db: AsyncSession,
+    category_id: int,
+    category_data: dict
+) -> Optional[Category]:
+    """
+    Update an existing category.
+    """
+    return await db.run_sync(categories.update_category, category_id, category_data)
+
+
+async def delete_category(db: AsyncSession, category_id: int) -> bool:
+    """
+    Delete a category by ID.
+    """
+    return await db.run_sync(categories.delete_category, category_id)
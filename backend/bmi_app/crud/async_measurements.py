@@ -0,0 +1,105 @@
+"""
+Async CRUD operations for measurements.
+
+Reads are native AsyncSession queries; writes run the sync versions in
+measurements.py through AsyncSession.run_sync() so both stay in step.
+"""
+from typing import List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import Measurement
+from . import measurements
+from .measurements import MeasurementResult, MeasurementRow
+
+
+async def _fetch(db: AsyncSession, query, load: str) -> List[MeasurementResult]:
+    """
+    Run a measurement_select() query. Lazy loads cannot run on an
+    AsyncSession: use "selectin", "joined" or "rows" to reach the user or
+    category.
+    """
+    if load == "rows":
+        return [MeasurementRow._make(row) for row in await db.execute(query)]
+    return list((await db.scalars(query)).all())
+
+
+async def get_measurements(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 100,
+    load: str = "lazy"
+) -> List[MeasurementResult]:
+    """
+    Retrieve all measurements with pagination.
+    """
+    return await _fetch(
+        db,
+        measurements.measurement_select(load)
+        .order_by(Measurement.recorded_at.desc())
+        .offset(skip)
+        .limit(limit),
+        load
+    )
+
+
+async def get_measurement_by_id(
+    db: AsyncSession,
+    measurement_id: int,
+    load: str = "lazy"
+) -> Optional[MeasurementResult]:
+    """
+    Retrieve a measurement by ID.
+    """
+    items = await _fetch(
+        db, measurements.measurement_select(load).where(Measurement.id == measurement_id), load
+    )
+    return items[0] if items else None
+
+
+async def get_measurements_by_user(
+    db: AsyncSession,
+    user_id: str,
+    limit: int = 100,
+    skip: int = 0,
+    load: str = "lazy"
+) -> List[MeasurementResult]:
+    """
+    Retrieve measurements for a specific user.
+    """
+    return await _fetch(
+        db,
+        measurements.measurement_select(load)
+        .where(Measurement.user_id == user_id)
+        .order_by(Measurement.recorded_at.desc())
+        .offset(skip)
+        .limit(limit),
+        load
+    )
+
+
+async def create_measurement(db: AsyncSession, measurement_data: dict) -> Measurement:
+    """
+    Create a new measurement record.
+    """
+    return await db.run_sync(measurements.create_measurement, measurement_data)
+
+
+async def update_measurement(
+    db: AsyncSession,
+    measurement_id: int,
+    measurement_data: dict
+) -> Optional[Measurement]:
+    """
+    Update an existing measurement.
+    """
+    return await db.run_sync(
+        measurements.update_measurement, measurement_id, measurement_data
+    )
+
+
+async def delete_measurement(db: AsyncSession, measurement_id: int) -> bool:
+    """
+    Delete a measurement by ID.
+    """
+    return await db.run_sync(measurements.delete_measurement, measurement_id)
@@ -0,0 +1,85 @@
+"""
+Async CRUD operations for users.
+
+Reads are native AsyncSession queries; writes run the sync versions in
+users.py through AsyncSession.run_sync() so both stay in step.
+"""
+from typing import List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import User
+from . import users
+
+
+async def get_users(db: AsyncSession, skip: int = 0, limit: int = 100) -> List[User]:
+    """
+    Retrieve users with pagination.
+    """
+    result = await db.scalars(select(User).offset(skip).limit(limit))
+    return list(result.all())
+
+
+async def get_user_by_id(db: AsyncSession, user_id: str) -> Optional[User]:
+    """
+    Retrieve a user by ID.
+    """
+    return await db.scalar(select(User).where(User.id == user_id))
+
+
+async def get_user_by_email(db: AsyncSession, email: str) -> Optional[User]:
+    """
+    Retrieve a user by email (through the user index).
+    """
+    return await db.run_sync(users.get_user_by_email, email)
+
+
+async def get_user_by_username(db: AsyncSession, username: str) -> Optional[User]:
+    """
+    Retrieve a user by username (through the user index).
+    """
+    return await db.run_sync(users.get_user_by_username, username)
+
+
+async def user_exists(
+    db: AsyncSession,
+    username: Optional[str] = None,
+    email: Optional[str] = None
+) -> bool:
+    """
+    Whether a user has this username or this email.
+    """
+    return await db.run_sync(users.user_exists, username, email)
+
+
+async def create_user(
+    db: AsyncSession,
+    username: str,
+    email: str,
+    password_hash: str
+) -> User:
+    """
+    Create a new user.
+    """
+    return await db.run_sync(users.create_user, username, email, password_hash)
+
+
+async def update_user(
+    db: AsyncSession,
+    user_id: str,
+    username: Optional[str] = None,
+    email: Optional[str] = None,
+    password_hash: Optional[str] = None
+) -> Optional[User]:
+    """
+    Update an existing user.
+    """
+    return await db.run_sync(users.update_user, user_id, username, email, password_hash)
+
+
+async def delete_user(db: AsyncSession, user_id: str) -> bool:
+    """
+    Delete a user by ID, with their measurements (see users.delete_user).
+    """
+    return await db.run_sync(users.delete_user, user_id)
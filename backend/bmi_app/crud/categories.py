@@ -5,14 +5,29 @@ from typing import List, Optional
 
 from sqlalchemy.orm import Session
 
+from ..core.cache import category_cache
+from ..core.category_index import get_category_index, rebuild_category_index
 from ..models import Category
 
+# Order of category lists, shared by the sync and async reads so that the
+# /categories/ body (and its ETag) does not depend on db_async; id breaks
+# ties (SQLite puts NULL min_value first)
+CATEGORY_ORDER = (Category.min_value, Category.id)
+
+
+def category_changed(db: Session) -> None:
+    """
+    Refresh everything derived from the categories table after a write.
+    """
+    rebuild_category_index(db)
+    category_cache.invalidate()
+
 
 def get_categories(db: Session) -> List[Category]:
     """
-    Retrieve all BMI categories from the database.
+    Retrieve all BMI categories from the database, in CATEGORY_ORDER.
     """
-    return db.query(Category).order_by(Category.min_value).all()
+    return db.query(Category).order_by(*CATEGORY_ORDER).all()
 
 
 def get_category_by_id(db: Session, category_id: int) -> Optional[Category]:
@@ -20,3 +35,68 @@ def get_category_by_id(db: Session, category_id: int) -> Optional[Category]:
     Retrieve a specific category by ID.
     """
     return db.query(Category).filter(Category.id == category_id).first()
+
+
+def get_category_by_name(db: Session, name: str) -> Optional[Category]:
+    """
+    Retrieve a specific category by name.
+    """
+    return db.query(Category).filter(Category.name == name).first()
+
+
+def get_category_by_bmi(db: Session, bmi: float) -> Optional[Category]:
+    """
+    Retrieve the category a BMI value falls into.
+    """
+    index = get_category_index()
+    if not index.loaded:
+        index = rebuild_category_index(db)
+    category_id = index.id_for(bmi)
+    if category_id is None:
+        return None
+    return get_category_by_id(db, category_id)
+
+
+def create_category(db: Session, category_data: dict) -> Category:
+    """
+    Create a new category.
+    """
+    db_category = Category(**category_data)
+    db.add(db_category)
+    db.commit()
+    db.refresh(db_category)
+    category_changed(db)
+    return db_category
+
+
+def update_category(
+    db: Session,
+    category_id: int,
+    category_data: dict
+) -> Optional[Category]:
+    """
+    Update an existing category.
+    """
+    db_category = get_category_by_id(db, category_id)
+    if db_category:
+        for key, value in category_data.items():
+            if hasattr(db_category, key):
+                setattr(db_category, key, value)
+
+        db.commit()
+        db.refresh(db_category)
+        category_changed(db)
+    return db_category
+
+
+def delete_category(db: Session, category_id: int) -> bool:
+    """
+    Delete a category by ID.
+    """
+    db_category = get_category_by_id(db, category_id)
+    if db_category:
+        db.delete(db_category)
+        db.commit()
+        category_changed(db)
+        return True
+    return False
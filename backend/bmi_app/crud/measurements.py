@@ -1,41 +1,305 @@
 """
 CRUD operations for measurements.
 """
-from typing import List, Optional
+import base64
+import json
+import time
+from datetime import datetime, timezone
+from typing import List, NamedTuple, Optional, Tuple, Union
 
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, insert, select, tuple_, update
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Query, Session, joinedload, selectinload
 
-from ..models import Measurement
+from ..core.category_index import get_category_index, rebuild_category_index
+from ..core.config import get_settings
+from ..core.utils import calculate_bmi, to_kg, to_meters
+from ..models import (Category, HeightUnit, Measurement, MeasurementRollup,
+                      User, UserCategoryCount, UserMeasurementStats,
+                      WeightUnit)
+from .analytics import histogram_added, histogram_removed
+from .stats import MeasurementFacts, naive_utc, stats_added, stats_removed
+from .trends import rollups_added, rollups_removed
 
+# Keeps IN (...) lists under SQLite's bound parameter limit
+_IN_CLAUSE_SIZE = 500
+# Columns the derived tables (stats, rollups, histograms) depend on
+_FACT_COLUMNS = (
+    Measurement.id, Measurement.user_id, Measurement.category_id,
+    Measurement.bmi, Measurement.recorded_at,
+)
 
-def get_measurements(db: Session, skip: int = 0, limit: int = 100) -> List[Measurement]:
+# How the read functions load measurements (their `load` argument):
+# - "lazy": ORM objects, user and category loaded on first access (one
+#   query per object not yet in the session: N+1 over a page);
+# - "selectin": ORM objects, then users and categories in one
+#   SELECT ... IN query each;
+# - "joined": ORM objects with users and categories in the same query;
+# - "rows": MeasurementRow tuples of the columns and the category name,
+#   one query, no ORM objects.
+LOAD_STRATEGIES = ("lazy", "selectin", "joined", "rows")
+
+
+class MeasurementRow(NamedTuple):
+    """
+    A measurement's columns and category name, without an ORM object.
+    """
+    id: int
+    user_id: str
+    category_id: int
+    category: str
+    height: float
+    height_unit: HeightUnit
+    weight: float
+    weight_unit: WeightUnit
+    height_m: float
+    weight_kg: float
+    bmi: float
+    recorded_at: datetime
+    notes: Optional[str]
+
+
+MeasurementResult = Union[Measurement, MeasurementRow]
+
+_ROW_COLUMNS = tuple(
+    Category.name.label("category") if field == "category" else getattr(Measurement, field)
+    for field in MeasurementRow._fields
+)
+
+
+def _measurements_added(db: Session, facts: List[MeasurementFacts]) -> None:
+    """
+    Update the derived tables for stored measurements.
+    """
+    settings = get_settings()
+    stats_added(db, facts)
+    if settings.measurement_rollups:
+        rollups_added(db, facts)
+    if settings.measurement_analytics:
+        histogram_added(db, facts)
+
+
+def _measurements_removed(db: Session, facts: List[MeasurementFacts]) -> None:
+    """
+    Update the derived tables for removed measurements (after flush).
+    """
+    settings = get_settings()
+    stats_removed(db, facts)
+    if settings.measurement_rollups:
+        rollups_removed(db, facts)
+    if settings.measurement_analytics:
+        histogram_removed(db, facts)
+
+
+def load_options(load: str) -> list:
+    """
+    Loader options of an ORM `load` strategy, for queries of Measurement.
+    """
+    if load not in LOAD_STRATEGIES:
+        raise ValueError(f"Unknown load strategy: {load} (available: {', '.join(LOAD_STRATEGIES)})")
+    if load == "selectin":
+        return [selectinload(Measurement.user), selectinload(Measurement.category)]
+    if load == "joined":
+        return [joinedload(Measurement.user, innerjoin=True), joinedload(Measurement.category, innerjoin=True)]
+    return []
+
+
+def measurement_query(db: Session, load: str = "lazy") -> Query:
+    """
+    Query of measurements loaded with `load` (see LOAD_STRATEGIES), to
+    filter and order on Measurement columns.
+    """
+    options = load_options(load)
+    if load == "rows":
+        return db.query(*_ROW_COLUMNS).join(Category, Category.id == Measurement.category_id)
+    return db.query(Measurement).options(*options)
+
+
+def measurement_select(load: str = "lazy"):
+    """
+    measurement_query() as a SELECT statement, for AsyncSession.
+    """
+    options = load_options(load)
+    if load == "rows":
+        return select(*_ROW_COLUMNS).join(Category, Category.id == Measurement.category_id)
+    return select(Measurement).options(*options)
+
+
+def _results(items: list, load: str) -> List[MeasurementResult]:
+    if load == "rows":
+        return [MeasurementRow._make(row) for row in items]
+    return items
+
+
+def get_measurements(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    load: str = "lazy"
+) -> List[MeasurementResult]:
     """
     Retrieve all measurements with pagination.
     """
-    return db.query(Measurement).order_by(
+    return _results(measurement_query(db, load).order_by(
         Measurement.recorded_at.desc()
-    ).offset(skip).limit(limit).all()
+    ).offset(skip).limit(limit).all(), load)
 
 
-def get_measurement_by_id(db: Session, measurement_id: int) -> Optional[Measurement]:
+def get_measurement_by_id(
+    db: Session,
+    measurement_id: int,
+    load: str = "lazy"
+) -> Optional[MeasurementResult]:
     """
     Retrieve a measurement by ID.
     """
-    return db.query(Measurement).filter(Measurement.id == measurement_id).first()
+    items = measurement_query(db, load).filter(Measurement.id == measurement_id).limit(1).all()
+    return _results(items, load)[0] if items else None
 
 
 def get_measurements_by_user(
     db: Session,
     user_id: str,
     limit: int = 100,
-    skip: int = 0
-) -> List[Measurement]:
+    skip: int = 0,
+    load: str = "lazy"
+) -> List[MeasurementResult]:
     """
     Retrieve measurements for a specific user.
     """
-    return db.query(Measurement).filter(
+    return _results(measurement_query(db, load).filter(
         Measurement.user_id == user_id
-    ).order_by(Measurement.recorded_at.desc()).offset(skip).limit(limit).all()
+    ).order_by(Measurement.recorded_at.desc()).offset(skip).limit(limit).all(), load)
+
+
+def get_measurements_by_user_and_date_range(
+    db: Session,
+    user_id: str,
+    start_date: datetime,
+    end_date: datetime,
+    load: str = "lazy"
+) -> List[MeasurementResult]:
+    """
+    Retrieve a user's measurements recorded between two dates (inclusive),
+    oldest first.
+    """
+    return _results(measurement_query(db, load).filter(
+        Measurement.user_id == user_id,
+        Measurement.recorded_at >= naive_utc(start_date),
+        Measurement.recorded_at <= naive_utc(end_date)
+    ).order_by(Measurement.recorded_at, Measurement.id).all(), load)
+
+
+def get_measurements_by_category(
+    db: Session,
+    category_id: int,
+    limit: int = 100,
+    skip: int = 0,
+    load: str = "lazy"
+) -> List[MeasurementResult]:
+    """
+    Retrieve measurements falling into a specific category.
+    """
+    return _results(measurement_query(db, load).filter(
+        Measurement.category_id == category_id
+    ).order_by(Measurement.recorded_at.desc()).offset(skip).limit(limit).all(), load)
+
+
+def encode_cursor(measurement: MeasurementResult) -> str:
+    """
+    Opaque cursor pointing just after `measurement` in recorded_at DESC,
+    id DESC order.
+    """
+    payload = json.dumps([measurement.recorded_at.isoformat(), measurement.id])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Inverse of encode_cursor(); raises ValueError on a malformed cursor.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        recorded_at, measurement_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(recorded_at), int(measurement_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+def _keyset_page(
+    query: Query,
+    limit: int,
+    cursor: Optional[str],
+    load: str = "lazy"
+) -> Tuple[List[MeasurementResult], Optional[str]]:
+    """
+    Fetch one page of `query` in recorded_at DESC, id DESC order, starting
+    after `cursor`. Seeks through the (…, recorded_at, id) indexes instead
+    of counting skipped rows, so every page costs the same.
+    """
+    if cursor is not None:
+        recorded_at, measurement_id = decode_cursor(cursor)
+        query = query.filter(
+            tuple_(Measurement.recorded_at, Measurement.id)
+            < tuple_(recorded_at, measurement_id)
+        )
+    items = query.order_by(
+        Measurement.recorded_at.desc(),
+        Measurement.id.desc()
+    ).limit(limit + 1).all()
+    items = _results(items, load)
+
+    next_cursor = encode_cursor(items[limit - 1]) if len(items) > limit else None
+    return items[:limit], next_cursor
+
+
+def get_measurements_page(
+    db: Session,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    load: str = "lazy"
+) -> Tuple[List[MeasurementResult], Optional[str]]:
+    """
+    Keyset-paginated get_measurements(): returns (items, next_cursor).
+    """
+    return _keyset_page(measurement_query(db, load), limit, cursor, load)
+
+
+def get_measurements_by_user_page(
+    db: Session,
+    user_id: str,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    load: str = "lazy"
+) -> Tuple[List[MeasurementResult], Optional[str]]:
+    """
+    Keyset-paginated get_measurements_by_user(): returns (items, next_cursor).
+    """
+    return _keyset_page(
+        measurement_query(db, load).filter(Measurement.user_id == user_id),
+        limit,
+        cursor,
+        load
+    )
+
+
+def get_measurements_by_category_page(
+    db: Session,
+    category_id: int,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    load: str = "lazy"
+) -> Tuple[List[MeasurementResult], Optional[str]]:
+    """
+    Keyset-paginated get_measurements_by_category(): returns
+    (items, next_cursor).
+    """
+    return _keyset_page(
+        measurement_query(db, load).filter(Measurement.category_id == category_id),
+        limit,
+        cursor,
+        load
+    )
 
 
 def create_measurement(db: Session, measurement_data: dict) -> Measurement:
@@ -44,6 +308,8 @@ def create_measurement(db: Session, measurement_data: dict) -> Measurement:
     """
     db_measurement = Measurement(**measurement_data)
     db.add(db_measurement)
+    db.flush()
+    _measurements_added(db, [MeasurementFacts.of(db_measurement)])
     db.commit()
     db.refresh(db_measurement)
     return db_measurement
@@ -59,10 +325,16 @@ def update_measurement(
     """
     db_measurement = get_measurement_by_id(db, measurement_id)
     if db_measurement:
+        before = MeasurementFacts.of(db_measurement)
         for key, value in measurement_data.items():
             if hasattr(db_measurement, key):
                 setattr(db_measurement, key, value)
 
+        db.flush()
+        after = MeasurementFacts.of(db_measurement)
+        if after != before:
+            _measurements_removed(db, [before])
+            _measurements_added(db, [after])
         db.commit()
         db.refresh(db_measurement)
     return db_measurement
@@ -74,7 +346,366 @@ def delete_measurement(db: Session, measurement_id: int) -> bool:
     """
     db_measurement = get_measurement_by_id(db, measurement_id)
     if db_measurement:
+        facts = MeasurementFacts.of(db_measurement)
         db.delete(db_measurement)
+        db.flush()
+        _measurements_removed(db, [facts])
         db.commit()
         return True
     return False
+
+
+def update_measurements(
+    db: Session,
+    measurement_ids: List[int],
+    measurement_data: dict
+) -> List[Row]:
+    """
+    Set the same values on many measurements with UPDATE ... RETURNING;
+    returns the updated rows (Row objects, not ORM instances: nothing is
+    refreshed; instances loaded in the session are left to the commit to
+    expire). Unknown ids are skipped. SQLite only returns the new
+    values, so when a column the derived tables depend on changes, the
+    previous ones are read first by one narrow SELECT per chunk of ids.
+    """
+    values = {
+        key: value for key, value in measurement_data.items()
+        if key != "id" and key in Measurement.__table__.c
+    }
+    if not values:
+        return []
+    tracked = any(column.key in values for column in _FACT_COLUMNS)
+    rows: List[Row] = []
+    before: List[MeasurementFacts] = []
+    try:
+        for start in range(0, len(measurement_ids), _IN_CLAUSE_SIZE):
+            chunk = measurement_ids[start:start + _IN_CLAUSE_SIZE]
+            if tracked:
+                before.extend(
+                    MeasurementFacts(*row)
+                    for row in db.execute(select(*_FACT_COLUMNS).where(Measurement.id.in_(chunk)))
+                )
+            rows.extend(db.execute(
+                update(Measurement)
+                .where(Measurement.id.in_(chunk))
+                .values(**values)
+                .returning(*Measurement.__table__.c)
+                .execution_options(synchronize_session=False)
+            ))
+        if tracked:
+            after = [
+                MeasurementFacts(row.id, row.user_id, row.category_id, row.bmi, row.recorded_at)
+                for row in rows
+            ]
+            changed = set(after) ^ set(before)
+            _measurements_removed(db, [facts for facts in before if facts in changed])
+            _measurements_added(db, [facts for facts in after if facts in changed])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return rows
+
+
+def update_measurement_returning(
+    db: Session,
+    measurement_id: int,
+    measurement_data: dict
+) -> Optional[Row]:
+    """
+    update_measurement() in one UPDATE ... RETURNING, without loading and
+    refreshing an ORM object; None when the measurement does not exist.
+    """
+    rows = update_measurements(db, [measurement_id], measurement_data)
+    return rows[0] if rows else None
+
+
+def delete_measurements(db: Session, measurement_ids: List[int]) -> List[int]:
+    """
+    Delete many measurements with DELETE ... RETURNING (one statement per
+    chunk of ids) and update the derived tables; returns the ids deleted.
+    """
+    removed: List[MeasurementFacts] = []
+    try:
+        for start in range(0, len(measurement_ids), _IN_CLAUSE_SIZE):
+            chunk = measurement_ids[start:start + _IN_CLAUSE_SIZE]
+            removed.extend(
+                MeasurementFacts(*row)
+                for row in db.execute(
+                    delete(Measurement)
+                    .where(Measurement.id.in_(chunk))
+                    .returning(*_FACT_COLUMNS)
+                    .execution_options(synchronize_session=False)
+                )
+            )
+        _measurements_removed(db, removed)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return [facts.id for facts in removed]
+
+
+def _delete_user_measurements(db: Session, user_ids: List[str]) -> int:
+    """
+    Delete the measurements of users about to be deleted, with their
+    per-user derived rows (statistics, category counts, rollups), and take
+    them out of the histograms, one statement per chunk of ids; returns
+    the number of measurements deleted. The caller commits.
+    """
+    removed: List[MeasurementFacts] = []
+    for start in range(0, len(user_ids), _IN_CLAUSE_SIZE):
+        chunk = user_ids[start:start + _IN_CLAUSE_SIZE]
+        removed.extend(
+            MeasurementFacts(*row)
+            for row in db.execute(
+                delete(Measurement)
+                .where(Measurement.user_id.in_(chunk))
+                .returning(*_FACT_COLUMNS)
+                .execution_options(synchronize_session=False)
+            )
+        )
+        # Also left behind by earlier deletes (rows down to a zero count)
+        for model in (UserMeasurementStats, UserCategoryCount, MeasurementRollup):
+            db.execute(
+                delete(model)
+                .where(model.user_id.in_(chunk))
+                .execution_options(synchronize_session=False)
+            )
+    if removed and get_settings().measurement_analytics:
+        histogram_removed(db, removed)
+    return len(removed)
+
+
+def delete_measurement_returning(db: Session, measurement_id: int) -> bool:
+    """
+    delete_measurement() in one DELETE ... RETURNING, without loading the
+    ORM object first.
+    """
+    return bool(delete_measurements(db, [measurement_id]))
+
+
+def get_latest_measurement_by_user(
+    db: Session,
+    user_id: str,
+    load: str = "lazy"
+) -> Optional[MeasurementResult]:
+    """
+    Retrieve a user's most recent measurement (a primary key lookup
+    through the user's statistics row).
+    """
+    latest_id = db.scalar(
+        select(UserMeasurementStats.latest_measurement_id)
+        .where(UserMeasurementStats.user_id == user_id)
+    )
+    if latest_id is None:
+        return None
+    if load == "lazy":
+        return db.get(Measurement, latest_id)
+    return get_measurement_by_id(db, latest_id, load)
+
+
+def get_user_measurement_stats(db: Session, user_id: str) -> Optional[dict]:
+    """
+    Retrieve a user's measurement statistics, maintained on every write:
+    count, mean/min/max BMI, latest measurement and count per category.
+    """
+    stats = db.get(UserMeasurementStats, user_id)
+    if stats is None:
+        return None
+
+    category_counts = dict(db.execute(
+        select(UserCategoryCount.category_id, UserCategoryCount.count)
+        .where(UserCategoryCount.user_id == user_id, UserCategoryCount.count > 0)
+    ).all())
+    return {
+        "user_id": user_id,
+        "count": stats.count,
+        "mean_bmi": stats.bmi_sum / stats.count if stats.count else None,
+        "min_bmi": stats.bmi_min,
+        "max_bmi": stats.bmi_max,
+        "latest_measurement_id": stats.latest_measurement_id,
+        "latest_recorded_at": stats.latest_recorded_at,
+        "category_counts": category_counts,
+    }
+
+
+def _existing_user_ids(db: Session, user_ids: set[str]) -> set[str]:
+    """
+    Return the subset of `user_ids` that exist, in a few IN queries.
+    """
+    found: set[str] = set()
+    candidates = list(user_ids)
+    for start in range(0, len(candidates), _IN_CLAUSE_SIZE):
+        found.update(db.scalars(
+            select(User.id).where(User.id.in_(candidates[start:start + _IN_CLAUSE_SIZE]))
+        ))
+    return found
+
+
+def _insert_values(db: Session, values: List[dict]) -> List[int]:
+    """
+    Insert complete measurement rows with one executemany and update the
+    derived tables; returns the new ids, in order. The caller commits.
+    """
+    ids = db.scalars(
+        insert(Measurement).returning(Measurement.id, sort_by_parameter_order=True),
+        values
+    ).all()
+    _measurements_added(db, [
+        MeasurementFacts(
+            measurement_id,
+            value["user_id"],
+            value["category_id"],
+            value["bmi"],
+            value["recorded_at"]
+        )
+        for measurement_id, value in zip(ids, values)
+    ])
+    return ids
+
+
+def prepare_measurement(db: Session, data: dict) -> dict:
+    """
+    Complete a measurement's user_id, height, height_unit, weight,
+    weight_unit (recorded_at and notes optional) with height_m,
+    weight_kg, bmi and category_id, ready for create_measurement().
+    recorded_at defaults to now.
+    """
+    index = get_category_index()
+    if not index.loaded:
+        index = rebuild_category_index(db)
+        if not index.loaded:
+            raise ValueError("The categories table must be seeded first")
+
+    height_unit = HeightUnit(data["height_unit"])
+    weight_unit = WeightUnit(data["weight_unit"])
+    height_m = to_meters(data["height"], height_unit.value)
+    weight_kg = to_kg(data["weight"], weight_unit.value)
+    bmi, _ = calculate_bmi(height_m, weight_kg)
+    category_id = index.id_for(bmi)
+    if category_id is None:
+        raise ValueError(f"No category contains BMI {bmi}")
+    return {
+        "user_id": data["user_id"],
+        "category_id": category_id,
+        "height": data["height"],
+        "height_unit": height_unit,
+        "weight": data["weight"],
+        "weight_unit": weight_unit,
+        "height_m": height_m,
+        "weight_kg": weight_kg,
+        "bmi": bmi,
+        "recorded_at": naive_utc(data.get("recorded_at")) or naive_utc(datetime.now(timezone.utc)),
+        "notes": data.get("notes"),
+    }
+
+
+def create_measurements(db: Session, values: List[dict]) -> List[Optional[int]]:
+    """
+    Insert prepared measurements (see prepare_measurement) in a single
+    transaction: one commit for the whole group. Rows of users that do not
+    exist are skipped; their id is None.
+    """
+    known_users = _existing_user_ids(db, {value["user_id"] for value in values})
+    valid = [value for value in values if value["user_id"] in known_users]
+    try:
+        ids = iter(_insert_values(db, valid) if valid else [])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return [next(ids) if value["user_id"] in known_users else None for value in values]
+
+
+def bulk_create_measurements(
+    db: Session,
+    rows: List[dict],
+    chunk_size: int = 1000
+) -> dict:
+    """
+    Insert many measurements in one transaction.
+    Each row needs user_id, height, height_unit, weight and weight_unit
+    (recorded_at and notes are optional); height_m, weight_kg, bmi and
+    category_id are derived here. Valid rows are inserted with one
+    executemany per chunk of `chunk_size`; invalid rows are reported by
+    index and skipped.
+    """
+    # Imported on first use: numpy is not needed to start the app
+    from ..core.vectorized import score_batch
+
+    index = get_category_index()
+    if not index.loaded:
+        index = rebuild_category_index(db)
+        if not index.loaded:
+            raise ValueError("The categories table must be seeded first")
+
+    scored = score_batch(
+        [row.get("height") for row in rows],
+        [row.get("height_unit") for row in rows],
+        [row.get("weight") for row in rows],
+        [row.get("weight_unit") for row in rows]
+    )
+    errors = {error.index: list(error.errors) for error in scored.errors}
+
+    known_users = _existing_user_ids(db, {row.get("user_id") for row in rows} - {None})
+    for i, row in enumerate(rows):
+        if row.get("user_id") not in known_users:
+            errors.setdefault(i, []).append(f"user {row.get('user_id')} does not exist")
+
+    now = naive_utc(datetime.now(timezone.utc))
+    values = []
+    for i, height_m, weight_kg, bmi, category_id in zip(
+        scored.indices.tolist(),
+        scored.height_m.tolist(),
+        scored.weight_kg.tolist(),
+        scored.bmi.tolist(),
+        index.ids_for(scored.bmi).tolist()
+    ):
+        if category_id == -1:
+            errors.setdefault(i, []).append(f"no category contains BMI {bmi}")
+        if i in errors:
+            continue
+        row = rows[i]
+        values.append({
+            "user_id": row["user_id"],
+            "category_id": category_id,
+            "height": row["height"],
+            "height_unit": HeightUnit(row["height_unit"]),
+            "weight": row["weight"],
+            "weight_unit": WeightUnit(row["weight_unit"]),
+            "height_m": height_m,
+            "weight_kg": weight_kg,
+            "bmi": bmi,
+            "recorded_at": naive_utc(row.get("recorded_at")) or now,
+            "notes": row.get("notes"),
+        })
+
+    chunks = []
+    started = time.perf_counter()
+    try:
+        for start in range(0, len(values), chunk_size):
+            chunk = values[start:start + chunk_size]
+            chunk_started = time.perf_counter()
+            _insert_values(db, chunk)
+            chunks.append({
+                "rows": len(chunk),
+                "seconds": time.perf_counter() - chunk_started,
+            })
+        commit_started = time.perf_counter()
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    commit_seconds = time.perf_counter() - commit_started
+
+    return {
+        "accepted": len(values),
+        "rejected": len(errors),
+        "errors": [
+            {"index": i, "errors": row_errors} for i, row_errors in sorted(errors.items())
+        ],
+        "chunks": chunks,
+        "commit_seconds": commit_seconds,
+        "total_seconds": time.perf_counter() - started,
+    }
@@ -0,0 +1,265 @@
+"""
+Incremental maintenance of the per-user measurement statistics.
+
+Every function here runs inside the caller's transaction and only issues
+atomic UPDATE/upsert statements, so concurrent writers cannot lose each
+other's increments. The measurement CRUD functions call them; nothing
+else should write to user_measurement_stats or user_category_counts.
+"""
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Iterable, NamedTuple, Optional
+
+from sqlalchemy import (bindparam, case, delete, func, insert, or_, select,
+                        tuple_, update)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from ..models import Measurement, UserCategoryCount, UserMeasurementStats
+
+
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """
+    Normalize a timestamp the way the DateTime columns store it.
+    """
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class MeasurementFacts(NamedTuple):
+    """
+    The columns of a measurement the statistics depend on.
+    """
+    id: int
+    user_id: str
+    category_id: int
+    bmi: float
+    recorded_at: datetime  # NOT NULL, so (recorded_at, id) always compares
+
+    @classmethod
+    def of(cls, measurement: Measurement) -> "MeasurementFacts":
+        return cls(
+            measurement.id,
+            measurement.user_id,
+            measurement.category_id,
+            measurement.bmi,
+            naive_utc(measurement.recorded_at)
+        )
+
+
+def _latest_measurement(user_id):
+    """
+    Query for the user's most recent measurement, served by
+    ix_measurements_user_recorded.
+    """
+    return (
+        select(Measurement.id, Measurement.recorded_at)
+        .where(Measurement.user_id == user_id)
+        .order_by(Measurement.recorded_at.desc(), Measurement.id.desc())
+        .limit(1)
+    )
+
+
+def stats_added(db: Session, facts: Iterable[MeasurementFacts]) -> None:
+    """
+    Fold newly stored measurements into the statistics: one upsert per
+    user and per (user, category).
+    """
+    per_user: dict[str, dict] = {}
+    per_category: dict[tuple[str, int], int] = defaultdict(int)
+    for fact in facts:
+        stats = per_user.get(fact.user_id)
+        if stats is None:
+            per_user[fact.user_id] = {
+                "user_id": fact.user_id,
+                "count": 1,
+                "bmi_sum": fact.bmi,
+                "bmi_min": fact.bmi,
+                "bmi_max": fact.bmi,
+                "latest_measurement_id": fact.id,
+                "latest_recorded_at": fact.recorded_at,
+            }
+        else:
+            stats["count"] += 1
+            stats["bmi_sum"] += fact.bmi
+            stats["bmi_min"] = min(stats["bmi_min"], fact.bmi)
+            stats["bmi_max"] = max(stats["bmi_max"], fact.bmi)
+            if (fact.recorded_at, fact.id) > (stats["latest_recorded_at"], stats["latest_measurement_id"]):
+                stats["latest_measurement_id"] = fact.id
+                stats["latest_recorded_at"] = fact.recorded_at
+        per_category[(fact.user_id, fact.category_id)] += 1
+
+    if not per_user:
+        return
+
+    table = UserMeasurementStats
+    stmt = sqlite_insert(table)
+    new = stmt.excluded
+    is_newer = or_(
+        table.latest_recorded_at.is_(None),
+        tuple_(new.latest_recorded_at, new.latest_measurement_id)
+        > tuple_(table.latest_recorded_at, table.latest_measurement_id)
+    )
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[table.user_id],
+            set_={
+                "count": table.count + new.count,
+                "bmi_sum": table.bmi_sum + new.bmi_sum,
+                # Two-argument min()/max() return NULL when either side is NULL
+                "bmi_min": func.min(func.coalesce(table.bmi_min, new.bmi_min), new.bmi_min),
+                "bmi_max": func.max(func.coalesce(table.bmi_max, new.bmi_max), new.bmi_max),
+                "latest_measurement_id": case(
+                    (is_newer, new.latest_measurement_id),
+                    else_=table.latest_measurement_id
+                ),
+                "latest_recorded_at": case(
+                    (is_newer, new.latest_recorded_at),
+                    else_=table.latest_recorded_at
+                ),
+            }
+        ),
+        list(per_user.values())
+    )
+
+    stmt = sqlite_insert(UserCategoryCount)
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[UserCategoryCount.user_id, UserCategoryCount.category_id],
+            set_={"count": UserCategoryCount.count + stmt.excluded.count}
+        ),
+        [
+            {"user_id": user_id, "category_id": category_id, "count": count}
+            for (user_id, category_id), count in per_category.items()
+        ]
+    )
+
+
+def stats_removed(db: Session, facts: Iterable[MeasurementFacts]) -> None:
+    """
+    Take measurements that are gone (or changed) out of the statistics:
+    one UPDATE per user and per (user, category), run as executemany.
+    Call after the change has been flushed. min, max and latest are only
+    recomputed from the table when a removed row held them; min/max then
+    scan that user's rows, latest is one index seek (taken when the row
+    it names is gone or no longer has the recorded date).
+    """
+    per_user: dict[str, dict] = {}
+    per_category: dict[tuple[str, int], int] = defaultdict(int)
+    for fact in facts:
+        removed = per_user.get(fact.user_id)
+        if removed is None:
+            per_user[fact.user_id] = {
+                "b_user_id": fact.user_id,
+                "b_count": 1,
+                "b_bmi_sum": fact.bmi,
+                "b_bmi_min": fact.bmi,
+                "b_bmi_max": fact.bmi,
+            }
+        else:
+            removed["b_count"] += 1
+            removed["b_bmi_sum"] += fact.bmi
+            removed["b_bmi_min"] = min(removed["b_bmi_min"], fact.bmi)
+            removed["b_bmi_max"] = max(removed["b_bmi_max"], fact.bmi)
+        per_category[(fact.user_id, fact.category_id)] += 1
+
+    if not per_user:
+        return
+
+    table = UserMeasurementStats.__table__
+    user_id = bindparam("b_user_id")
+    latest = _latest_measurement(user_id).subquery()
+    latest_stored = select(Measurement.id).where(
+        Measurement.id == table.c.latest_measurement_id,
+        Measurement.user_id == user_id,
+        Measurement.recorded_at == table.c.latest_recorded_at
+    ).exists()
+    db.execute(
+        update(table)
+        .where(table.c.user_id == user_id)
+        .values(
+            count=table.c.count - bindparam("b_count"),
+            bmi_sum=table.c.bmi_sum - bindparam("b_bmi_sum"),
+            bmi_min=case(
+                (table.c.bmi_min >= bindparam("b_bmi_min"), select(func.min(Measurement.bmi))
+                    .where(Measurement.user_id == user_id)
+                    .scalar_subquery()),
+                else_=table.c.bmi_min
+            ),
+            bmi_max=case(
+                (table.c.bmi_max <= bindparam("b_bmi_max"), select(func.max(Measurement.bmi))
+                    .where(Measurement.user_id == user_id)
+                    .scalar_subquery()),
+                else_=table.c.bmi_max
+            ),
+            latest_measurement_id=case(
+                (~latest_stored, select(latest.c.id).scalar_subquery()),
+                else_=table.c.latest_measurement_id
+            ),
+            latest_recorded_at=case(
+                (~latest_stored, select(latest.c.recorded_at).scalar_subquery()),
+                else_=table.c.latest_recorded_at
+            ),
+        ),
+        list(per_user.values())
+    )
+
+    counts = UserCategoryCount.__table__
+    db.execute(
+        update(counts)
+        .where(counts.c.user_id == bindparam("b_user_id"), counts.c.category_id == bindparam("b_category_id"))
+        .values(count=counts.c.count - bindparam("b_count")),
+        [
+            {"b_user_id": user_id, "b_category_id": category_id, "b_count": count}
+            for (user_id, category_id), count in per_category.items()
+        ]
+    )
+
+
+def rebuild_user_stats(db: Session, user_id: Optional[str] = None) -> None:
+    """
+    Recompute the statistics from the measurements table, for one user or
+    everyone. For backfilling; the CRUD functions keep them current.
+    """
+    stats_filter = [] if user_id is None else [UserMeasurementStats.user_id == user_id]
+    count_filter = [] if user_id is None else [UserCategoryCount.user_id == user_id]
+    measurement_filter = [] if user_id is None else [Measurement.user_id == user_id]
+
+    db.execute(delete(UserMeasurementStats).where(*stats_filter))
+    db.execute(delete(UserCategoryCount).where(*count_filter))
+
+    ranked = select(
+        Measurement.user_id,
+        Measurement.id,
+        Measurement.recorded_at,
+        func.row_number().over(
+            partition_by=Measurement.user_id,
+            order_by=(Measurement.recorded_at.desc(), Measurement.id.desc())
+        ).label("rank")
+    ).where(*measurement_filter).subquery()
+    latest = select(ranked.c.user_id, ranked.c.id, ranked.c.recorded_at).where(
+        ranked.c.rank == 1
+    ).subquery()
+    totals = select(
+        Measurement.user_id,
+        func.count().label("count"),
+        func.sum(Measurement.bmi).label("bmi_sum"),
+        func.min(Measurement.bmi).label("bmi_min"),
+        func.max(Measurement.bmi).label("bmi_max"),
+    ).where(*measurement_filter).group_by(Measurement.user_id).subquery()
+
+    db.execute(insert(UserMeasurementStats).from_select(
+        ["user_id", "count", "bmi_sum", "bmi_min", "bmi_max",
+         "latest_measurement_id", "latest_recorded_at"],
+        select(
+            totals.c.user_id, totals.c.count, totals.c.bmi_sum,
+            totals.c.bmi_min, totals.c.bmi_max, latest.c.id, latest.c.recorded_at
+        ).join(latest, latest.c.user_id == totals.c.user_id)
+    ))
+    db.execute(insert(UserCategoryCount).from_select(
+        ["user_id", "category_id", "count"],
+        select(Measurement.user_id, Measurement.category_id, func.count())
+        .where(*measurement_filter)
+        .group_by(Measurement.user_id, Measurement.category_id)
+    ))
@@ -0,0 +1,268 @@
+"""
+BMI trend aggregation: measurements bucketed by day, week or month.
+"""
+from datetime import date, datetime, timedelta
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import (Date, bindparam, case, delete, func, insert, literal,
+                        select, type_coerce, update)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from ..models import Measurement, MeasurementRollup
+from .stats import MeasurementFacts
+
+PERIODS = ("day", "week", "month")
+
+
+def _check_period(period: str) -> None:
+    if period not in PERIODS:
+        raise ValueError(f"Invalid period {period!r}, expected one of {', '.join(PERIODS)}")
+
+
+def bucket_bounds(period: str, moment: date) -> Tuple[datetime, datetime]:
+    """
+    Start (inclusive) and end (exclusive) of the bucket holding `moment`.
+    Weeks start on Monday.
+    """
+    _check_period(period)
+    start = datetime(moment.year, moment.month, moment.day)
+    if period == "day":
+        return start, start + timedelta(days=1)
+    if period == "week":
+        start -= timedelta(days=start.weekday())
+        return start, start + timedelta(days=7)
+    start = start.replace(day=1)
+    if start.month == 12:
+        return start, start.replace(year=start.year + 1, month=1)
+    return start, start.replace(month=start.month + 1)
+
+
+def bucket_expression(period: str, column=Measurement.recorded_at):
+    """
+    SQL expression for the start date of the bucket holding `column`;
+    the SQLite counterpart of bucket_bounds().
+    """
+    _check_period(period)
+    if period == "day":
+        expression = func.date(column)
+    elif period == "week":
+        # 'weekday 0' moves forward to Sunday (or stays on it)
+        expression = func.date(column, "weekday 0", "-6 days")
+    else:
+        expression = func.date(column, "start of month")
+    return type_coerce(expression, Date)
+
+
+def _fold(rows) -> List[dict]:
+    """
+    Fold (bucket, category_id, count, bmi_sum, bmi_min, bmi_max) rows,
+    ordered by bucket, into one entry per bucket.
+    """
+    trend = []
+    for bucket, category_id, count, bmi_sum, bmi_min, bmi_max in rows:
+        if not trend or trend[-1]["bucket"] != bucket:
+            trend.append({
+                "bucket": bucket,
+                "count": 0,
+                "avg_bmi": 0.0,
+                "min_bmi": bmi_min,
+                "max_bmi": bmi_max,
+                "category_counts": {},
+            })
+        entry = trend[-1]
+        entry["count"] += count
+        entry["avg_bmi"] += bmi_sum
+        entry["min_bmi"] = min(entry["min_bmi"], bmi_min)
+        entry["max_bmi"] = max(entry["max_bmi"], bmi_max)
+        entry["category_counts"][category_id] = count
+    for entry in trend:
+        entry["avg_bmi"] /= entry["count"]
+    return trend
+
+
+def get_bmi_trend(
+    db: Session,
+    period: str = "day",
+    user_id: Optional[str] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    use_rollups: bool = False
+) -> List[dict]:
+    """
+    BMI count, average, min, max and category distribution per bucket,
+    for one user or everyone, oldest bucket first. `start` and `end` pick
+    the buckets holding them, inclusive. With `use_rollups` the buckets
+    are read from measurement_rollups instead of aggregating raw rows.
+    """
+    _check_period(period)
+    if use_rollups:
+        table = MeasurementRollup
+        query = select(
+            table.bucket,
+            table.category_id,
+            func.sum(table.count),
+            func.sum(table.bmi_sum),
+            func.min(table.bmi_min),
+            func.max(table.bmi_max),
+        ).where(table.period == period, table.count > 0)
+        if user_id is not None:
+            query = query.where(table.user_id == user_id)
+        if start is not None:
+            query = query.where(table.bucket >= bucket_bounds(period, start)[0].date())
+        if end is not None:
+            query = query.where(table.bucket <= bucket_bounds(period, end)[0].date())
+        bucket, category_id = table.bucket, table.category_id
+    else:
+        bucket = bucket_expression(period).label("bucket")
+        query = select(
+            bucket,
+            Measurement.category_id,
+            func.count(),
+            func.sum(Measurement.bmi),
+            func.min(Measurement.bmi),
+            func.max(Measurement.bmi),
+        )
+        if user_id is not None:
+            query = query.where(Measurement.user_id == user_id)
+        if start is not None:
+            query = query.where(Measurement.recorded_at >= bucket_bounds(period, start)[0])
+        if end is not None:
+            query = query.where(Measurement.recorded_at < bucket_bounds(period, end)[1])
+        category_id = Measurement.category_id
+
+    query = query.group_by(bucket, category_id).order_by(bucket)
+    return _fold(db.execute(query).all())
+
+
+def rollups_added(db: Session, facts: Iterable[MeasurementFacts]) -> None:
+    """
+    Fold newly stored measurements into the rollups: one upsert per
+    period, user, bucket and category.
+    """
+    groups: dict[tuple, dict] = {}
+    for fact in facts:
+        for period in PERIODS:
+            key = (period, fact.user_id, bucket_bounds(period, fact.recorded_at)[0].date(), fact.category_id)
+            group = groups.get(key)
+            if group is None:
+                groups[key] = {
+                    "period": key[0], "user_id": key[1], "bucket": key[2], "category_id": key[3],
+                    "count": 1, "bmi_sum": fact.bmi, "bmi_min": fact.bmi, "bmi_max": fact.bmi,
+                }
+            else:
+                group["count"] += 1
+                group["bmi_sum"] += fact.bmi
+                group["bmi_min"] = min(group["bmi_min"], fact.bmi)
+                group["bmi_max"] = max(group["bmi_max"], fact.bmi)
+
+    if not groups:
+        return
+
+    table = MeasurementRollup
+    stmt = sqlite_insert(table)
+    new = stmt.excluded
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[table.period, table.user_id, table.bucket, table.category_id],
+            set_={
+                "count": table.count + new.count,
+                "bmi_sum": table.bmi_sum + new.bmi_sum,
+                "bmi_min": func.min(func.coalesce(table.bmi_min, new.bmi_min), new.bmi_min),
+                "bmi_max": func.max(func.coalesce(table.bmi_max, new.bmi_max), new.bmi_max),
+            }
+        ),
+        list(groups.values())
+    )
+
+
+def rollups_removed(db: Session, facts: Iterable[MeasurementFacts]) -> None:
+    """
+    Take measurements that are gone (or changed) out of the rollups: one
+    UPDATE per period, user, bucket and category, run as executemany.
+    Call after the change has been flushed; min/max are recomputed from
+    the bucket's rows only when a removed row held them.
+    """
+    groups: dict[tuple, dict] = {}
+    for fact in facts:
+        for period in PERIODS:
+            bucket_start, bucket_end = bucket_bounds(period, fact.recorded_at)
+            key = (period, fact.user_id, bucket_start, fact.category_id)
+            removed = groups.get(key)
+            if removed is None:
+                groups[key] = {
+                    "b_period": period, "b_user_id": fact.user_id, "b_category_id": fact.category_id,
+                    "b_bucket": bucket_start.date(), "b_start": bucket_start, "b_end": bucket_end,
+                    "b_count": 1, "b_bmi_sum": fact.bmi, "b_bmi_min": fact.bmi, "b_bmi_max": fact.bmi,
+                }
+            else:
+                removed["b_count"] += 1
+                removed["b_bmi_sum"] += fact.bmi
+                removed["b_bmi_min"] = min(removed["b_bmi_min"], fact.bmi)
+                removed["b_bmi_max"] = max(removed["b_bmi_max"], fact.bmi)
+
+    if not groups:
+        return
+
+    table = MeasurementRollup.__table__
+    in_bucket = (
+        Measurement.user_id == bindparam("b_user_id"),
+        Measurement.category_id == bindparam("b_category_id"),
+        Measurement.recorded_at >= bindparam("b_start"),
+        Measurement.recorded_at < bindparam("b_end"),
+    )
+    db.execute(
+        update(table)
+        .where(
+            table.c.period == bindparam("b_period"),
+            table.c.user_id == bindparam("b_user_id"),
+            table.c.bucket == bindparam("b_bucket"),
+            table.c.category_id == bindparam("b_category_id")
+        )
+        .values(
+            count=table.c.count - bindparam("b_count"),
+            bmi_sum=table.c.bmi_sum - bindparam("b_bmi_sum"),
+            bmi_min=case(
+                (table.c.bmi_min >= bindparam("b_bmi_min"), select(func.min(Measurement.bmi))
+                    .where(*in_bucket)
+                    .scalar_subquery()),
+                else_=table.c.bmi_min
+            ),
+            bmi_max=case(
+                (table.c.bmi_max <= bindparam("b_bmi_max"), select(func.max(Measurement.bmi))
+                    .where(*in_bucket)
+                    .scalar_subquery()),
+                else_=table.c.bmi_max
+            ),
+        ),
+        list(groups.values())
+    )
+
+
+def rebuild_rollups(db: Session, user_id: Optional[str] = None) -> None:
+    """
+    Recompute the rollups from the measurements table, for one user or
+    everyone. Run after enabling `measurement_rollups` on existing data.
+    """
+    db.execute(delete(MeasurementRollup).where(
+        *([] if user_id is None else [MeasurementRollup.user_id == user_id])
+    ))
+    for period in PERIODS:
+        bucket = bucket_expression(period)
+        query = select(
+            literal(period),
+            Measurement.user_id,
+            bucket,
+            Measurement.category_id,
+            func.count(),
+            func.sum(Measurement.bmi),
+            func.min(Measurement.bmi),
+            func.max(Measurement.bmi),
+        ).group_by(Measurement.user_id, bucket, Measurement.category_id)
+        if user_id is not None:
+            query = query.where(Measurement.user_id == user_id)
+        db.execute(insert(MeasurementRollup).from_select(
+            ["period", "user_id", "bucket", "category_id",
+             "count", "bmi_sum", "bmi_min", "bmi_max"],
+            query
+        ))
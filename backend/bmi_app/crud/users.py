@@ -3,8 +3,12 @@ CRUD operations for users.
 """
 from typing import List, Optional
 
+from sqlalchemy import delete, select, update
+from sqlalchemy.engine import Row
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
 
+from ..core.user_index import user_index
 from ..models import User
 
 
@@ -22,6 +26,51 @@ def get_user_by_id(db: Session, user_id: str) -> Optional[User]:
     return db.query(User).filter(User.id == user_id).first()
 
 
+def _get_user_by(db: Session, field: str, value: str) -> Optional[User]:
+    """
+    Look the id up in the user index, then load the user by primary key.
+    """
+    user_id = user_index.user_id_for(db, field, value)
+    if user_id is None:
+        return None
+    db_user = db.get(User, user_id)
+    if db_user is None or getattr(db_user, field) != value:
+        # Deleted or renamed by another process since it was cached
+        user_index.forget(field, value)
+        return db.query(User).filter(getattr(User, field) == value).first()
+    return db_user
+
+
+def get_user_by_email(db: Session, email: str) -> Optional[User]:
+    """
+    Retrieve a user by email.
+    """
+    return _get_user_by(db, "email", email)
+
+
+def get_user_by_username(db: Session, username: str) -> Optional[User]:
+    """
+    Retrieve a user by username.
+    """
+    return _get_user_by(db, "username", username)
+
+
+def user_exists(
+    db: Session,
+    username: Optional[str] = None,
+    email: Optional[str] = None
+) -> bool:
+    """
+    Whether a user has this username or this email (availability check
+    at signup). Most absent values are answered without a query.
+    """
+    return any(
+        user_index.user_id_for(db, field, value) is not None
+        for field, value in (("username", username), ("email", email))
+        if value is not None
+    )
+
+
 def create_user(
     db: Session,
     username: str,
@@ -39,6 +88,7 @@ def create_user(
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    user_index.add(db_user)
     return db_user
 
 
@@ -54,6 +104,7 @@ def update_user(
     """
     db_user = get_user_by_id(db, user_id)
     if db_user:
+        previous = {"username": db_user.username, "email": db_user.email}
         if username is not None:
             db_user.username = username
         if email is not None:
@@ -63,16 +114,118 @@ def update_user(
 
         db.commit()
         db.refresh(db_user)
+        for field, value in previous.items():
+            if getattr(db_user, field) != value:
+                user_index.forget(field, value)
+        user_index.add(db_user)
     return db_user
 
 
 def delete_user(db: Session, user_id: str) -> bool:
     """
-    Delete a user by ID.
+    Delete a user by ID, with their measurements (and the derived tables
+    updated), in one transaction.
     """
+    from .measurements import _delete_user_measurements
+
     db_user = get_user_by_id(db, user_id)
     if db_user:
-        db.delete(db_user)
-        db.commit()
+        username, email = db_user.username, db_user.email
+        try:
+            _delete_user_measurements(db, [user_id])
+            # Already deleted: nothing for the ORM to unlink
+            set_committed_value(db_user, "measurements", [])
+            db.delete(db_user)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        user_index.forget("username", username)
+        user_index.forget("email", email)
         return True
     return False
+
+
+def update_users(db: Session, user_ids: List[str], **values) -> List[Row]:
+    """
+    Set the same values (e.g. password_hash) on many users with one
+    UPDATE ... RETURNING; returns the updated rows (Row objects, nothing
+    is refreshed). Unknown ids are skipped. Users loaded in the session
+    are not synchronized: the commit expires them.
+    """
+    values = {key: value for key, value in values.items() if key != "id" and key in User.__table__.c}
+    if not values:
+        return []
+    try:
+        rows = db.execute(
+            update(User)
+            .where(User.id.in_(user_ids))
+            .values(**values)
+            .returning(*User.__table__.c)
+            .execution_options(synchronize_session=False)
+        ).all()
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    for row in rows:
+        user_index.forget_user(row.id)
+        user_index.add(row)
+    return rows
+
+
+def update_user_returning(
+    db: Session,
+    user_id: str,
+    username: Optional[str] = None,
+    email: Optional[str] = None,
+    password_hash: Optional[str] = None
+) -> Optional[Row]:
+    """
+    update_user() in one UPDATE ... RETURNING, without loading and
+    refreshing an ORM object; None when the user does not exist.
+    """
+    values = {
+        key: value
+        for key, value in (("username", username), ("email", email), ("password_hash", password_hash))
+        if value is not None
+    }
+    if not values:
+        return db.execute(select(*User.__table__.c).where(User.id == user_id)).first()
+    rows = update_users(db, [user_id], **values)
+    return rows[0] if rows else None
+
+
+def delete_users(db: Session, user_ids: List[str]) -> List[str]:
+    """
+    Delete many users with DELETE ... RETURNING (one statement per chunk
+    of ids); returns the ids deleted. Like delete_user(), their
+    measurements go too, in the same transaction.
+    """
+    from .measurements import _IN_CLAUSE_SIZE, _delete_user_measurements
+
+    deleted: List[str] = []
+    try:
+        _delete_user_measurements(db, user_ids)
+        for start in range(0, len(user_ids), _IN_CLAUSE_SIZE):
+            deleted.extend(db.scalars(
+                delete(User)
+                .where(User.id.in_(user_ids[start:start + _IN_CLAUSE_SIZE]))
+                .returning(User.id)
+                .execution_options(synchronize_session=False)
+            ))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    for user_id in deleted:
+        user_index.forget_user(user_id)
+    return deleted
+
+
+def delete_user_returning(db: Session, user_id: str) -> bool:
+    """
+    delete_user() without loading the ORM object first: the user is
+    deleted with DELETE ... RETURNING.
+    """
+    return bool(delete_users(db, [user_id]))
@@ -3,32 +3,181 @@ Script Name : database.py
 Description : Database connection logic (SQLAlchemy engine, session)
 Author      : @tonybnya
 """
-from sqlalchemy import create_engine
+import os
+import threading
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import URL, Engine, make_url
+from sqlalchemy.ext.asyncio import (AsyncEngine, async_sessionmaker,
+                                    create_async_engine)
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool, StaticPool
 
-from .core.config import get_settings
-from .models import Base
+from .core.config import Settings, get_settings
+from .core.metrics import instrument_engine
+from .models import Base, Measurement
 
 settings = get_settings()
 
-# Create engine with appropriate configuration
-# SQLite specific configuration
-engine = create_engine(
-    settings.database_url,
-    connect_args={"check_same_thread": False},
-    poolclass=StaticPool,
-    echo=settings.debug,
-)
 
-# Create SessionLocal class
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def is_memory_database(database_url: str) -> bool:
+    """
+    Whether the URL points to an in-memory SQLite database.
+    """
+    url = make_url(database_url)
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def apply_sqlite_pragmas(dbapi_connection, config: Settings) -> None:
+    """
+    Tune a freshly opened SQLite connection.
+    """
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA journal_mode={config.sqlite_journal_mode}")
+        cursor.execute(f"PRAGMA synchronous={config.sqlite_synchronous}")
+        cursor.execute(f"PRAGMA mmap_size={int(config.sqlite_mmap_size)}")
+        cursor.execute(f"PRAGMA cache_size={int(config.sqlite_cache_size)}")
+        cursor.execute(f"PRAGMA busy_timeout={int(config.sqlite_busy_timeout)}")
+    finally:
+        cursor.close()
+
+
+def pool_options(config: Settings, queue_pool) -> dict:
+    """
+    Pool arguments shared by the sync and async engines.
+    """
+    if is_memory_database(config.database_url):
+        return {"poolclass": StaticPool}
+    return {
+        "poolclass": queue_pool,
+        "pool_size": config.db_pool_size,
+        "max_overflow": config.db_max_overflow,
+        "pool_timeout": config.db_pool_timeout,
+        "pool_pre_ping": config.db_pool_pre_ping,
+        "pool_recycle": config.db_pool_recycle,
+    }
+
+
+def build_engine(config: Settings) -> Engine:
+    """
+    Create an engine for `config.database_url`.
+    File-backed databases get a real connection pool, so concurrent
+    requests use their own connection; an in-memory SQLite database only
+    exists within one connection and keeps sharing it through StaticPool.
+    """
+    url = make_url(config.database_url)
+    is_sqlite = url.get_backend_name() == "sqlite"
+    options = {"echo": config.debug, **pool_options(config, QueuePool)}
+
+    if is_sqlite:
+        options["connect_args"] = {"check_same_thread": False}
+
+    new_engine = create_engine(url, **options)
+
+    if is_sqlite:
+        @event.listens_for(new_engine, "connect")
+        def on_connect(dbapi_connection, connection_record):
+            apply_sqlite_pragmas(dbapi_connection, config)
+
+    return new_engine
+
+
+def async_database_url(database_url: str) -> URL:
+    """
+    Swap the SQLite driver for aiosqlite; other URLs must already name an
+    async driver (e.g. postgresql+asyncpg).
+    """
+    url = make_url(database_url)
+    if url.get_backend_name() == "sqlite":
+        return url.set(drivername="sqlite+aiosqlite")
+    return url
+
+
+def build_async_engine(config: Settings) -> AsyncEngine:
+    """
+    Async twin of build_engine(): same pool settings and pragmas.
+    An in-memory database is private to its engine, so the sync and async
+    engines only share data when the URL points to a file.
+    """
+    url = async_database_url(config.database_url)
+    new_engine = create_async_engine(
+        url,
+        echo=config.debug,
+        **pool_options(config, AsyncAdaptedQueuePool)
+    )
+
+    if url.get_backend_name() == "sqlite":
+        @event.listens_for(new_engine.sync_engine, "connect")
+        def on_connect(dbapi_connection, connection_record):
+            apply_sqlite_pragmas(dbapi_connection, config)
+
+    return new_engine
+
+
+# Engines and session factories, created on first use by _connect():
+# importing this module (and the app) does not open or configure anything
+_CONNECTION_NAMES = ("engine", "async_engine", "SessionLocal", "AsyncSessionLocal")
+_connect_lock = threading.Lock()
+_connected = False
+
+
+def _connect() -> None:
+    """
+    Create the engines and session factories from the settings.
+    """
+    global engine, async_engine, SessionLocal, AsyncSessionLocal, _connected
+    if _connected:
+        return
+    with _connect_lock:
+        if _connected:
+            return
+        engine = build_engine(settings)
+        async_engine = build_async_engine(settings)
+        if settings.metrics_enabled or settings.profiling_enabled:
+            # Per-statement listeners cost on every query: opt-in, unless
+            # profiling needs them
+            query_timing = settings.metrics_query_timing or settings.profiling_enabled
+            instrument_engine(engine, "sync", query_timing)
+            instrument_engine(async_engine.sync_engine, "async", query_timing)
+
+        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        AsyncSessionLocal = async_sessionmaker(
+            async_engine,
+            autoflush=False,
+            expire_on_commit=False
+        )
+        _connected = True
+
+
+def _after_fork_in_child() -> None:
+    """
+    A forked worker must not reuse the parent's pooled connections (or
+    their SQLite file handles): drop them without closing, so the parent's
+    stay intact, and let the worker open its own.
+    """
+    global _connect_lock
+    _connect_lock = threading.Lock()
+    if _connected:
+        engine.dispose(close=False)
+        async_engine.sync_engine.dispose(close=False)
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def __getattr__(name: str):
+    if name in _CONNECTION_NAMES:
+        _connect()
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def get_db():
     """
     Dependency to get database session for FastAPI routes.
     """
+    _connect()
     db = SessionLocal()
     try:
         yield db
@@ -36,15 +185,94 @@ def get_db():
         db.close()
 
 
-def create_tables():
+async def get_async_db():
+    """
+    Dependency to get an async database session for FastAPI routes.
+    """
+    _connect()
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def get_db_session():
+    """
+    Dependency yielding an AsyncSession when `db_async` is enabled, a
+    regular Session otherwise. Read per request, so it can be toggled.
+    """
+    _connect()
+    if get_settings().db_async:
+        async with AsyncSessionLocal() as db:
+            yield db
+    else:
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            # Closed on the loop, not in the threadpool: if every worker
+            # thread were waiting on the pool, a queued close() returning
+            # the connection would never get to run
+            db.close()
+
+
+# Stored for a NULL recorded_at by migrate_tables(): NULL sorted before
+# every timestamp, so this keeps every ordering the same
+NULL_RECORDED_AT = "1970-01-01 00:00:00.000000"
+
+
+def migrate_tables(bind: Engine) -> int:
+    """
+    Upgrade tables created by an older version of the models; returns the
+    number of measurements whose NULL recorded_at was backfilled (the
+    derived tables then need a rebuild, see scripts/init_db.py).
+
+    measurements.recorded_at became NOT NULL. SQLite cannot alter a
+    column, so the table is rebuilt: renamed, created again from the model
+    and refilled, in one transaction.
+    """
+    table = Measurement.__table__
+    with bind.begin() as conn:
+        columns = {row[1]: row for row in conn.exec_driver_sql(f"PRAGMA table_info({table.name})")}
+        if not columns or columns["recorded_at"][3]:
+            return 0
+        backfilled = conn.exec_driver_sql(
+            f"SELECT count(*) FROM {table.name} WHERE recorded_at IS NULL"
+        ).scalar()
+        names = ", ".join(column.name for column in table.c)
+        values = ", ".join(
+            f"coalesce(recorded_at, '{NULL_RECORDED_AT}')" if column.name == "recorded_at" else column.name
+            for column in table.c
+        )
+        conn.exec_driver_sql(f"ALTER TABLE {table.name} RENAME TO {table.name}_old")
+        # Index names are global: free them for the new table
+        for (index_name,) in conn.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+            (f"{table.name}_old",)
+        ).all():
+            conn.exec_driver_sql(f"DROP INDEX {index_name}")
+        table.create(conn)
+        conn.exec_driver_sql(f"INSERT INTO {table.name} ({names}) SELECT {values} FROM {table.name}_old")
+        conn.exec_driver_sql(f"DROP TABLE {table.name}_old")
+    return backfilled
+
+
+def create_tables() -> int:
     """
-    Create all tables in the database.
+    Create all tables in the database, any index missing from a table
+    created by an older version of the models, and migrate the tables that
+    need it; returns the number of measurements migrate_tables() backfilled.
     """
+    _connect()
     Base.metadata.create_all(bind=engine)
+    backfilled = migrate_tables(engine)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    return backfilled
 
 
 def drop_tables():
     """
     Drop all tables from the database.
     """
+    _connect()
     Base.metadata.drop_all(bind=engine)
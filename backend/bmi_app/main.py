@@ -3,15 +3,53 @@ Script Name : main.py
 Description : Entrypoint for FastAPI app (creates app, includes routes)
 Author      : @tonybnya
 """
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy.exc import OperationalError
 
-from bmi_app.api import routes_bmi, routes_categories
+from bmi_app.api import (routes_bmi, routes_categories, routes_measurements,
+                         routes_metrics)
+from bmi_app.core.category_index import rebuild_category_index
 from bmi_app.core.config import get_settings
+from bmi_app.core.metrics import MetricsMiddleware
+from bmi_app.core.profiling import ProfilingMiddleware
+from bmi_app import database
 
 # Get settings instance
 settings = get_settings()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Load the category index from the database before serving requests.
+    This is where the database engine gets created, not at import time.
+    In write-behind mode, also runs the measurement writer.
+    """
+    db = database.SessionLocal()
+    try:
+        rebuild_category_index(db)
+    except OperationalError:
+        # Tables not created yet: keep the built-in standard categories
+        pass
+    finally:
+        db.close()
+
+    if settings.measurement_write_behind:
+        from bmi_app.core.write_behind import start_writer, stop_writer
+
+        start_writer(settings, database.SessionLocal)
+        try:
+            yield
+        finally:
+            # Drain the queue, spill what is left to the spool file
+            stop_writer()
+    else:
+        yield
+
+
 # Create FastAPI app with settings
 app = FastAPI(
     title=settings.app_name,
@@ -22,6 +60,7 @@ app = FastAPI(
     that helps users track their health metrics.",
     docs_url="/docs" if settings.debug else None,
     redoc_url="/redoc" if settings.debug else None,
+    lifespan=lifespan,
 )
 
 # Add CORS middleware
@@ -33,9 +72,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if settings.profiling_enabled:
+    app.add_middleware(ProfilingMiddleware, config=settings)
+
+# Added last so it wraps everything, CORS and profiling included
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware)
+
 # include routes
 app.include_router(routes_bmi.router, prefix="/bmi", tags=["bmi"])
 app.include_router(routes_categories.router, prefix="/bmi/categories", tags=["categories"])
+app.include_router(routes_measurements.router, prefix="/measurements", tags=["measurements"])
+if settings.metrics_enabled:
+    app.include_router(routes_metrics.router, tags=["metrics"])
 
 
 @app.get('/', tags=["root"])
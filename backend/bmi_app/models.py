@@ -7,8 +7,8 @@ import enum
 import uuid
 from datetime import datetime, timezone
 
-from sqlalchemy import (Column, DateTime, Enum, Float, ForeignKey, Integer,
-                        String, Text)
+from sqlalchemy import (Column, Date, DateTime, Enum, Float, ForeignKey, Index,
+                        Integer, PrimaryKeyConstraint, String, Text, text)
 from sqlalchemy.orm import declarative_base, relationship
 
 Base = declarative_base()
@@ -71,6 +71,13 @@ class Measurement(Base):
     Define the Measurement model.
     """
     __tablename__ = "measurements"
+    __table_args__ = (
+        # Serve the recorded_at DESC, id DESC orderings (offset and keyset
+        # pagination) straight from an index, globally and per user/category
+        Index("ix_measurements_user_recorded", "user_id", "recorded_at", "id"),
+        Index("ix_measurements_category_recorded", "category_id", "recorded_at", "id"),
+        Index("ix_measurements_recorded", "recorded_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(String(36), ForeignKey("users.id"), nullable=False)
@@ -89,9 +96,13 @@ class Measurement(Base):
     weight_kg = Column(Float, nullable=False)
     bmi = Column(Float, nullable=False)
 
+    # NOT NULL: keyset pagination and the derived tables order by it
+    # (database.migrate_tables() upgrades older databases)
     recorded_at = Column(
         DateTime,
-        default=lambda: datetime.now(timezone.utc)
+        nullable=False,
+        default=lambda: datetime.now(timezone.utc),
+        server_default=text("CURRENT_TIMESTAMP")
     )
     notes = Column(Text, nullable=True)
 
@@ -99,3 +110,72 @@ class Measurement(Base):
     user = relationship("User", back_populates="measurements")
     # Relationship back to Category
     category = relationship("Category", back_populates="measurements")
+
+
+class UserMeasurementStats(Base):
+    """
+    Define the per-user measurement statistics, maintained incrementally
+    by the measurement CRUD functions.
+    """
+    __tablename__ = "user_measurement_stats"
+
+    user_id = Column(String(36), ForeignKey("users.id"), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    bmi_sum = Column(Float, nullable=False, default=0.0)
+    bmi_min = Column(Float, nullable=True)
+    bmi_max = Column(Float, nullable=True)
+    latest_measurement_id = Column(Integer, nullable=True)
+    latest_recorded_at = Column(DateTime, nullable=True)
+
+
+class UserCategoryCount(Base):
+    """
+    Define the number of measurements a user has in each category.
+    """
+    __tablename__ = "user_category_counts"
+    __table_args__ = (PrimaryKeyConstraint("user_id", "category_id"),)
+
+    user_id = Column(String(36), ForeignKey("users.id"), nullable=False)
+    category_id = Column(Integer, ForeignKey("categories.id"), nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class MeasurementRollup(Base):
+    """
+    Define the per-bucket measurement aggregates (one row per period,
+    user, bucket and category), maintained on write when
+    `measurement_rollups` is enabled.
+    """
+    __tablename__ = "measurement_rollups"
+    __table_args__ = (
+        PrimaryKeyConstraint("period", "user_id", "bucket", "category_id"),
+        # Population trends read every user's rows for a bucket range
+        Index("ix_measurement_rollups_bucket", "period", "bucket"),
+    )
+
+    period = Column(String(5), nullable=False)
+    user_id = Column(String(36), ForeignKey("users.id"), nullable=False)
+    bucket = Column(Date, nullable=False)
+    category_id = Column(Integer, ForeignKey("categories.id"), nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+    bmi_sum = Column(Float, nullable=False, default=0.0)
+    bmi_min = Column(Float, nullable=True)
+    bmi_max = Column(Float, nullable=True)
+
+
+class BMIHistogramBin(Base):
+    """
+    Define the BMI histograms (number of measurements per 0.1-wide BMI bin,
+    per period, bucket and category), maintained on write when
+    `measurement_analytics` is enabled. The "all" period has one bucket.
+    """
+    __tablename__ = "bmi_histogram"
+    __table_args__ = (
+        PrimaryKeyConstraint("period", "bucket", "category_id", "bin"),
+    )
+
+    period = Column(String(5), nullable=False)
+    bucket = Column(Date, nullable=False)
+    category_id = Column(Integer, ForeignKey("categories.id"), nullable=False)
+    bin = Column(Integer, nullable=False)  # floor(bmi / 0.1)
+    count = Column(Integer, nullable=False, default=0)
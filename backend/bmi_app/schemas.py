@@ -3,9 +3,12 @@ Script Name : main.py
 Description : Pydantic schemas (request/response validation)
 Author      : @tonybnya
 """
-from typing import Optional
+from datetime import date, datetime
+from typing import Any, Literal, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
+
+from bmi_app.models import HeightUnit, WeightUnit
 
 
 class BMICalculateRequest(BaseModel):
@@ -26,7 +29,7 @@ class BMICalculateResponse(BaseModel):
     weight: float
     bmi: float
     bmi_raw: float
-    category: str
+    category: Optional[str] = Field(..., description="Null when no category contains the BMI")
     formula: str
 
 
@@ -49,3 +52,199 @@ class CategoriesResponse(BaseModel):
         ...,
         description="List of BMI categories"
     )
+
+
+class BMIBatchRecord(BaseModel):
+    # Raw values, coerced row by row: a bad one is reported in that row's
+    # errors instead of failing the request
+    height: Any = Field(None, description="Numeric value of the height")
+    height_unit: Any = Field(
+        None,
+        description="Unit of the height ('cm', 'm', or 'in')"
+    )
+    weight: Any = Field(None, description="Numeric value of the weight")
+    weight_unit: Any = Field(
+        None,
+        description="Unit of the weight ('kg' or 'lb')"
+    )
+
+
+class BMIBatchRequest(BaseModel):
+    # Read as BMIBatchRecord by the endpoint, once the size is checked
+    records: list[Any] = Field(
+        ...,
+        min_length=1,
+        description="Height/weight pairs to score (objects with height, height_unit, "
+                    "weight and weight_unit), units may differ per row"
+    )
+
+
+class BMIBatchResult(BaseModel):
+    index: int = Field(..., description="Position of the row in the request")
+    height: float
+    weight: float
+    bmi: float
+    bmi_raw: float
+    category: Optional[str]
+
+
+class BMIBatchError(BaseModel):
+    index: int = Field(..., description="Position of the row in the request")
+    errors: list[str] = Field(..., description="Validation errors for the row")
+
+
+class BMIBatchResponse(BaseModel):
+    total: int = Field(..., description="Number of rows received")
+    succeeded: int = Field(..., description="Number of rows scored")
+    failed: int = Field(..., description="Number of rows rejected")
+    results: list[BMIBatchResult]
+    errors: list[BMIBatchError]
+
+
+class MeasurementBulkRecord(BaseModel):
+    user_id: str = Field(..., description="ID of the user the measurement belongs to")
+    height: Optional[float] = Field(None, description="Numeric value of the height")
+    height_unit: Optional[str] = Field(
+        None,
+        description="Unit of the height ('cm', 'm', or 'in')"
+    )
+    weight: Optional[float] = Field(None, description="Numeric value of the weight")
+    weight_unit: Optional[str] = Field(
+        None,
+        description="Unit of the weight ('kg' or 'lb')"
+    )
+    recorded_at: Optional[datetime] = Field(
+        None,
+        description="When the measurement was taken (defaults to now)"
+    )
+    notes: Optional[str] = None
+
+
+class MeasurementBulkRequest(BaseModel):
+    measurements: list[MeasurementBulkRecord] = Field(..., min_length=1)
+
+
+class ChunkTiming(BaseModel):
+    rows: int = Field(..., description="Rows inserted by this chunk")
+    seconds: float = Field(..., description="Time spent in the executemany")
+
+
+class MeasurementBulkResponse(BaseModel):
+    accepted: int = Field(..., description="Number of rows inserted")
+    rejected: int = Field(..., description="Number of rows skipped")
+    errors: list[BMIBatchError]
+    chunks: list[ChunkTiming]
+    commit_seconds: float
+    total_seconds: float
+
+
+class MeasurementCreate(BaseModel):
+    user_id: str = Field(..., description="ID of the user the measurement belongs to")
+    height: float = Field(..., gt=0, description="Numeric value of the height")
+    height_unit: HeightUnit = Field(..., description="Unit of the height ('cm', 'm', or 'in')")
+    weight: float = Field(..., gt=0, description="Numeric value of the weight")
+    weight_unit: WeightUnit = Field(..., description="Unit of the weight ('kg' or 'lb')")
+    recorded_at: Optional[datetime] = Field(
+        None,
+        description="When the measurement was taken (defaults to now)"
+    )
+    notes: Optional[str] = None
+
+
+class MeasurementQueued(BaseModel):
+    provisional_id: str = Field(..., description="Look it up at /measurements/pending/{provisional_id}")
+    status: Literal["queued"] = "queued"
+
+
+class PendingMeasurement(BaseModel):
+    provisional_id: str
+    status: Literal["queued", "written", "rejected", "spilled", "quarantined"] = Field(
+        ...,
+        description="'spilled': saved to the spool file, written on the next start; "
+                    "'quarantined': failed again after a restart, set aside"
+    )
+    id: Optional[int] = Field(None, description="Measurement id once written")
+    errors: list[str]
+
+
+class MeasurementResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    user_id: str
+    category_id: int
+    height: float
+    height_unit: HeightUnit
+    weight: float
+    weight_unit: WeightUnit
+    height_m: float
+    weight_kg: float
+    bmi: float
+    recorded_at: datetime
+    notes: Optional[str]
+
+
+class MeasurementPage(BaseModel):
+    items: list[MeasurementResponse]
+    next_cursor: Optional[str] = Field(
+        None,
+        description="Pass as `cursor` to get the next page (null on the last page)"
+    )
+
+
+class MeasurementStats(BaseModel):
+    user_id: str
+    count: int = Field(..., description="Number of measurements")
+    mean_bmi: Optional[float]
+    min_bmi: Optional[float]
+    max_bmi: Optional[float]
+    latest_measurement_id: Optional[int]
+    latest_recorded_at: Optional[datetime]
+    category_counts: dict[int, int] = Field(
+        ..., description="Number of measurements per category id"
+    )
+
+
+TrendPeriod = Literal["day", "week", "month"]
+
+
+class TrendBucket(BaseModel):
+    bucket: date = Field(..., description="First day of the bucket")
+    count: int
+    avg_bmi: float
+    min_bmi: float
+    max_bmi: float
+    category_counts: dict[int, int] = Field(
+        ..., description="Number of measurements per category id"
+    )
+
+
+class TrendResponse(BaseModel):
+    period: TrendPeriod
+    user_id: Optional[str] = Field(None, description="None for the whole population")
+    buckets: list[TrendBucket]
+
+
+class HistogramBin(BaseModel):
+    lower: float = Field(..., description="Lowest BMI of the bin")
+    upper: float = Field(..., description="BMI the next bin starts at")
+    count: int
+
+
+class HistogramResponse(BaseModel):
+    category_id: Optional[int] = Field(None, description="None for all categories")
+    count: int
+    bin_width: float
+    bins: list[HistogramBin] = Field(..., description="Non-empty bins, by ascending BMI")
+
+
+class PercentileValue(BaseModel):
+    percentile: float
+    bmi: Optional[float] = Field(None, description="None when no measurement matches")
+
+
+class PercentilesResponse(BaseModel):
+    category_id: Optional[int] = Field(None, description="None for all categories")
+    count: int
+    max_error: float = Field(..., description="Upper bound of |bmi - exact percentile|")
+    percentiles: list[PercentileValue]
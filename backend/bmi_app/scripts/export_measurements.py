@@ -0,0 +1,79 @@
+"""
+Script Name : export_measurements.py
+Description : Export the measurements table to a Parquet or Arrow IPC file
+Author      : @tonybnya
+
+Usage: python bmi_app/scripts/export_measurements.py OUTPUT [-f parquet|arrow]
+           [--columns id,user_id,bmi,...] [--category-id N]
+           [--start YYYY-MM-DD] [--end YYYY-MM-DD]
+           [--batch-size N] [--compression zstd|lz4|snappy|none]
+"""
+import argparse
+import sys
+import time
+from datetime import date
+from pathlib import Path
+
+# Add the parent directory to sys.path to allow imports
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from bmi_app.core.config import get_settings
+from bmi_app.core.export import (EXPORT_COLUMNS, EXPORT_FORMATS,
+                                 EXPORT_SUFFIXES, export_schema,
+                                 record_batches, write_export)
+
+
+def detect_format(path: str) -> str:
+    """
+    Guess the format from the file extension (Parquet by default).
+    """
+    return EXPORT_SUFFIXES.get(Path(path).suffix.lower(), "parquet")
+
+
+def main():
+    """
+    Stream the (filtered) measurements into the output file, one record
+    batch at a time.
+    """
+    parser = argparse.ArgumentParser(description="Export measurements to Parquet or Arrow IPC.")
+    parser.add_argument("output", help="Output file")
+    parser.add_argument(
+        "-f", "--format", choices=list(EXPORT_FORMATS),
+        help="Output format (default: from the output extension)"
+    )
+    parser.add_argument(
+        "--columns", type=lambda value: [name.strip() for name in value.split(",") if name.strip()],
+        help=f"Comma-separated columns (default: all of {', '.join(EXPORT_COLUMNS)})"
+    )
+    parser.add_argument("--category-id", type=int)
+    parser.add_argument("--start", type=date.fromisoformat, help="First day (inclusive)")
+    parser.add_argument("--end", type=date.fromisoformat, help="Last day (inclusive)")
+    parser.add_argument(
+        "--batch-size", type=int, default=get_settings().measurement_export_batch_size,
+        help="Rows per record batch (bounds memory)"
+    )
+    parser.add_argument("--compression", help="Codec (default: zstd for Parquet, none for Arrow)")
+    args = parser.parse_args()
+
+    from bmi_app.database import engine
+
+    fmt = args.format or detect_format(args.output)
+    try:
+        schema = export_schema(args.columns)
+    except (RuntimeError, ValueError) as e:
+        parser.error(str(e))
+
+    started = time.perf_counter()
+    with engine.connect() as conn:
+        rows = write_export(
+            record_batches(
+                conn, args.columns, category_id=args.category_id,
+                start=args.start, end=args.end, batch_size=args.batch_size
+            ),
+            args.output, fmt, schema, compression=args.compression
+        )
+    print(f"Exported {rows:,} measurements to {args.output} in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+"""
+Script Name : generate_data.py
+Description : Generate a reproducible synthetic dataset for load testing
+Author      : @tonybnya
+
+Usage:
+    python generate_data.py --users 100000 --measurements 10000000 [--seed 1]
+                            [--workers N] [--database-url URL] [--drop]
+
+Users get a sex, a height, a baseline BMI (log-normal around 26) and a
+yearly drift; each of their measurements adds small noise on top, so a
+user's series looks like one person over time. Three users in ten record
+in inches and pounds, and everyone switches systems now and then.
+Activity is skewed: a few users own most of the measurements.
+
+Rows are generated in chunks by a process pool and inserted in order by
+this process with one executemany per chunk. Every chunk draws from its
+own generator seeded with (seed, chunk number), so the same arguments
+give the same rows and ids whatever --workers is.
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from multiprocessing import Pool
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+# Add the parent directory to sys.path to allow imports
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+import numpy as np
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session
+
+from bmi_app.core.category_index import DEFAULT_CATEGORIES, CategoryIndex
+from bmi_app.core.config import Settings, get_settings
+from bmi_app.core.vectorized import (calculate_bmi_array, to_kg_array,
+                                     to_meters_array)
+from bmi_app.crud.analytics import rebuild_histogram
+from bmi_app.crud.stats import rebuild_user_stats
+from bmi_app.crud.trends import rebuild_rollups
+from bmi_app.database import build_engine
+from bmi_app.models import (Base, Category, HeightUnit, Measurement, User,
+                            WeightUnit)
+
+# Stream ids of the per-chunk generators
+USER_STREAM, MEASUREMENT_STREAM = 0, 1
+DEFAULT_END = datetime(2025, 1, 1)
+# Not a usable hash: the generated accounts are not meant to log in
+PASSWORD_HASH = "generated"
+USER_NAMESPACE = uuid.UUID("6f1c1c3e-8f0a-4c1e-9d55-2b8a3f5e7a10")
+
+
+def user_id(seed: int, number: int) -> str:
+    """
+    Id of the `number`-th generated user for `seed`.
+    """
+    return str(uuid.uuid5(USER_NAMESPACE, f"{seed}:{number}"))
+
+
+def chunk_rng(seed: int, stream: int, chunk: int) -> np.random.Generator:
+    return np.random.default_rng([seed, stream, chunk])
+
+
+class UserTraits(NamedTuple):
+    """
+    Per-user parameters, as arrays indexed by user number.
+    """
+    height_m: np.ndarray
+    bmi: np.ndarray
+    drift: np.ndarray  # BMI points per year
+    imperial: np.ndarray
+    created_at: np.ndarray  # seconds since the start of the time span
+    activity_cdf: np.ndarray
+
+
+def user_traits(seed: int, users: int, span_seconds: float, chunk_size: int) -> UserTraits:
+    """
+    Draw every user's traits, chunk by chunk like the rows themselves.
+    """
+    parts = []
+    for chunk, start in enumerate(range(0, users, chunk_size)):
+        rng = chunk_rng(seed, USER_STREAM, chunk)
+        size = min(chunk_size, users - start)
+        male = rng.random(size) < 0.5
+        parts.append((
+            np.where(male, rng.normal(1.76, 0.07, size), rng.normal(1.63, 0.065, size)).clip(1.40, 2.10),
+            np.exp(rng.normal(np.log(26.0), 0.18, size)).clip(15.0, 60.0),
+            rng.normal(0.1, 0.5, size),
+            rng.random(size) < 0.3,
+            # Sign-ups over the first 90% of the span
+            rng.random(size) * span_seconds * 0.9,
+            rng.lognormal(0.0, 1.0, size),
+        ))
+    height_m, bmi, drift, imperial, created_at, activity = (np.concatenate(column) for column in zip(*parts))
+    cdf = np.cumsum(activity)
+    return UserTraits(height_m, bmi, drift, imperial, created_at, cdf / cdf[-1])
+
+
+# Set in each worker by init_worker
+_job: dict = {}
+
+
+def init_worker(job: dict) -> None:
+    _job.update(job)
+
+
+def user_rows(chunk: int) -> list[dict]:
+    seed, start_time = _job["seed"], _job["start"]
+    first = chunk * _job["chunk_size"]
+    last = min(first + _job["chunk_size"], _job["users"])
+    created_at = _job["traits"].created_at
+    rows = []
+    for number in range(first, last):
+        created = start_time + timedelta(seconds=float(created_at[number]))
+        rows.append({
+            "id": user_id(seed, number),
+            "username": f"user{seed}_{number}",
+            "email": f"user{seed}_{number}@example.com",
+            "password_hash": PASSWORD_HASH,
+            "created_at": created,
+            "updated_at": created,
+        })
+    return rows
+
+
+def measurement_rows(chunk: int) -> list[dict]:
+    seed, traits = _job["seed"], _job["traits"]
+    size = min(_job["chunk_size"], _job["measurements"] - chunk * _job["chunk_size"])
+    rng = chunk_rng(seed, MEASUREMENT_STREAM, chunk)
+
+    users = np.searchsorted(traits.activity_cdf, rng.random(size), side="right").clip(0, _job["users"] - 1)
+    created = traits.created_at[users]
+    offset = created + rng.random(size) * (_job["span"] - created)
+    years = (offset - created) / (365.25 * 24 * 3600)
+
+    height_m = traits.height_m[users] + rng.normal(0.0, 0.005, size)
+    bmi = (traits.bmi[users] + traits.drift[users] * years + rng.normal(0.0, 0.4, size)).clip(12.0, 80.0)
+    weight_kg = bmi * height_m ** 2
+
+    # What the user typed, in their units and with their precision
+    imperial = traits.imperial[users] ^ (rng.random(size) < 0.05)
+    in_meters = rng.random(size) < 0.2
+    height_units = np.where(imperial, "in", np.where(in_meters, "m", "cm"))
+    weight_units = np.where(imperial, "lb", "kg")
+    heights = np.where(
+        imperial, np.round(height_m / 0.0254 * 2) / 2,
+        np.where(in_meters, np.round(height_m, 2), np.round(height_m * 100, 1))
+    )
+    weights = np.round(np.where(imperial, weight_kg / 0.45359237, weight_kg), 1)
+
+    stored_height = to_meters_array(heights, height_units)
+    stored_weight = to_kg_array(weights, weight_units)
+    stored_bmi, _ = calculate_bmi_array(stored_height, stored_weight)
+    category_ids = _job["index"].ids_for(stored_bmi)
+
+    start_time = _job["start"]
+    return [
+        {
+            "user_id": user_id(seed, number),
+            "category_id": category_id,
+            "height": height,
+            "height_unit": HeightUnit(height_unit),
+            "weight": weight,
+            "weight_unit": WeightUnit(weight_unit),
+            "height_m": meters,
+            "weight_kg": kilograms,
+            "bmi": value,
+            "recorded_at": start_time + timedelta(seconds=seconds),
+        }
+        for number, category_id, height, height_unit, weight, weight_unit, meters, kilograms, value, seconds
+        in zip(
+            users.tolist(), category_ids.tolist(), heights.tolist(), height_units.tolist(),
+            weights.tolist(), weight_units.tolist(), stored_height.tolist(),
+            stored_weight.tolist(), stored_bmi.tolist(), offset.tolist()
+        )
+    ]
+
+
+def seed_categories(db: Session) -> CategoryIndex:
+    """
+    Insert the default categories into an empty table; return the index
+    of whatever the table holds.
+    """
+    if not db.scalar(select(func.count()).select_from(Category)):
+        db.execute(insert(Category), DEFAULT_CATEGORIES)
+        db.commit()
+    return CategoryIndex([
+        {"id": category.id, "name": category.name,
+         "min_value": category.min_value, "max_value": category.max_value}
+        for category in db.scalars(select(Category))
+    ])
+
+
+def generate(
+    database_url: str,
+    users: int,
+    measurements: int,
+    seed: int = 1,
+    workers: Optional[int] = None,
+    chunk_size: int = 50_000,
+    days: int = 3 * 365,
+    end: datetime = DEFAULT_END,
+    drop: bool = False,
+    log=print
+) -> dict:
+    """
+    Fill `database_url` with `users` users and `measurements`
+    measurements, then rebuild the derived tables.
+    """
+    if users < 1:
+        raise ValueError("At least one user is needed")
+    config = Settings(database_url=database_url)
+    engine = build_engine(config)
+    if drop:
+        Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+
+    started = time.perf_counter()
+    with Session(engine) as db:
+        index = seed_categories(db)
+    span = timedelta(days=days)
+    job = {
+        "seed": seed,
+        "users": users,
+        "measurements": measurements,
+        "chunk_size": chunk_size,
+        "start": end - span,
+        "span": span.total_seconds(),
+        "traits": user_traits(seed, users, span.total_seconds(), chunk_size),
+        "index": index,
+    }
+
+    written = {"users": 0, "measurements": 0}
+    with Pool(workers or os.cpu_count(), initializer=init_worker, initargs=(job,)) as pool:
+        for table, producer, total in (
+            (User.__table__, user_rows, users),
+            (Measurement.__table__, measurement_rows, measurements),
+        ):
+            chunks = range((total + chunk_size - 1) // chunk_size)
+            # imap keeps chunk order, so ids do not depend on scheduling
+            for rows in pool.imap(producer, chunks):
+                with engine.begin() as conn:
+                    conn.execute(insert(table), rows)
+                written[table.name] += len(rows)
+                log(f"{table.name}: {written[table.name]:,}/{total:,} "
+                    f"({time.perf_counter() - started:.1f}s)")
+
+    with Session(engine) as db:
+        log("Rebuilding measurement statistics...")
+        rebuild_user_stats(db)
+        if get_settings().measurement_rollups:
+            log("Rebuilding measurement rollups...")
+            rebuild_rollups(db)
+        if get_settings().measurement_analytics:
+            log("Rebuilding BMI histograms...")
+            rebuild_histogram(db)
+        db.commit()
+    engine.dispose()
+
+    seconds = time.perf_counter() - started
+    return {**written, "seconds": seconds}
+
+
+def main():
+    """
+    Parse the command line and generate the dataset.
+    """
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--measurements", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workers", type=int, help="Generator processes (default: one per CPU)")
+    parser.add_argument("--chunk-size", type=int, default=50_000, help="Rows per generated chunk and insert")
+    parser.add_argument("--days", type=int, default=3 * 365, help="Time span of recorded_at")
+    parser.add_argument(
+        "--end", type=datetime.fromisoformat, default=DEFAULT_END,
+        help="End of the time span (fixed by default, for reproducibility)"
+    )
+    parser.add_argument("--database-url", default=get_settings().database_url)
+    parser.add_argument("--drop", action="store_true", help="Drop all tables first (deletes all data!)")
+    args = parser.parse_args()
+
+    summary = generate(
+        args.database_url, args.users, args.measurements, seed=args.seed,
+        workers=args.workers, chunk_size=args.chunk_size, days=args.days,
+        end=args.end, drop=args.drop
+    )
+    print(f"Generated {summary['users']:,} users and {summary['measurements']:,} "
+          f"measurements in {summary['seconds']:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,11 @@ sys.path.append(str(Path(__file__).parent.parent.parent))
 
 from sqlalchemy.exc import IntegrityError
 
+from bmi_app.core.category_index import DEFAULT_CATEGORIES
+from bmi_app.core.config import get_settings
+from bmi_app.crud.analytics import rebuild_histogram
+from bmi_app.crud.stats import rebuild_user_stats
+from bmi_app.crud.trends import rebuild_rollups
 from bmi_app.database import SessionLocal, create_tables, drop_tables, engine
 from bmi_app.models import Category
 
@@ -22,21 +27,7 @@ def init_bmi_categories():
     db = SessionLocal()
     try:
         # Standard BMI categories
-        categories_data = [
-            # {"name": "Underweight", "min_value": 0.0, "max_value": 18.4},
-            # {"name": "Normal weight", "min_value": 18.5, "max_value": 24.9},
-            # {"name": "Overweight", "min_value": 25.0, "max_value": 29.9},
-            # {"name": "Obesity Class 1", "min_value": 30.0, "max_value": 34.9},
-            # {"name": "Obesity Class 2", "min_value": 35.0, "max_value": 39.9},
-            # {"name": "Obesity Class 3", "min_value": 40.0, "max_value": None},
-            #
-            {"name": "Underweight", "min_value": None, "max_value": 18.5},
-            {"name": "Normal", "min_value": 18.5, "max_value": 25},
-            {"name": "Overweight", "min_value": 25, "max_value": 30},
-            {"name": "Obesity I", "min_value": 30, "max_value": 35},
-            {"name": "Obesity II", "min_value": 35, "max_value": 40},
-            {"name": "Obesity III", "min_value": 40, "max_value": None}
-        ]
+        categories_data = DEFAULT_CATEGORIES
 
         for category_data in categories_data:
             # Check if category already exists
@@ -62,14 +53,86 @@ def init_bmi_categories():
         db.close()
 
 
+def rebuild_measurement_stats():
+    """
+    Recompute the per-user measurement statistics from scratch.
+    """
+    db = SessionLocal()
+    try:
+        rebuild_user_stats(db)
+        db.commit()
+        print("Measurement statistics rebuilt successfully!")
+    except Exception as e:
+        print(f"Error rebuilding measurement statistics: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+def rebuild_measurement_rollups():
+    """
+    Recompute the trend rollups from scratch (after enabling them).
+    """
+    db = SessionLocal()
+    try:
+        rebuild_rollups(db)
+        db.commit()
+        print("Measurement rollups rebuilt successfully!")
+    except Exception as e:
+        print(f"Error rebuilding measurement rollups: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+def rebuild_bmi_histogram():
+    """
+    Recompute the BMI histograms from scratch (after enabling analytics).
+    """
+    db = SessionLocal()
+    try:
+        rebuild_histogram(db)
+        db.commit()
+        print("BMI histograms rebuilt successfully!")
+    except Exception as e:
+        print(f"Error rebuilding BMI histograms: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+def build_measurement_columns():
+    """
+    Load every measurement into the columnar store and save it to
+    measurement_columns_path.
+    """
+    # Imported on first use: numpy is not needed to initialize the database
+    from bmi_app.core.columnar import MeasurementColumns
+
+    path = get_settings().measurement_columns_path
+    try:
+        with engine.connect() as conn:
+            store = MeasurementColumns.load(conn)
+        store.save(path)
+        print(f"Columnar store of {len(store)} measurements saved to {path}")
+    except Exception as e:
+        print(f"Error building the columnar store: {e}")
+
+
 def create_database():
     """
     Create all database tables.
     """
     try:
         print("Creating database tables...")
-        create_tables()
+        backfilled = create_tables()
         print("Database tables created successfully!")
+        if backfilled:
+            # Rows with no recorded_at were left out of the derived tables
+            print(f"Backfilled recorded_at of {backfilled} measurements, rebuilding derived tables")
+            rebuild_measurement_stats()
+            rebuild_measurement_rollups()
+            rebuild_bmi_histogram()
         return True
     except Exception as e:
         print(f"Error creating database tables: {e}")
@@ -139,11 +202,23 @@ if __name__ == "__main__":
             init_bmi_categories()
         elif command == "tables":
             create_database()
+        elif command == "stats":
+            rebuild_measurement_stats()
+        elif command == "rollups":
+            rebuild_measurement_rollups()
+        elif command == "analytics":
+            rebuild_bmi_histogram()
+        elif command == "columns":
+            build_measurement_columns()
         else:
             print("Available commands:")
             print("  python init_db.py         - Full initialization")
             print("  python init_db.py reset   - Reset database (delete all data)")
             print("  python init_db.py tables  - Create tables only")
             print("  python init_db.py categories - Initialize BMI categories only")
+            print("  python init_db.py stats   - Rebuild per-user measurement statistics")
+            print("  python init_db.py rollups - Rebuild trend rollups")
+            print("  python init_db.py analytics - Rebuild BMI histograms")
+            print("  python init_db.py columns - Save the columnar measurement store")
     else:
         main()
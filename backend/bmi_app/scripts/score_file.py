@@ -0,0 +1,60 @@
+"""
+Script Name : score_file.py
+Description : Score an NDJSON or CSV file of height/weight rows
+Author      : @tonybnya
+"""
+import argparse
+import sys
+from pathlib import Path
+
+# Add the parent directory to sys.path to allow imports
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from bmi_app.core.config import get_settings
+from bmi_app.core.streaming import get_codec, stream_scored
+
+
+def detect_format(path: str) -> str:
+    """
+    Guess the input format from the file extension (NDJSON by default).
+    """
+    return "csv" if path.lower().endswith(".csv") else "ndjson"
+
+
+def main():
+    """
+    Read rows incrementally, write enriched rows as they are scored.
+    """
+    parser = argparse.ArgumentParser(
+        description="Add bmi, bmi_raw and category to every row of a file."
+    )
+    parser.add_argument("input", help="Input file, or '-' for stdin")
+    parser.add_argument(
+        "-o", "--output", default="-", help="Output file, or '-' for stdout"
+    )
+    parser.add_argument(
+        "-f", "--format", choices=["ndjson", "csv"],
+        help="Input/output format (default: from the input extension)"
+    )
+    parser.add_argument(
+        "--chunk-size", type=int, default=get_settings().bmi_stream_chunk_size,
+        help="Rows scored per vectorized batch"
+    )
+    args = parser.parse_args()
+
+    codec = get_codec(args.format or detect_format(args.input))
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8-sig", newline="")
+    target = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8", newline="")
+    try:
+        lines = (line.rstrip("\r\n") for line in source)
+        for block in stream_scored(lines, codec, args.chunk_size):
+            target.write(block)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if target is not sys.stdout:
+            target.close()
+
+
+if __name__ == "__main__":
+    main()
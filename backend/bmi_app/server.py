@@ -0,0 +1,287 @@
+"""
+Script Name : server.py
+Description : Pre-fork multi-process server running uvicorn workers
+Author      : @tonybnya
+
+The supervisor binds the listening socket, then forks `workers` processes
+that each run a uvicorn server on it; the kernel spreads connections over
+them. With `server_reuse_port` every worker binds its own SO_REUSEPORT
+socket instead, which balances accepts more evenly under load (Linux).
+
+With `server_preload` the app is imported once in the supervisor and the
+workers inherit it; otherwise each worker imports it after the fork. The
+database engines are created lazily in each worker (database.py also
+drops inherited connections after a fork), so no connection is shared.
+
+Signals to the supervisor:
+    SIGTERM, SIGINT  stop: workers drain for `server_graceful_timeout`
+    SIGHUP           graceful restart, one worker at a time (picks up new
+                     code unless the app was preloaded)
+    SIGTTIN, SIGTTOU one worker more, one fewer
+
+Metrics and caches are per process: /metrics describes the worker that
+served the scrape.
+"""
+import importlib
+import logging
+import os
+import select
+import signal
+import socket
+import time
+from typing import Optional
+
+from bmi_app.core.config import Settings
+
+logger = logging.getLogger(__name__)
+
+APP = "bmi_app.main:app"
+LOOPS = ("auto", "asyncio", "uvloop")
+HTTP_PROTOCOLS = ("auto", "h11", "httptools")
+# uvicorn's exit status when the app failed to start
+STARTUP_FAILURE = 3
+# Seconds before replacing a worker that could not start
+RESPAWN_DELAY = 1.0
+
+
+def worker_count(config: Settings) -> int:
+    return config.workers if config.workers > 0 else os.cpu_count() or 1
+
+
+def bind_socket(host: str, port: int, backlog: int, reuse_port: bool = False) -> socket.socket:
+    """
+    Listening TCP socket, inheritable by forked workers.
+    """
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def load_app(path: str = APP):
+    module, _, attribute = path.partition(":")
+    return getattr(importlib.import_module(module), attribute)
+
+
+class Supervisor:
+    """
+    Forks, watches and replaces the worker processes.
+    """
+
+    def __init__(self, config: Settings, app: str = APP):
+        if config.server_loop not in LOOPS:
+            raise ValueError(f"Unknown event loop {config.server_loop!r}")
+        if config.server_http not in HTTP_PROTOCOLS:
+            raise ValueError(f"Unknown HTTP implementation {config.server_http!r}")
+        self.config = config
+        self.app = app
+        self.target = worker_count(config)
+        self.workers: dict[int, float] = {}  # pid -> start time
+        # pid -> read end of the pipe the worker writes to once the app loaded
+        self.ready_pipes: dict[int, int] = {}
+        self.stopping: set[int] = set()  # sent SIGTERM, still draining
+        self.socket: Optional[socket.socket] = None
+        self._signals: list[int] = []
+
+    def run(self) -> int:
+        """
+        Serve until stopped; returns the process exit status.
+        """
+        if self.config.server_preload:
+            self.app = load_app(self.app)
+        if not self.config.server_reuse_port:
+            self.socket = bind_socket(
+                self.config.host, self.config.port, self.config.server_backlog
+            )
+
+        for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGTTIN, signal.SIGTTOU):
+            signal.signal(signum, lambda signum, frame: self._signals.append(signum))
+
+        logger.info(
+            "Serving on http://%s:%d with %d workers (preload=%s, reuse_port=%s)",
+            self.config.host, self.config.port, self.target,
+            self.config.server_preload, self.config.server_reuse_port
+        )
+        for _ in range(self.target):
+            self.spawn()
+
+        status = 0
+        respawn_after = 0.0
+        while self.workers:
+            while self._signals:
+                signum = self._signals.pop(0)
+                if signum in (signal.SIGTERM, signal.SIGINT):
+                    self.target = 0
+                    self.stop_all()
+                elif signum == signal.SIGHUP:
+                    self.restart()
+                elif signum == signal.SIGTTIN:
+                    self.target += 1
+                elif signum == signal.SIGTTOU:
+                    self.target = max(1, self.target - 1)
+
+            for pid, exit_status in self.reap():
+                if exit_status == STARTUP_FAILURE and not self.workers:
+                    logger.error("Worker %d failed to start the app, stopping", pid)
+                    self.target = 0
+                    status = STARTUP_FAILURE
+                elif exit_status == STARTUP_FAILURE:
+                    logger.error("Worker %d failed to start the app", pid)
+                    # Others still serve: retry later rather than fork in a loop
+                    respawn_after = time.monotonic() + RESPAWN_DELAY
+                elif exit_status != 0:
+                    logger.warning("Worker %d exited with status %d", pid, exit_status)
+
+            running = [pid for pid in self.workers if pid not in self.stopping]
+            while 0 < self.target and len(running) < self.target and time.monotonic() >= respawn_after:
+                running.append(self.spawn())
+            if self.target:
+                # Oldest first
+                for pid in sorted(running, key=self.workers.get)[:len(running) - self.target]:
+                    self.stop(pid)
+            time.sleep(0.1)
+
+        if self.socket is not None:
+            self.socket.close()
+        return status
+
+    def spawn(self) -> int:
+        ready_read, ready_write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            # In the worker: never return into the supervisor loop
+            status = 1
+            try:
+                os.close(ready_read)
+                for fd in self.ready_pipes.values():
+                    os.close(fd)
+                status = self.serve(ready_write)
+            except BaseException:
+                logger.exception("Worker %d crashed", os.getpid())
+            finally:
+                os._exit(status)
+        os.close(ready_write)
+        self.workers[pid] = time.monotonic()
+        self.ready_pipes[pid] = ready_read
+        logger.info("Started worker %d", pid)
+        return pid
+
+    def wait_ready(self, pid: int, timeout: float) -> bool:
+        """
+        Whether worker `pid` loaded the app within `timeout` seconds.
+        """
+        fd = self.ready_pipes.get(pid)
+        if fd is None:
+            return False
+        readable, _, _ = select.select([fd], [], [], timeout)
+        # A worker dying before it loaded the app closes the pipe empty
+        return bool(readable) and os.read(fd, 1) == b"1"
+
+    def serve(self, ready_fd: int) -> int:
+        """
+        Run one uvicorn server in this (forked) worker process.
+        """
+        import uvicorn
+
+        for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGTTIN, signal.SIGTTOU):
+            signal.signal(signum, signal.SIG_DFL)
+        try:
+            app = load_app(self.app) if isinstance(self.app, str) else self.app
+        except Exception:
+            logger.exception("Worker %d could not load %s", os.getpid(), self.app)
+            return STARTUP_FAILURE
+        os.write(ready_fd, b"1")
+        os.close(ready_fd)
+
+        sock = self.socket or bind_socket(
+            self.config.host, self.config.port, self.config.server_backlog, reuse_port=True
+        )
+        server = uvicorn.Server(uvicorn.Config(
+            app,
+            loop=self.config.server_loop,
+            http=self.config.server_http,
+            lifespan="on",
+            backlog=self.config.server_backlog,
+            timeout_keep_alive=self.config.server_keepalive_timeout,
+            timeout_graceful_shutdown=self.config.server_graceful_timeout,
+        ))
+        # uvicorn handles SIGTERM/SIGINT from here: it stops accepting and
+        # lets in-flight requests finish
+        server.run(sockets=[sock])
+        return 0 if server.started else STARTUP_FAILURE
+
+    def reap(self) -> list[tuple[int, int]]:
+        """
+        Collect exited workers: (pid, exit status) pairs.
+        """
+        exited = []
+        while self.workers:
+            try:
+                pid, wait_status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            if self.workers.pop(pid, None) is not None:
+                os.close(self.ready_pipes.pop(pid))
+                self.stopping.discard(pid)
+                exited.append((pid, os.waitstatus_to_exitcode(wait_status)))
+        return exited
+
+    def stop(self, pid: int, sig: int = signal.SIGTERM) -> None:
+        self.stopping.add(pid)
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            pass
+
+    def stop_all(self) -> None:
+        """
+        Ask every worker to drain and exit; kill the ones still running
+        once the graceful timeout is over.
+        """
+        for pid in list(self.workers):
+            self.stop(pid)
+        deadline = time.monotonic() + self.config.server_graceful_timeout + 5
+        while self.workers and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.1)
+        for pid in list(self.workers):
+            logger.warning("Killing worker %d", pid)
+            self.stop(pid, signal.SIGKILL)
+        while self.workers:
+            self.reap()
+            time.sleep(0.05)
+
+    def restart(self) -> None:
+        """
+        Replace the workers one by one: start the new one, then drain the
+        old one, so the service never runs short of capacity. Stops early,
+        keeping the old workers, if a new one cannot load the app.
+        """
+        logger.info("Restarting %d workers", len(self.workers))
+        for old in list(self.workers):
+            new = self.spawn()
+            if not self.wait_ready(new, self.config.server_graceful_timeout):
+                logger.error("Worker %d did not load the app, restart aborted", new)
+                self.stop(new, signal.SIGKILL)
+                return
+            self.stop(old)
+            deadline = time.monotonic() + self.config.server_graceful_timeout + 5
+            while old in self.workers and time.monotonic() < deadline:
+                self.reap()
+                time.sleep(0.05)
+            if old in self.workers:
+                self.stop(old, signal.SIGKILL)
+
+
+def serve(config: Settings) -> int:
+    """
+    Run the API with `config.workers` processes until stopped.
+    """
+    return Supervisor(config).run()
@@ -0,0 +1,118 @@
+"""
+Script Name : conftest.py
+Description : Shared fixtures (in-memory database, API client)
+Author      : @tonybnya
+"""
+from contextlib import contextmanager
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from bmi_app.core import category_index
+from bmi_app.core.cache import category_cache
+from bmi_app.core.user_index import user_index
+from bmi_app.models import Base, Category, User
+
+
+@pytest.fixture
+def engine():
+    """
+    A fresh in-memory database with the standard categories.
+    """
+    test_engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    Base.metadata.create_all(test_engine)
+    with test_engine.begin() as conn:
+        conn.execute(insert(Category), category_index.DEFAULT_CATEGORIES)
+    yield test_engine
+    test_engine.dispose()
+
+
+@pytest.fixture
+def db(engine, monkeypatch):
+    """
+    Session on the test database; the category index is loaded from it
+    and restored afterwards, the user index is emptied.
+    """
+    monkeypatch.setattr(category_index, "_index", category_index.get_category_index())
+    session = sessionmaker(bind=engine, autoflush=False)()
+    category_index.rebuild_category_index(session)
+    yield session
+    session.close()
+    category_cache.invalidate()
+    user_index.clear()
+
+
+class QueryCounter:
+    """
+    Records the SQL statements an engine executes.
+    """
+
+    def __init__(self):
+        self.statements: list[str] = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    @contextmanager
+    def assert_count(self, expected: int):
+        """
+        Fail unless the block executes exactly `expected` statements.
+        """
+        start = len(self.statements)
+        yield
+        executed = self.statements[start:]
+        assert len(executed) == expected, (
+            f"expected {expected} statements, got {len(executed)}:\n" + "\n---\n".join(executed)
+        )
+
+
+@pytest.fixture
+def queries(engine) -> QueryCounter:
+    """
+    Statement counter on the test database, to catch N+1 queries:
+
+        with queries.assert_count(1):
+            ...
+    """
+    counter = QueryCounter()
+    event.listen(engine, "before_cursor_execute", counter)
+    yield counter
+    event.remove(engine, "before_cursor_execute", counter)
+
+
+@pytest.fixture
+def user(db) -> User:
+    db_user = User(username="alice", email="alice@example.com", password_hash="x")
+    db.add(db_user)
+    db.commit()
+    return db_user
+
+
+@pytest.fixture
+def api(engine, db):
+    """
+    TestClient whose routes use the test database.
+    """
+    from bmi_app.database import get_db, get_db_session
+    from bmi_app.main import app
+
+    test_session = sessionmaker(bind=engine, autoflush=False)
+
+    def override_get_db():
+        session = test_session()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_db_session] = override_get_db
+    yield TestClient(app)
+    app.dependency_overrides.clear()
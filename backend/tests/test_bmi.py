@@ -3,12 +3,25 @@ Script Name : test_categories.py
 Description : Tests for /bmi endpoints
 Author      : @tonybnya
 """
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
 import pytest
 from fastapi.testclient import TestClient
 
+from bmi_app.core import category_index
+from bmi_app.core.cache import LRUCache, bmi_cache
+from bmi_app.core.category_index import (DEFAULT_CATEGORIES, CategoryIndex,
+                                         get_category_index)
+from bmi_app.core.config import get_settings
 from bmi_app.core.utils import (calculate_bmi, categorize, get_formula, to_kg,
                                 to_meters)
+from bmi_app.core.vectorized import categorize_array, score_batch
 from bmi_app.main import app
+from bmi_app.schemas import BMICalculateResponse
 
 client = TestClient(app)
 
@@ -159,3 +172,287 @@ def test_get_formula(
     formula: str
 ) -> None:
     assert get_formula(bmi_raw, height_m, weight_kg) == formula
+
+
+def test_vectorized_matches_scalar() -> None:
+    """
+    The vectorized path must agree with the scalar helpers row by row
+    """
+    heights = [175, 1.62, 70, 150.5, 2.01, 64]
+    height_units = ["cm", "m", "in", "cm", "m", "in"]
+    weights = [70, 48.2, 180, 99.9, 130, 250]
+    weight_units = ["kg", "kg", "lb", "kg", "lb", "lb"]
+
+    scored = score_batch(heights, height_units, weights, weight_units)
+
+    assert scored.errors == []
+    for i, index in enumerate(scored.indices.tolist()):
+        height_m = to_meters(heights[index], height_units[index])
+        weight_kg = to_kg(weights[index], weight_units[index])
+        bmi, bmi_raw = calculate_bmi(height_m, weight_kg)
+        assert scored.height_m[i] == height_m
+        assert scored.weight_kg[i] == weight_kg
+        assert scored.bmi[i] == bmi
+        assert scored.bmi_raw[i] == pytest.approx(bmi_raw, rel=1e-15)
+        assert scored.category[i] == categorize(bmi)
+
+
+def test_categorize_array_boundaries() -> None:
+    bmi = np.array([18.4, 18.5, 24.9, 26, 31, 39, 45, 50])
+    assert categorize_array(bmi).tolist() == [
+        "Underweight", "Normal", "Normal", "Overweight",
+        "Obesity I", "Obesity II", "Obesity III", "Obesity III"
+    ]
+
+
+def test_calculate_bmi_batch_endpoint() -> None:
+    """
+    Test /bmi/batch endpoint with mixed units and invalid rows
+    """
+    response = client.post(
+        "/bmi/batch",
+        json={
+            "records": [
+                {"weight": 70, "weight_unit": "kg", "height": 175, "height_unit": "cm"},
+                {"weight": 0, "weight_unit": "kg", "height": 175, "height_unit": "cm"},
+                {"weight": 154, "weight_unit": "lb", "height": 69, "height_unit": "in"},
+                {"weight": 70, "weight_unit": "stone", "height": 1.75},
+            ]
+        }
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total"] == 4
+    assert data["succeeded"] == 2
+    assert data["failed"] == 2
+
+    first, second = data["results"]
+    assert first == {
+        "index": 0,
+        "height": 175,
+        "weight": 70,
+        "bmi": 22.86,
+        "bmi_raw": 22.857142857142858,
+        "category": "Normal",
+    }
+    assert second["index"] == 2
+    assert second["category"] == "Normal"
+
+    assert [error["index"] for error in data["errors"]] == [1, 3]
+    assert len(data["errors"][1]["errors"]) == 2
+
+
+def test_calculate_bmi_batch_endpoint_empty() -> None:
+    response = client.post("/bmi/batch", json={"records": []})
+    assert response.status_code == 422
+
+
+def test_calculate_bmi_batch_endpoint_bad_values(monkeypatch) -> None:
+    """
+    Values of the wrong type fail their row only; the record limit is
+    checked before the rows are read
+    """
+    response = client.post("/bmi/batch", json={"records": [
+        {"weight": "abc", "weight_unit": "kg", "height": 175, "height_unit": "cm"},
+        {"weight": "70", "weight_unit": "kg", "height": 175, "height_unit": ["cm"]},
+        "not a record",
+        {"weight": 70, "weight_unit": "kg", "height": 175, "height_unit": "cm"},
+    ]})
+    assert response.status_code == 200
+    data = response.json()
+    assert (data["succeeded"], data["failed"]) == (1, 3)
+    assert data["results"][0]["index"] == 3
+    assert data["errors"][0]["errors"] == ["weight must be a finite number greater than 0"]
+    assert data["errors"][1]["errors"] == ["height_unit must be one of ['cm', 'in', 'm']"]
+    assert len(data["errors"][2]["errors"]) == 4
+
+    monkeypatch.setattr(get_settings(), "bmi_batch_max_records", 2)
+    assert client.post("/bmi/batch", json={"records": [{}] * 3}).status_code == 413
+
+
+def test_calculate_bmi_stream_endpoint_ndjson() -> None:
+    """
+    Test /bmi/stream endpoint with an NDJSON body
+    """
+    body = "\n".join([
+        json.dumps({"id": 1, "weight": 70, "weight_unit": "kg", "height": 175, "height_unit": "cm"}),
+        json.dumps({"id": 2, "weight": 70, "weight_unit": "kg", "height": -1, "height_unit": "cm"}),
+        "",
+        "not json",
+    ])
+    response = client.post(
+        "/bmi/stream",
+        content=body,
+        headers={"Content-Type": "application/x-ndjson"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert len(rows) == 3
+    assert rows[0]["id"] == 1
+    assert rows[0]["bmi"] == 22.86
+    assert rows[0]["bmi_raw"] == 22.857142857142858
+    assert rows[0]["category"] == "Normal"
+    assert rows[0]["errors"] == []
+    assert rows[1]["bmi"] is None
+    assert rows[1]["errors"] == ["height must be a finite number greater than 0"]
+    assert rows[2]["errors"][0] == "line is not valid JSON"
+
+
+def test_calculate_bmi_stream_endpoint_csv() -> None:
+    """
+    Test /bmi/stream endpoint with a CSV body
+    """
+    body = "height,height_unit,weight,weight_unit\r\n175,cm,70,kg\r\n69,in,154,lb\r\n"
+    response = client.post(
+        "/bmi/stream",
+        content=body,
+        headers={"Content-Type": "text/csv"}
+    )
+    assert response.status_code == 200
+    assert response.text.splitlines() == [
+        "height,height_unit,weight,weight_unit,bmi,bmi_raw,category,errors",
+        "175,cm,70,kg,22.86,22.857142857142858,Normal,",
+        "69,in,154,lb,22.74,22.741591107840904,Normal,",
+    ]
+
+
+def test_category_index_lookup() -> None:
+    """
+    The index follows the given rows, whatever order they come in
+    """
+    index = CategoryIndex([
+        {"id": 3, "name": "High", "min_value": 30, "max_value": None},
+        {"id": 1, "name": "Low", "min_value": None, "max_value": 20},
+        {"id": 2, "name": "Mid", "min_value": 20, "max_value": 30},
+    ])
+    assert index.loaded
+    assert [index.name_for(bmi) for bmi in (5, 19.99, 20, 29.9, 30, 80)] == [
+        "Low", "Low", "Mid", "Mid", "High", "High"
+    ]
+    assert index.id_for(25) == 2
+
+    bmi = np.array([5, 19.99, 20, 29.9, 30, 80])
+    assert index.names_for(bmi).tolist() == ["Low", "Low", "Mid", "Mid", "High", "High"]
+    assert index.ids_for(bmi).tolist() == [1, 1, 2, 2, 3, 3]
+
+
+def test_category_index_gaps() -> None:
+    """
+    A BMI outside every category's [min_value, max_value) has none
+    """
+    index = CategoryIndex([
+        {"id": 1, "name": "Low", "min_value": 10, "max_value": 20},
+        {"id": 2, "name": "High", "min_value": 25, "max_value": 30},
+    ])
+    values = [5, 10, 19.99, 20, 24.9, 25, 29.99, 30]
+    expected = [None, "Low", "Low", None, None, "High", "High", None]
+    assert [index.name_for(bmi) for bmi in values] == expected
+    assert index.id_for(22) is None
+    assert index.names_for(np.array(values)).tolist() == expected
+    assert index.ids_for(np.array(values)).tolist() == [-1, 1, 1, -1, -1, 2, 2, -1]
+
+
+def test_default_category_index_matches_seed() -> None:
+    index = get_category_index()
+    assert list(index.names) == [row["name"] for row in DEFAULT_CATEGORIES]
+
+
+def test_lru_cache_eviction() -> None:
+    cache = LRUCache(capacity=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)  # evicts "b", the least recently used
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    assert cache.stats() == {
+        "size": 2, "capacity": 2, "hits": 2, "misses": 1, "evictions": 1
+    }
+
+    disabled = LRUCache(capacity=0)
+    disabled.set("a", 1)
+    assert disabled.get("a") is None
+
+
+def test_calculate_bmi_endpoint_cache(monkeypatch) -> None:
+    """
+    Cached /bmi responses are byte-identical to freshly built ones
+    """
+    monkeypatch.setattr(bmi_cache, "_entries", type(bmi_cache._entries)())
+    requests = [
+        {"weight": 70, "weight_unit": "kg", "height": 175, "height_unit": "cm"},
+        {"weight": 70.0, "weight_unit": "kg", "height": 1.75, "height_unit": "m"},
+        {"weight": 70, "weight_unit": "kg", "height": 175, "height_unit": "cm"},
+    ]
+    hits = bmi_cache.hits
+    for payload in requests:
+        response = client.post("/bmi/", json=payload)
+        assert response.status_code == 200
+        data = response.json()
+        expected = BMICalculateResponse(
+            height=payload["height"], weight=payload["weight"], bmi=22.86,
+            bmi_raw=22.857142857142858, category="Normal",
+            formula="70.0 kg / (1.75 m) ^ 2 = 22.857142857142858"
+        )
+        assert response.content == expected.model_dump_json().encode()
+        assert data["height"] == payload["height"]
+    # 175 cm and 1.75 m share the normalized key
+    assert bmi_cache.hits - hits == 2
+    assert len(bmi_cache) == 1
+
+    # New category boundaries make older entries unreachable
+    monkeypatch.setattr(category_index, "_index", CategoryIndex([
+        {"id": 1, "name": "Any", "min_value": None, "max_value": None},
+    ], version=get_category_index().version + 1))
+    assert client.post("/bmi/", json=requests[0]).json()["category"] == "Any"
+
+
+def test_fast_json_mode_matches_default(monkeypatch) -> None:
+    """
+    orjson-encoded responses carry the same data and keep the schema
+    """
+    pytest.importorskip("orjson")
+    requests = [
+        ("/bmi/", {"weight": 81, "weight_unit": "kg", "height": 1.8, "height_unit": "m"}),
+        ("/bmi/batch", {"records": [
+            {"weight": 154, "weight_unit": "lb", "height": 69, "height_unit": "in"},
+            {"weight": 0, "weight_unit": "kg", "height": 175, "height_unit": "cm"},
+        ]}),
+    ]
+    responses = {}
+    for fast in (False, True):
+        monkeypatch.setattr(get_settings(), "fast_json", fast)
+        bmi_cache.clear()
+        for path, payload in requests:
+            response = client.post(path, json=payload)
+            assert response.status_code == 200
+            assert response.headers["content-type"] == "application/json"
+            responses.setdefault(path, []).append(response.json())
+
+    for default, fast in responses.values():
+        assert fast == default
+
+    # Routes return prebuilt responses but still document their models
+    schema = app.openapi()["paths"]["/bmi/"]["post"]["responses"]["200"]
+    assert schema["content"]["application/json"]["schema"]["$ref"].endswith(
+        "/BMICalculateResponse"
+    )
+
+
+def test_app_import_is_lazy():
+    """
+    Importing the app loads neither numpy, the CRUD modules nor an engine
+    """
+    code = (
+        "import sys, bmi_app.main, bmi_app.database as database; "
+        "print(sorted(name for name in sys.modules "
+        "if name == 'numpy' or name.startswith('bmi_app.crud.')), "
+        "'engine' in vars(database))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=Path(__file__).parent.parent,
+        capture_output=True, text=True, check=True
+    )
+    assert result.stdout.split() == ["[]", "False"]
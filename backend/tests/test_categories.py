@@ -3,9 +3,20 @@ Script Name : test_categories.py
 Description : Tests for BMI category endpoints
 Author      : @tonybnya
 """
+import asyncio
+
 from fastapi.testclient import TestClient
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker
 
+from bmi_app.core import category_index
+from bmi_app.core.cache import CachedJSON, TTLCache
+from bmi_app.core.config import Settings
+from bmi_app.crud import async_categories
+from bmi_app.crud.categories import get_categories
+from bmi_app.database import build_async_engine
 from bmi_app.main import app
+from bmi_app.models import Base, Category
 
 client = TestClient(app)
 
@@ -51,3 +62,104 @@ def test_category_not_found():
     data = response.json()
     assert "detail" in data
     assert "not found" in data["detail"]
+
+
+def test_ttl_cache_expiry_and_invalidation():
+    """
+    Entries expire after the TTL and on explicit invalidation
+    """
+    now = [0.0]
+    cache = TTLCache(ttl=10, clock=lambda: now[0])
+    calls = []
+
+    def load():
+        calls.append(1)
+        return len(calls)
+
+    assert cache.get_or_set("key", load) == 1
+    assert cache.get_or_set("key", load) == 1
+    now[0] = 11
+    assert cache.get_or_set("key", load) == 2
+    cache.invalidate()
+    assert cache.get_or_set("key", load) == 3
+    assert (cache.hits, cache.misses) == (1, 3)
+
+
+def test_ttl_cache_drops_value_loaded_across_invalidation():
+    cache = TTLCache(ttl=10)
+
+    def load():
+        cache.invalidate()
+        return "stale"
+
+    assert cache.get_or_set("key", load) == "stale"
+    assert cache.get("key") is None
+
+
+def test_cached_json_etag():
+    """
+    A matching If-None-Match gets a bodiless 304
+    """
+    cached = CachedJSON(b'{"categories": []}')
+    response = cached.to_response()
+    assert response.status_code == 200
+    assert response.body == b'{"categories": []}'
+    assert response.headers["etag"] == cached.etag
+
+    assert cached.to_response(cached.etag).status_code == 304
+    assert cached.to_response(f'"other", W/{cached.etag}').status_code == 304
+    assert cached.to_response('"other"').status_code == 200
+
+
+def test_async_category_crud(monkeypatch):
+    """
+    Async reads see rows written through the run_sync() write path
+    """
+    # Writes rebuild the global category index: restore it afterwards
+    monkeypatch.setattr(category_index, "_index", category_index.get_category_index())
+
+    async def scenario():
+        engine = build_async_engine(Settings(database_url="sqlite://"))
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+        async with async_sessionmaker(engine, expire_on_commit=False)() as db:
+            created = await async_categories.create_category(
+                db, {"name": "Normal", "min_value": 18.5, "max_value": 25}
+            )
+            found = await async_categories.get_category_by_id(db, created.id)
+            all_categories = await async_categories.get_categories(db)
+            deleted = await async_categories.delete_category(db, created.id)
+            missing = await async_categories.get_category_by_name(db, "Normal")
+        await engine.dispose()
+        return found, all_categories, deleted, missing
+
+    found, all_categories, deleted, missing = asyncio.run(scenario())
+    assert found.name == "Normal"
+    assert [category.name for category in all_categories] == ["Normal"]
+    assert deleted is True
+    assert missing is None
+
+
+def test_sync_and_async_category_order():
+    """
+    Both read paths list categories in the same order, ties included
+    """
+    async def scenario():
+        engine = build_async_engine(Settings(database_url="sqlite://"))
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.execute(insert(Category), [
+                {"name": "B", "min_value": 25, "max_value": None},
+                {"name": "A", "min_value": None, "max_value": 18.5},
+                {"name": "C", "min_value": 18.5, "max_value": 25},
+                {"name": "D", "min_value": 18.5, "max_value": 25},
+            ])
+        async with async_sessionmaker(engine)() as db:
+            async_names = [category.name for category in await async_categories.get_categories(db)]
+            sync_names = await db.run_sync(lambda session: [category.name for category in get_categories(session)])
+        await engine.dispose()
+        return async_names, sync_names
+
+    async_names, sync_names = asyncio.run(scenario())
+    assert async_names == sync_names == ["A", "C", "D", "B"]
@@ -0,0 +1,109 @@
+"""
+Script Name : test_columnar.py
+Description : Tests for the columnar measurement store
+Author      : @tonybnya
+"""
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pytest
+from sqlalchemy import func, select
+
+from bmi_app.core.columnar import MeasurementColumns
+from bmi_app.crud.measurements import create_measurement
+from bmi_app.models import HeightUnit, Measurement, User, WeightUnit
+
+
+def _seed(db, users, count):
+    for i in range(count):
+        bmi = 17.0 + (i * 7.3) % 25
+        create_measurement(db, {
+            "user_id": users[i % len(users)].id, "category_id": 1 + i % 6,
+            "height": 1.7, "height_unit": HeightUnit.M,
+            "weight": bmi * 1.7 ** 2, "weight_unit": WeightUnit.KG,
+            "height_m": 1.7, "weight_kg": bmi * 1.7 ** 2, "bmi": bmi,
+            "recorded_at": datetime(2024, 1, 1) + timedelta(hours=13 * i),
+        })
+
+
+@pytest.fixture
+def users(db, user):
+    others = [User(username=f"u{i}", email=f"u{i}@example.com", password_hash="x") for i in range(2)]
+    db.add_all(others)
+    db.commit()
+    return [user] + others
+
+
+def test_columnar_store_matches_sql(engine, db, users):
+    """
+    Filters and aggregates over the arrays agree with the same SQL
+    """
+    _seed(db, users, 60)
+    with engine.connect() as conn:
+        store = MeasurementColumns.load(conn, batch_size=16)
+    assert len(store) == 60 and store.nbytes == 60 * 46
+    assert store.column("user").dtype == np.int32 and len(store.user_ids) == 3
+
+    user_id = users[1].id
+    start, end = date(2024, 1, 5), date(2024, 1, 20)
+    stats = store.aggregate(user_id=user_id, start=start, end=end, min_bmi=20)
+    count, total, low, high = db.execute(
+        select(func.count(), func.sum(Measurement.bmi), func.min(Measurement.bmi), func.max(Measurement.bmi))
+        .where(
+            Measurement.user_id == user_id,
+            Measurement.recorded_at >= datetime(2024, 1, 5),
+            Measurement.recorded_at < datetime(2024, 1, 21),
+            Measurement.bmi >= 20
+        )
+    ).one()
+    assert stats["count"] == count > 0
+    assert (stats["sum"], stats["min"], stats["max"]) == pytest.approx((total, low, high))
+
+    by_category = store.aggregate(by="category_id")
+    expected = dict(db.execute(
+        select(Measurement.category_id, func.avg(Measurement.bmi)).group_by(Measurement.category_id)
+    ).all())
+    assert {key: group["mean"] for key, group in by_category.items()} == pytest.approx(expected)
+    assert sum(group["count"] for group in store.aggregate(by="user_id").values()) == 60
+
+    assert store.aggregate(user_id="nobody")["count"] == 0
+    assert store.percentiles([50], category_id=3) == [
+        pytest.approx(np.median([row.bmi for row in db.query(Measurement).filter_by(category_id=3)]))
+    ]
+    with pytest.raises(ValueError):
+        store.aggregate(by="height_m")
+
+
+def test_columnar_store_append_and_persist(engine, db, users, tmp_path):
+    """
+    Refresh picks up new rows; a saved store maps back identical
+    """
+    _seed(db, users, 10)
+    with engine.connect() as conn:
+        store = MeasurementColumns.load(conn)
+        _seed(db, users, 5)
+        assert store.refresh(conn) == 5
+        assert store.refresh(conn) == 0
+    assert store.column("id").tolist() == db.scalars(select(Measurement.id).order_by(Measurement.id)).all()
+
+    store.append([1000], ["someone-else"], [None], [1.8], [81.0], [25.0], [3])
+    assert store.recorded_at_array()[-1] != store.recorded_at_array()[-1]  # NaT
+    assert store.aggregate(start=date(2000, 1, 1))["count"] == 15
+    assert store.last_id == 1000
+
+    store.save(tmp_path / "columns")
+    mapped = MeasurementColumns.open(tmp_path / "columns")
+    assert isinstance(mapped.column("bmi"), np.memmap)
+    assert mapped.user_ids == store.user_ids and mapped.last_id == 1000
+    for name in ("id", "user", "recorded_at", "bmi", "category_id"):
+        assert np.array_equal(mapped.column(name), store.column(name))
+    assert mapped.aggregate(by="user_id") == store.aggregate(by="user_id")
+
+    mapped.append([1001], [users[0].id], [datetime(2025, 1, 1)], [1.8], [81.0], [25.0], [3])
+    assert len(mapped) == 17 and mapped.user_ids == store.user_ids
+    assert mapped.aggregate(user_id=users[0].id, start=date(2025, 1, 1))["count"] == 1
+
+    # Saving again switches to a new data directory and removes the old one
+    mapped.save(tmp_path / "columns")
+    assert len(list((tmp_path / "columns").glob("data-*"))) == 1
+    assert len(MeasurementColumns.open(tmp_path / "columns", mmap=False)) == 17
@@ -3,3 +3,619 @@ Script Name : test_measurements.py
 Description : Tests for BMI measurement endpoints
 Author      : @tonybnya
 """
+import math
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import DateTime, literal, select, text
+from sqlalchemy.exc import IntegrityError
+
+from bmi_app.crud.measurements import (MeasurementRow,
+                                       bulk_create_measurements,
+                                       create_measurement, delete_measurement,
+                                       delete_measurement_returning,
+                                       delete_measurements,
+                                       get_latest_measurement_by_user,
+                                       get_measurement_by_id, get_measurements,
+                                       get_measurements_by_user,
+                                       get_measurements_by_user_page,
+                                       get_user_measurement_stats,
+                                       update_measurement,
+                                       update_measurement_returning,
+                                       update_measurements)
+from bmi_app.core.config import get_settings
+from bmi_app.crud.analytics import (get_bmi_histogram, get_bmi_percentiles,
+                                    rebuild_histogram)
+from bmi_app.crud.stats import rebuild_user_stats
+from bmi_app.crud.trends import (PERIODS, bucket_bounds, bucket_expression,
+                                 get_bmi_trend, rebuild_rollups)
+from bmi_app.database import migrate_tables
+from bmi_app.models import (BMIHistogramBin, HeightUnit, Measurement,
+                            MeasurementRollup, User, UserCategoryCount,
+                            UserMeasurementStats, WeightUnit)
+
+
+def test_bulk_create_measurements(db, user):
+    """
+    Valid rows are inserted with derived values, invalid ones reported
+    """
+    result = bulk_create_measurements(
+        db,
+        [
+            {"user_id": user.id, "height": 175, "height_unit": "cm",
+             "weight": 70, "weight_unit": "kg"},
+            {"user_id": user.id, "height": 69, "height_unit": "in",
+             "weight": 220, "weight_unit": "lb",
+             "recorded_at": datetime(2024, 1, 1), "notes": "clinic"},
+            {"user_id": user.id, "height": 0, "height_unit": "cm",
+             "weight": 70, "weight_unit": "kg"},
+            {"user_id": "nobody", "height": 175, "height_unit": "cm",
+             "weight": 70, "weight_unit": "kg"},
+        ],
+        chunk_size=1
+    )
+
+    assert result["accepted"] == 2
+    assert result["rejected"] == 2
+    assert [error["index"] for error in result["errors"]] == [2, 3]
+    assert result["errors"][1]["errors"] == ["user nobody does not exist"]
+    assert [chunk["rows"] for chunk in result["chunks"]] == [1, 1]
+
+    first, second = db.query(Measurement).order_by(Measurement.id).all()
+    assert first.height_unit == HeightUnit.CM
+    assert first.height_m == 1.75
+    assert first.bmi == 22.86
+    assert first.category.name == "Normal"
+    assert second.category.name == "Obesity I"
+    assert second.recorded_at == datetime(2024, 1, 1)
+    assert second.notes == "clinic"
+
+
+def test_bulk_create_measurements_endpoint(api, user):
+    """
+    Test /measurements/bulk endpoint
+    """
+    response = api.post(
+        "/measurements/bulk",
+        json={
+            "measurements": [
+                {"user_id": user.id, "height": 1.8, "height_unit": "m",
+                 "weight": 81, "weight_unit": "kg"},
+                {"user_id": user.id, "height": 1.8, "height_unit": "yd",
+                 "weight": 81, "weight_unit": "kg"},
+            ]
+        }
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["accepted"] == 1
+    assert data["rejected"] == 1
+    assert data["errors"][0]["index"] == 1
+    assert sum(chunk["rows"] for chunk in data["chunks"]) == 1
+
+
+def _seed_history(db, user, count: int) -> None:
+    bulk_create_measurements(db, [
+        {"user_id": user.id, "height": 170, "height_unit": "cm",
+         "weight": 60 + i % 40, "weight_unit": "kg",
+         # Pairs of identical timestamps exercise the id tie-breaker
+         "recorded_at": datetime(2024, 1, 1 + i // 2)}
+        for i in range(count)
+    ])
+
+
+def test_keyset_pagination_matches_offset(db, user):
+    """
+    Walking the cursor pages yields the same rows as OFFSET paging
+    """
+    _seed_history(db, user, 25)
+
+    pages = []
+    cursor = None
+    while True:
+        items, cursor = get_measurements_by_user_page(db, user.id, limit=10, cursor=cursor)
+        pages.append([measurement.id for measurement in items])
+        if cursor is None:
+            break
+
+    assert [len(page) for page in pages] == [10, 10, 5]
+    offset_ids = [
+        measurement.id
+        for skip in (0, 10, 20)
+        for measurement in get_measurements_by_user(db, user.id, limit=10, skip=skip)
+    ]
+    assert sum(pages, []) == offset_ids
+    assert len(set(offset_ids)) == 25
+
+
+def test_keyset_pagination_uses_index(db):
+    plan = db.execute(text(
+        "EXPLAIN QUERY PLAN SELECT id FROM measurements WHERE user_id = 'u' "
+        "AND (recorded_at, id) < ('2024-01-01', 5) "
+        "ORDER BY recorded_at DESC, id DESC LIMIT 10"
+    )).all()
+    details = " ".join(row[-1] for row in plan)
+    assert "ix_measurements_user_recorded" in details
+    assert "TEMP B-TREE" not in details
+
+
+def test_migrate_nullable_recorded_at(engine, db, user):
+    """
+    A measurements table from before recorded_at was NOT NULL is rebuilt;
+    its NULL rows sort oldest and stay reachable through the cursor
+    """
+    _seed_history(db, user, 3)
+    with engine.begin() as conn:
+        ddl = conn.exec_driver_sql("SELECT sql FROM sqlite_master WHERE name = 'measurements'").scalar()
+        conn.exec_driver_sql("ALTER TABLE measurements RENAME TO measurements_new")
+        for index in Measurement.__table__.indexes:
+            conn.exec_driver_sql(f"DROP INDEX {index.name}")
+        conn.exec_driver_sql(ddl.replace("recorded_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL", "recorded_at DATETIME"))
+        conn.exec_driver_sql("INSERT INTO measurements SELECT * FROM measurements_new")
+        conn.exec_driver_sql("DROP TABLE measurements_new")
+        conn.exec_driver_sql("UPDATE measurements SET recorded_at = NULL WHERE id = 2")
+
+    assert migrate_tables(engine) == 1
+    assert migrate_tables(engine) == 0
+    with engine.connect() as conn:
+        columns = {row[1]: row[3] for row in conn.exec_driver_sql("PRAGMA table_info(measurements)")}
+        indexes = {row[1] for row in conn.exec_driver_sql("PRAGMA index_list(measurements)")}
+    assert columns["recorded_at"] == 1
+    assert {index.name for index in Measurement.__table__.indexes} <= indexes
+
+    db.expire_all()
+    items, cursor = get_measurements_by_user_page(db, user.id, limit=2)
+    rest, _ = get_measurements_by_user_page(db, user.id, limit=2, cursor=cursor)
+    assert [m.id for m in items + rest] == [3, 1, 2]
+    assert rest[-1].recorded_at == datetime(1970, 1, 1)
+
+
+def test_read_user_measurements_endpoint(api, db, user):
+    """
+    Test /measurements/users/{user_id} cursor pagination
+    """
+    _seed_history(db, user, 3)
+
+    first = api.get(f"/measurements/users/{user.id}", params={"limit": 2}).json()
+    assert len(first["items"]) == 2
+    assert first["items"][0]["height_unit"] == "cm"
+    second = api.get(
+        f"/measurements/users/{user.id}",
+        params={"limit": 2, "cursor": first["next_cursor"]}
+    ).json()
+    assert len(second["items"]) == 1
+    assert second["next_cursor"] is None
+
+    response = api.get(f"/measurements/users/{user.id}", params={"cursor": "garbage"})
+    assert response.status_code == 400
+
+
+def _measurement(user, bmi, category_id, recorded_at):
+    return {
+        "user_id": user.id, "category_id": category_id,
+        "height": 1.0, "height_unit": HeightUnit.M,
+        "weight": bmi, "weight_unit": WeightUnit.KG,
+        "height_m": 1.0, "weight_kg": bmi, "bmi": bmi,
+        "recorded_at": recorded_at,
+    }
+
+
+def test_user_measurement_stats_incremental(db, user):
+    """
+    Stats kept up to date on every write match a rebuild from scratch
+    """
+    assert get_user_measurement_stats(db, user.id) is None
+    assert get_latest_measurement_by_user(db, user.id) is None
+
+    low = create_measurement(db, _measurement(user, 18.0, 1, datetime(2024, 1, 1)))
+    mid = create_measurement(db, _measurement(user, 22.0, 2, datetime(2024, 1, 3)))
+    high = create_measurement(db, _measurement(user, 31.0, 4, datetime(2024, 1, 2)))
+    bulk_create_measurements(db, [
+        {"user_id": user.id, "height": 1.8, "height_unit": "m",
+         "weight": 81, "weight_unit": "kg", "recorded_at": datetime(2023, 6, 1)},
+    ])
+
+    stats = get_user_measurement_stats(db, user.id)
+    assert stats["count"] == 4
+    assert stats["mean_bmi"] == (18.0 + 22.0 + 31.0 + 25.0) / 4
+    assert (stats["min_bmi"], stats["max_bmi"]) == (18.0, 31.0)
+    assert stats["latest_measurement_id"] == mid.id
+    assert stats["category_counts"] == {1: 1, 2: 1, 3: 1, 4: 1}
+
+    update_measurement(db, mid.id, {"recorded_at": datetime(2023, 1, 1)})
+    assert get_latest_measurement_by_user(db, user.id).id == high.id
+    update_measurement(db, low.id, {"bmi": 20.0, "category_id": 2})
+    delete_measurement(db, high.id)
+
+    stats = get_user_measurement_stats(db, user.id)
+    assert stats["count"] == 3
+    assert (stats["min_bmi"], stats["max_bmi"]) == (20.0, 25.0)
+    assert stats["latest_measurement_id"] == low.id
+    assert stats["category_counts"] == {2: 2, 3: 1}
+
+    rebuild_user_stats(db)
+    assert get_user_measurement_stats(db, user.id) == stats
+
+
+def test_user_measurement_stats_endpoints(api, db, user):
+    """
+    Test /measurements/users/{user_id}/stats and /latest
+    """
+    assert api.get(f"/measurements/users/{user.id}/stats").status_code == 404
+    assert api.get(f"/measurements/users/{user.id}/latest").status_code == 404
+
+    _seed_history(db, user, 4)
+
+    stats = api.get(f"/measurements/users/{user.id}/stats").json()
+    assert stats["count"] == 4
+    latest = api.get(f"/measurements/users/{user.id}/latest").json()
+    assert latest["id"] == stats["latest_measurement_id"]
+    assert latest["recorded_at"] == "2024-01-02T00:00:00"
+
+
+def test_returning_writes_keep_derived_tables(queries, db, user, monkeypatch):
+    """
+    UPDATE/DELETE ... RETURNING writes, single and bulk, leave the same
+    derived tables as a rebuild, in fewer statements
+    """
+    monkeypatch.setattr(get_settings(), "measurement_rollups", True)
+    monkeypatch.setattr(get_settings(), "measurement_analytics", True)
+    created = [
+        create_measurement(db, _measurement(user, 18.0 + i, 1 + i % 4, datetime(2024, 1, 1 + i)))
+        for i in range(12)
+    ]
+    ids = [measurement.id for measurement in created]
+
+    with queries.assert_count(1):
+        row = update_measurement_returning(db, ids[0], {"notes": "fasting"})
+    assert (row.id, row.notes, row.bmi) == (ids[0], "fasting", 18.0)
+    assert queries.statements[-1].startswith("UPDATE")
+    assert update_measurement_returning(db, 10 ** 6, {"notes": "x"}) is None
+
+    start = len(queries.statements)
+    assert delete_measurement_returning(db, ids[1])
+    assert queries.statements[start].startswith("DELETE")
+    assert not delete_measurement_returning(db, ids[1])
+
+    update_measurement_returning(db, ids[2], {"bmi": 33.0, "category_id": 4})
+    rows = update_measurements(db, ids[3:8], {"recorded_at": datetime(2023, 7, 1)})
+    assert sorted(row.id for row in rows) == ids[3:8]
+    # DELETE, then one executemany each for stats, category counts, rollups, histogram
+    with queries.assert_count(5):
+        assert sorted(delete_measurements(db, ids[8:11] + [10 ** 6])) == ids[8:11]
+    # recorded_at is NOT NULL: left out it defaults to now, cleared it fails
+    assert create_measurement(db, _measurement(user, 25.0, 2, None)).recorded_at is not None
+    with pytest.raises(IntegrityError):
+        update_measurements(db, ids[3:5], {"recorded_at": None})
+    db.expire_all()
+    assert db.get(Measurement, ids[8]) is None
+    assert db.get(Measurement, ids[2]).bmi == 33.0
+
+    def tables():
+        return [
+            sorted(tuple(getattr(row, column.key) for column in model.__table__.c)
+                   for row in db.query(model) if getattr(row, "count", 1) > 0)
+            for model in (UserMeasurementStats, UserCategoryCount, MeasurementRollup, BMIHistogramBin)
+        ]
+
+    maintained = tables()
+    assert get_user_measurement_stats(db, user.id)["count"] == 9
+    rebuild_user_stats(db)
+    rebuild_rollups(db)
+    rebuild_histogram(db)
+    assert tables() == maintained
+
+
+def test_load_strategies(queries, db, user):
+    """
+    Eager and column-only loads read a page and its users and categories
+    in a fixed number of queries; lazy loads issue one per object
+    """
+    other = User(username="bob", email="bob@example.com", password_hash="x")
+    db.add(other)
+    db.commit()
+    user_id = user.id
+    for i in range(8):
+        create_measurement(db, _measurement(user if i % 2 else other, 18.0 + 3 * i, 1 + i % 4, datetime(2024, 1, 1 + i)))
+
+    def page(load):
+        db.expunge_all()
+        items = get_measurements(db, limit=8, load=load)
+        return [(item.id, item.user.username, item.category.name) for item in items]
+
+    with queries.assert_count(7):  # the page, 2 users, 4 categories
+        expected = page("lazy")
+    with queries.assert_count(3):
+        assert page("selectin") == expected
+    with queries.assert_count(1):
+        assert page("joined") == expected
+    with queries.assert_count(1):
+        rows = get_measurements(db, limit=8, load="rows")
+    assert all(isinstance(row, MeasurementRow) for row in rows)
+    assert [(row.id, row.category) for row in rows] == [(item[0], item[2]) for item in expected]
+    assert get_measurement_by_id(db, rows[0].id, load="rows") == rows[0]
+
+    items, cursor = get_measurements_by_user_page(db, user_id, limit=2, load="rows")
+    more, _ = get_measurements_by_user_page(db, user_id, limit=2, cursor=cursor, load="rows")
+    assert [row.bmi for row in items + more] == [39.0, 33.0, 27.0, 21.0]
+    with pytest.raises(ValueError):
+        get_measurements(db, load="eager")
+
+
+def test_list_endpoints_query_count(api, queries, db, user):
+    """
+    A page costs the same number of queries whatever its size (no N+1)
+    """
+    for i in range(30):
+        create_measurement(db, _measurement(user, 18.0 + i, 1 + i % 4, datetime(2024, 1, 1) + timedelta(days=i)))
+    for path in ("/measurements/", f"/measurements/users/{user.id}"):
+        with queries.assert_count(1):
+            response = api.get(path, params={"limit": 5})
+        with queries.assert_count(1):
+            assert len(api.get(path, params={"limit": 25}).json()["items"]) == 25
+        item = response.json()["items"][0]
+        assert (item["bmi"], item["height_unit"], item["recorded_at"]) == (47.0, "m", "2024-01-30T00:00:00")
+
+
+@pytest.mark.parametrize("period", PERIODS)
+def test_bucket_bounds_match_sql(db, period):
+    for moment in [datetime(2024, 1, 1), datetime(2024, 2, 29, 23, 59),
+                   datetime(2024, 3, 3, 12), datetime(2024, 12, 31, 8)]:
+        start, end = bucket_bounds(period, moment)
+        assert start <= moment < end
+        sql = db.scalar(select(bucket_expression(period, literal(moment, DateTime))))
+        assert sql == start.date()
+
+
+def _trends(db, user_id=None):
+    return [
+        [{**bucket, "avg_bmi": round(bucket["avg_bmi"], 9)}
+         for bucket in get_bmi_trend(db, period, user_id=user_id, use_rollups=use_rollups)]
+        for period in PERIODS
+        for use_rollups in (False, True)
+    ]
+
+
+def test_trend_rollups_match_raw(db, user, monkeypatch):
+    """
+    Rollups maintained on write give the same trends as raw aggregation
+    """
+    monkeypatch.setattr(get_settings(), "measurement_rollups", True)
+    first = datetime(2024, 1, 29, 10)
+    created = [
+        create_measurement(db, _measurement(user, 18.0 + day % 9, 1 + day % 4, first + timedelta(days=day)))
+        for day in range(0, 40, 3)
+    ]
+    _seed_history(db, user, 6)
+    update_measurement(db, created[0].id, {"bmi": 30.0, "category_id": 4})
+    update_measurement(db, created[1].id, {"recorded_at": datetime(2023, 12, 31)})
+    delete_measurement(db, created[2].id)
+
+    trends = _trends(db)
+    for raw, rolled in zip(trends[::2], trends[1::2]):
+        assert raw == rolled
+    assert _trends(db, user.id) == trends
+
+    month = get_bmi_trend(db, "month", start=date(2024, 2, 10), end=date(2024, 2, 10))
+    assert [bucket["bucket"] for bucket in month] == [date(2024, 2, 1)]
+    assert month[0]["count"] == sum(month[0]["category_counts"].values())
+
+    def table():
+        return sorted(
+            (row.period, row.user_id, row.bucket, row.category_id,
+             row.count, round(row.bmi_sum, 9), row.bmi_min, row.bmi_max)
+            for row in db.query(MeasurementRollup).filter(MeasurementRollup.count > 0)
+        )
+
+    maintained = table()
+    rebuild_rollups(db)
+    assert table() == maintained
+
+
+def test_user_trends_endpoint(api, db, user):
+    """
+    Test /measurements/users/{user_id}/trends
+    """
+    _seed_history(db, user, 4)
+
+    data = api.get(f"/measurements/users/{user.id}/trends", params={"period": "week"}).json()
+    assert data["period"] == "week"
+    assert data["buckets"][0]["bucket"] == "2024-01-01"
+    assert data["buckets"][0]["count"] == 4
+
+    data = api.get("/measurements/trends", params={"period": "day", "end": "2024-01-01"}).json()
+    assert data["user_id"] is None
+    assert [bucket["count"] for bucket in data["buckets"]] == [2]
+
+    assert api.get("/measurements/trends", params={"period": "year"}).status_code == 422
+
+
+def _seed_population(db, user) -> list[Measurement]:
+    first = datetime(2024, 1, 20, 10)
+    return [
+        create_measurement(db, _measurement(
+            user, round(17.0 + (day * 7.31) % 19, 2), 1 + day % 4, first + timedelta(days=day, hours=day % 13)
+        ))
+        for day in range(0, 75)
+    ]
+
+
+def test_bmi_histogram_matches_raw(db, user, monkeypatch):
+    """
+    Histograms maintained on write give the same counts as a scan, for
+    any date range, and as a rebuild
+    """
+    monkeypatch.setattr(get_settings(), "measurement_analytics", True)
+    created = _seed_population(db, user)
+    _seed_history(db, user, 6)
+    update_measurement(db, created[0].id, {"bmi": 30.05, "category_id": 4})
+    update_measurement(db, created[1].id, {"recorded_at": datetime(2023, 12, 31)})
+    delete_measurement(db, created[2].id)
+
+    ranges = [
+        (None, None), (date(2024, 1, 25), date(2024, 3, 10)), (None, date(2024, 2, 29)),
+        (date(2024, 2, 1), None), (date(2024, 2, 14), date(2024, 2, 14)), (date(2024, 2, 1), date(2024, 3, 31)),
+    ]
+    for start, end in ranges:
+        for category_id in (None, 2):
+            for bin_width in (0.1, 2.5):
+                raw, maintained = (
+                    get_bmi_histogram(db, bin_width, category_id, start, end, use_histogram=use_histogram)
+                    for use_histogram in (False, True)
+                )
+                assert raw == maintained
+    full = get_bmi_histogram(db, 1.0)
+    assert full["count"] == sum(bin_["count"] for bin_ in full["bins"]) == 74 + 6
+
+    with pytest.raises(ValueError):
+        get_bmi_histogram(db, 0.25)
+
+    def table():
+        return sorted(
+            (row.period, row.bucket, row.category_id, row.bin, row.count)
+            for row in db.query(BMIHistogramBin).filter(BMIHistogramBin.count > 0)
+        )
+
+    maintained = table()
+    rebuild_histogram(db)
+    assert table() == maintained
+
+
+def test_bmi_percentiles_error_bound(db, user, monkeypatch):
+    """
+    Percentiles from the histograms are within max_error of the exact ones
+    """
+    monkeypatch.setattr(get_settings(), "measurement_analytics", True)
+    created = _seed_population(db, user)
+    values = sorted(measurement.bmi for measurement in created)
+
+    percentiles = [1, 5, 25, 50, 75, 95, 99, 100]
+    result = get_bmi_percentiles(db, percentiles, use_histogram=True)
+    assert result["count"] == len(values)
+    assert result == get_bmi_percentiles(db, percentiles, use_histogram=False)
+    for item in result["percentiles"]:
+        exact = values[math.ceil(item["percentile"] / 100 * len(values)) - 1]
+        assert abs(item["bmi"] - exact) <= result["max_error"] + 1e-9
+
+    empty = get_bmi_percentiles(db, [50], start=date(2030, 1, 1), use_histogram=True)
+    assert empty["count"] == 0
+    assert empty["percentiles"] == [{"percentile": 50, "bmi": None}]
+    with pytest.raises(ValueError):
+        get_bmi_percentiles(db, [101])
+
+
+def test_bmi_analytics_endpoints(api, db, user):
+    """
+    Test /measurements/percentiles and /measurements/histogram
+    """
+    _seed_history(db, user, 4)
+
+    data = api.get("/measurements/percentiles", params={"p": [0, 50, 100]}).json()
+    assert data["count"] == 4
+    assert [item["percentile"] for item in data["percentiles"]] == [0, 50, 100]
+    assert data["percentiles"][0]["bmi"] <= data["percentiles"][1]["bmi"] <= data["percentiles"][2]["bmi"]
+
+    data = api.get("/measurements/histogram", params={"bin_width": 5, "end": "2024-01-01"}).json()
+    assert data["count"] == 2
+    assert data["bins"] == [{"lower": 20.0, "upper": 25.0, "count": 2}]
+
+    assert api.get("/measurements/histogram", params={"bin_width": 0.25}).status_code == 422
+    assert api.get("/measurements/percentiles", params={"p": 150}).status_code == 422
+
+
+def test_export_record_batches(db, user, tmp_path):
+    """
+    Exports hold the same values as the ORM, in bounded batches, with
+    only the requested columns
+    """
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+
+    from bmi_app.core.export import export_schema, record_batches, write_export
+
+    _seed_history(db, user, 7)
+    db.commit()
+    batches = list(record_batches(db.connection(), batch_size=3))
+    assert [batch.num_rows for batch in batches] == [3, 3, 1]
+    table = pa.Table.from_batches(batches)
+    first = db.query(Measurement).order_by(Measurement.id).first()
+    row = table.slice(0, 1).to_pylist()[0]
+    assert row == {
+        "id": first.id, "user_id": user.id, "category_id": first.category_id,
+        "category": first.category.name, "height": 170.0, "height_unit": "cm",
+        "weight": 60.0, "weight_unit": "kg", "height_m": first.height_m,
+        "weight_kg": first.weight_kg, "bmi": first.bmi,
+        "recorded_at": datetime(2024, 1, 1), "notes": None,
+    }
+
+    columns = ["bmi", "recorded_at"]
+    for fmt, path in (("parquet", tmp_path / "m.parquet"), ("arrow", tmp_path / "m.arrow")):
+        rows = write_export(
+            record_batches(db.connection(), columns, end=date(2024, 1, 2), batch_size=2),
+            str(path), fmt, export_schema(columns)
+        )
+        assert rows == 4
+        written = pq.read_table(path) if fmt == "parquet" else pa.ipc.open_file(path).read_all()
+        assert written.column_names == columns
+        assert written.num_rows == 4
+
+    with pytest.raises(ValueError):
+        export_schema(["bmi", "password_hash"])
+
+
+def test_export_endpoint(api, db, user):
+    """
+    Test /measurements/export
+    """
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+
+    _seed_history(db, user, 5)
+    db.commit()
+
+    response = api.get("/measurements/export", params={"columns": ["id", "bmi"], "category_id": 2})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/vnd.apache.parquet"
+    table = pq.read_table(pa.BufferReader(response.content))
+    assert table.column_names == ["id", "bmi"]
+    assert table.num_rows == db.query(Measurement).filter(Measurement.category_id == 2).count()
+
+    response = api.get("/measurements/export", params={"format": "arrow"})
+    assert pa.ipc.open_file(pa.BufferReader(response.content)).read_all().num_rows == 5
+
+    assert api.get("/measurements/export", params={"columns": "secret"}).status_code == 422
+    assert api.get("/measurements/export", params={"format": "csv"}).status_code == 422
+
+
+def test_generated_data_is_reproducible(tmp_path):
+    """
+    The generator gives the same rows for a seed whatever the worker count
+    """
+    from sqlalchemy import create_engine
+
+    from bmi_app.core.utils import calculate_bmi, to_kg, to_meters
+    from bmi_app.scripts.generate_data import generate
+
+    dumps = []
+    for workers in (1, 2):
+        url = f"sqlite:///{tmp_path / f'generated-{workers}.db'}"
+        summary = generate(url, 20, 3000, seed=7, workers=workers, chunk_size=1000, log=lambda line: None)
+        assert (summary["users"], summary["measurements"]) == (20, 3000)
+        engine = create_engine(url)
+        with engine.connect() as conn:
+            dumps.append(conn.execute(text(
+                "SELECT id, user_id, category_id, height, height_unit, weight, weight_unit, bmi, recorded_at "
+                "FROM measurements ORDER BY id"
+            )).all())
+            assert conn.scalar(text("SELECT SUM(count) FROM user_measurement_stats")) == 3000
+        engine.dispose()
+    assert dumps[0] == dumps[1]
+
+    rows = dumps[0]
+    assert {row.height_unit for row in rows} == {"M", "CM", "IN"}
+    assert {row.weight_unit for row in rows} == {"KG", "LB"}
+    for row in rows[:200]:
+        bmi, _ = calculate_bmi(
+            to_meters(row.height, row.height_unit.lower()), to_kg(row.weight, row.weight_unit.lower())
+        )
+        assert row.bmi == pytest.approx(bmi, abs=0.01)
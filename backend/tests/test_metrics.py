@@ -0,0 +1,99 @@
+"""
+Script Name : test_metrics.py
+Description : Tests for the metrics registry and /metrics endpoint
+Author      : @tonybnya
+"""
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from bmi_app import database
+from bmi_app.core import metrics
+from bmi_app.core.config import Settings
+from bmi_app.core.metrics import (Counter, Histogram, Registry,
+                                  db_query_duration, db_query_errors,
+                                  http_request_db_queries,
+                                  http_request_duration, instrument_engine)
+
+
+def test_histogram_render():
+    registry = Registry()
+    histogram = registry.register(Histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 1)))
+    counter = registry.register(Counter("hits_total", "Hits", ("route",)))
+    for value in (0.05, 0.1, 0.5, 3):
+        histogram.observe(value, '/a"b')
+    counter.inc("/x", amount=2)
+
+    assert registry.render().splitlines() == [
+        "# HELP latency_seconds Latency",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{route="/a\\"b",le="0.1"} 2',
+        'latency_seconds_bucket{route="/a\\"b",le="1"} 3',
+        'latency_seconds_bucket{route="/a\\"b",le="+Inf"} 4',
+        'latency_seconds_sum{route="/a\\"b"} 3.65',
+        'latency_seconds_count{route="/a\\"b"} 4',
+        "# HELP hits_total Hits",
+        "# TYPE hits_total counter",
+        'hits_total{route="/x"} 2',
+    ]
+
+
+def test_metrics_endpoint(api, engine, user):
+    """
+    Requests are recorded per route template, with their SQL statements
+    """
+    instrument_engine(engine, "test")
+    route = "/measurements/users/{user_id}"
+    requests = http_request_duration.count("GET", route)
+    queries = http_request_db_queries.sum(route)
+
+    assert api.get(f"/measurements/users/{user.id}").status_code == 200
+    assert api.post("/bmi/", json={
+        "weight": 70, "weight_unit": "kg", "height": 175, "height_unit": "cm"
+    }).status_code == 200
+
+    assert http_request_duration.count("GET", route) == requests + 1
+    assert http_request_db_queries.sum(route) == queries + 1
+
+    # The app's own engines are created on first use, not at import
+    next(database.get_db()).close()
+    response = api.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert f'http_requests_total{{method="GET",route="{route}",status="200"}}' in body
+    assert 'http_request_duration_seconds_count{method="POST",route="/bmi/"}' in body
+    assert 'db_pool_connections{engine="sync",state="size"}' in body
+    assert 'cache_hit_ratio{cache="bmi"}' in body
+    assert 'db_query_duration_seconds_count{engine="test",operation="SELECT"}' in body
+
+
+def test_query_timing_counts_errors(engine):
+    """
+    Query timing is opt-in; a failing statement is counted and leaves no
+    pending start time behind
+    """
+    assert not Settings().metrics_query_timing
+    instrument_engine(engine, "failing")
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        with pytest.raises(OperationalError):
+            conn.execute(text("SELECT * FROM missing_table"))
+        assert conn.info["query_started"] == []
+    assert db_query_errors.value("failing", "SELECT") == 1
+    assert db_query_duration.count("failing", "SELECT") == 1
+
+
+def test_untimed_requests_skip_sql_series(api, user, monkeypatch):
+    """
+    Without query timing the per-request SQL series are not observed,
+    rather than reporting zero statements
+    """
+    monkeypatch.setattr(metrics, "_timed_engines", set())
+    route = "/measurements/users/{user_id}"
+    requests = http_request_duration.count("GET", route)
+    observed = http_request_db_queries.count(route)
+
+    assert api.get(f"/measurements/users/{user.id}").status_code == 200
+    assert http_request_duration.count("GET", route) == requests + 1
+    assert http_request_db_queries.count(route) == observed
@@ -0,0 +1,79 @@
+"""
+Script Name : test_profiling.py
+Description : Tests for the per-request profiling middleware
+Author      : @tonybnya
+"""
+import json
+import time
+
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+from bmi_app.core.config import Settings
+from bmi_app.core.metrics import instrument_engine
+from bmi_app.core.profiling import ProfilingMiddleware
+
+
+def spin(seconds: float) -> None:
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def make_client(engine, tmp_path, **overrides) -> TestClient:
+    instrument_engine(engine, "profiled")
+    session = sessionmaker(bind=engine)
+
+    def get_session():
+        with session() as db:
+            yield db
+
+    app = FastAPI()
+
+    @app.get("/work/{item_id}")
+    def work(item_id: int, db=Depends(get_session)):
+        spin(0.05)
+        db.execute(text("SELECT count(*) FROM categories")).scalar()
+        return {"item_id": item_id}
+
+    @app.get("/async-work")
+    async def async_work():
+        spin(0.05)
+        return {}
+
+    config = Settings(profiling_enabled=True, profile_dir=str(tmp_path), **overrides)
+    app.add_middleware(ProfilingMiddleware, config=config)
+    return TestClient(app)
+
+
+def test_profiles_requests_with_header(engine, tmp_path):
+    assert make_client(engine, tmp_path).get("/work/1", headers={"X-Profile": ""}).status_code == 200
+    client = make_client(engine, tmp_path, profile_slow_sql_ms=0, profile_token="s3cret")
+
+    assert client.get("/work/1").status_code == 200
+    assert client.get("/work/1", headers={"X-Profile": "guess"}).status_code == 200
+    assert list(tmp_path.iterdir()) == []
+
+    assert client.get("/work/1", headers={"X-Profile": "s3cret"}).status_code == 200
+    (profile,) = tmp_path.glob("*.collapsed")
+    assert "-GET-work_item_id-" in profile.name
+    lines = profile.read_text().splitlines()
+    assert sum(int(line.rsplit(" ", 1)[1]) for line in lines) > 5
+    assert any("spin (test_profiling.py" in line for line in lines)
+
+    (sql,) = tmp_path.glob("*.sql.json")
+    assert json.loads(sql.read_text())[0]["statement"] == "SELECT count(*) FROM categories"
+
+
+def test_profiles_async_endpoint_as_speedscope(engine, tmp_path):
+    client = make_client(engine, tmp_path, profile_sample_rate=1.0, profile_format="speedscope")
+
+    assert client.get("/async-work").status_code == 200
+    (profile,) = tmp_path.glob("*.speedscope.json")
+    data = json.loads(profile.read_text())
+    assert data["profiles"][0]["name"] == "GET /async-work"
+    names = [frame["name"] for frame in data["shared"]["frames"]]
+    assert any(name.startswith("spin ") for name in names)
+    assert list(tmp_path.glob("*.sql.json")) == []
@@ -0,0 +1,70 @@
+"""
+Script Name : test_server.py
+Description : Tests for the multi-process server and fork safety
+Author      : @tonybnya
+"""
+import os
+
+import pytest
+
+from bmi_app import database
+from bmi_app.core.config import Settings
+from bmi_app.database import build_async_engine, build_engine
+from bmi_app.server import Supervisor, bind_socket, worker_count
+
+
+def test_worker_count():
+    assert worker_count(Settings(workers=3)) == 3
+    assert worker_count(Settings(workers=0)) == (os.cpu_count() or 1)
+
+
+def test_supervisor_rejects_unknown_implementations():
+    with pytest.raises(ValueError):
+        Supervisor(Settings(server_loop="trio"))
+    with pytest.raises(ValueError):
+        Supervisor(Settings(server_http="h2"))
+
+
+def test_reuse_port_sockets():
+    """
+    Every worker can bind its own socket to the same port
+    """
+    first = bind_socket("127.0.0.1", 0, 16, reuse_port=True)
+    port = first.getsockname()[1]
+    second = bind_socket("127.0.0.1", port, 16, reuse_port=True)
+    assert second.getsockname()[1] == port
+    first.close()
+    second.close()
+
+
+def test_fork_drops_inherited_connections(tmp_path, monkeypatch):
+    """
+    A forked worker starts with an empty pool; the parent keeps its own
+    """
+    config = Settings(database_url=f"sqlite:///{tmp_path / 'fork.db'}")
+    engine = build_engine(config)
+    monkeypatch.setattr(database, "engine", engine, raising=False)
+    monkeypatch.setattr(database, "async_engine", build_async_engine(config), raising=False)
+    monkeypatch.setattr(database, "_connected", True)
+
+    with engine.connect() as conn:
+        conn.exec_driver_sql("SELECT 1")
+    assert engine.pool.checkedin() == 1
+
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.write(write_fd, str(engine.pool.checkedin()).encode())
+        finally:
+            os._exit(0)
+    os.close(write_fd)
+    child_checkedin = os.read(read_fd, 16)
+    os.close(read_fd)
+    os.waitpid(pid, 0)
+
+    assert child_checkedin == b"0"
+    assert engine.pool.checkedin() == 1
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT 1").scalar() == 1
+    engine.dispose()
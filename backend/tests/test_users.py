@@ -3,3 +3,159 @@ Script Name : test_users.py
 Description : Tests for user-related features
 Author      : @tonybnya
 """
+from datetime import datetime
+
+from sqlalchemy import event, insert
+
+from bmi_app.core.cache import BloomFilter
+from bmi_app.core.config import get_settings
+from bmi_app.core.user_index import UserIndex
+from bmi_app.crud.analytics import rebuild_histogram
+from bmi_app.crud.measurements import create_measurement
+from bmi_app.crud.stats import rebuild_user_stats
+from bmi_app.crud.trends import rebuild_rollups
+from bmi_app.crud.users import (create_user, delete_user,
+                                delete_user_returning, delete_users,
+                                get_user_by_email, get_user_by_username,
+                                update_user, update_user_returning,
+                                update_users, user_exists)
+from bmi_app.models import (BMIHistogramBin, HeightUnit, Measurement,
+                            MeasurementRollup, User, UserCategoryCount,
+                            UserMeasurementStats, WeightUnit)
+
+
+def test_bloom_filter():
+    """
+    No false negatives, false positives near the configured rate
+    """
+    bloom = BloomFilter(10000, error_rate=0.01)
+    for i in range(10000):
+        bloom.add(f"member{i}")
+    assert all(f"member{i}" in bloom for i in range(10000))
+    false_positives = sum(f"other{i}" in bloom for i in range(10000))
+    assert false_positives < 200
+
+
+def test_user_lookups(db):
+    """
+    Lookups stay right across create, update and delete
+    """
+    bob = create_user(db, "bob", "bob@example.com", "x")
+    assert get_user_by_email(db, "bob@example.com") is bob
+    assert get_user_by_username(db, "bob") is bob
+    assert get_user_by_email(db, "nobody@example.com") is None
+    assert user_exists(db, username="bob")
+    assert user_exists(db, username="carol", email="bob@example.com")
+    assert not user_exists(db, username="carol", email="carol@example.com")
+
+    update_user(db, bob.id, username="robert", email="robert@example.com")
+    assert get_user_by_username(db, "bob") is None
+    assert get_user_by_email(db, "bob@example.com") is None
+    assert get_user_by_username(db, "robert") is bob
+    assert user_exists(db, email="robert@example.com")
+
+    create_user(db, "bob", "bob@example.com", "x")
+    assert get_user_by_username(db, "bob").id != bob.id
+
+    delete_user(db, bob.id)
+    assert get_user_by_email(db, "robert@example.com") is None
+    assert not user_exists(db, username="robert")
+
+
+def test_returning_writes_keep_lookups(queries, db, user):
+    """
+    UPDATE/DELETE ... RETURNING writes are single statements and keep
+    the lookups right
+    """
+    carol = create_user(db, "carol", "carol@example.com", "x")
+    user_id, carol_id = user.id, carol.id
+    assert get_user_by_username(db, "alice").id == user_id
+
+    with queries.assert_count(1):
+        row = update_user_returning(db, user_id, username="alicia")
+    assert (row.id, row.username, row.email) == (user_id, "alicia", "alice@example.com")
+    assert update_user_returning(db, "missing", username="x") is None
+    assert get_user_by_username(db, "alice") is None
+    assert get_user_by_username(db, "alicia").id == user_id
+
+    rows = update_users(db, [user_id, carol_id, "missing"], password_hash="y")
+    assert sorted(row.id for row in rows) == sorted([user_id, carol_id])
+    assert {row.password_hash for row in rows} == {"y"}
+
+    assert delete_user_returning(db, carol_id)
+    assert not delete_user_returning(db, carol_id)
+    assert not user_exists(db, username="carol", email="carol@example.com")
+    assert delete_users(db, [user_id, "missing"]) == [user_id]
+    assert get_user_by_email(db, "alice@example.com") is None
+    assert not user_exists(db, username="alicia")
+
+
+def test_delete_users_with_measurements(db, user, monkeypatch):
+    """
+    Deleting users deletes their measurements and keeps the derived
+    tables equal to a rebuild
+    """
+    monkeypatch.setattr(get_settings(), "measurement_rollups", True)
+    monkeypatch.setattr(get_settings(), "measurement_analytics", True)
+    carol = create_user(db, "carol", "carol@example.com", "x")
+    user_id, carol_id = user.id, carol.id
+    for i in range(6):
+        create_measurement(db, {
+            "user_id": (user_id, carol_id)[i % 2], "category_id": 1 + i % 3,
+            "height": 1.0, "height_unit": HeightUnit.M, "weight": 20.0 + i, "weight_unit": WeightUnit.KG,
+            "height_m": 1.0, "weight_kg": 20.0 + i, "bmi": 20.0 + i, "recorded_at": datetime(2024, 1, 1 + i),
+        })
+
+    assert len(carol.measurements) == 3
+    assert delete_user(db, carol_id)
+    assert db.query(Measurement).filter(Measurement.user_id == carol_id).count() == 0
+
+    def tables():
+        return [
+            sorted(tuple(getattr(row, column.key) for column in model.__table__.c)
+                   for row in db.query(model) if getattr(row, "count", 1) > 0)
+            for model in (UserMeasurementStats, UserCategoryCount, MeasurementRollup, BMIHistogramBin)
+        ]
+
+    maintained = tables()
+    for model in (UserMeasurementStats, UserCategoryCount, MeasurementRollup):
+        assert db.query(model).filter(model.user_id == carol_id).count() == 0
+    rebuild_user_stats(db)
+    rebuild_rollups(db)
+    rebuild_histogram(db)
+    assert tables() == maintained
+
+    assert delete_users(db, [user_id]) == [user_id]
+    assert db.query(Measurement).count() == 0
+    assert not any(tables())
+
+def test_negative_lookups_skip_queries(engine, db, user):
+    """
+    Once the filter is built, absent names are answered without SQL
+    """
+    queries = []
+    event.listen(engine, "before_cursor_execute", lambda *args: queries.append(args[2]))
+    assert user_exists(db, email=user.email)
+    queries.clear()
+
+    assert not any(user_exists(db, username=f"free{i}", email=f"free{i}@example.com") for i in range(100))
+    assert get_user_by_email(db, "free@example.com") is None
+    assert queries == []
+
+
+def test_user_index_sees_other_writers(db, user):
+    """
+    Users inserted behind the index's back show up after a refresh
+    """
+    now = [0.0]
+    index = UserIndex(100, refresh_seconds=1.0, rebuild_seconds=60.0, clock=lambda: now[0])
+    assert index.user_id_for(db, "username", "dave") is None
+
+    db.execute(insert(User), [{"id": "dave-id", "username": "dave", "email": "dave@example.com", "password_hash": "x"}])
+    db.commit()
+    assert index.user_id_for(db, "username", "dave") is None
+
+    now[0] = 1.5
+    assert index.user_id_for(db, "username", "dave") == "dave-id"
+    assert index.user_id_for(db, "email", "dave@example.com") == "dave-id"
+    assert index.user_id_for(db, "email", user.email) == user.id
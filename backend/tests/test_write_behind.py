@@ -0,0 +1,176 @@
+"""
+Script Name : test_write_behind.py
+Description : Tests for the write-behind measurement queue
+Author      : @tonybnya
+"""
+import subprocess
+import sys
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from bmi_app.core import write_behind
+from bmi_app.core.config import get_settings
+from bmi_app.core.write_behind import (MeasurementWriter, QueueFull,
+                                      WriterStopped)
+from bmi_app.crud.measurements import (get_user_measurement_stats,
+                                       prepare_measurement)
+from bmi_app.models import Measurement
+
+
+def _values(db, user, weight=70.0, user_id=None):
+    return prepare_measurement(db, {
+        "user_id": user_id or user.id, "height": 175, "height_unit": "cm",
+        "weight": weight, "weight_unit": "kg",
+    })
+
+
+def test_group_commit(engine, db, user, tmp_path):
+    """
+    Queued measurements are written in groups, with the derived tables
+    """
+    writer = MeasurementWriter(
+        sessionmaker(bind=engine), batch_size=50, max_delay=5.0,
+        spool_path=str(tmp_path / "spool.ndjson")
+    )
+    flushes = write_behind.write_behind_flush_rows.count()
+    provisional = [writer.submit(_values(db, user, 50 + i % 40)) for i in range(120)]
+    stranger = writer.submit(_values(db, user, user_id="nobody"))
+    writer.start()
+    writer.stop()
+
+    assert write_behind.write_behind_flush_rows.count() - flushes == 3
+    assert db.query(Measurement).count() == 120
+    assert get_user_measurement_stats(db, user.id)["count"] == 120
+    ids = [writer.status(provisional_id)["id"] for provisional_id in provisional]
+    assert sorted(ids) == [row.id for row in db.query(Measurement).order_by(Measurement.id)]
+    assert writer.status(stranger)["status"] == "rejected"
+    assert not (tmp_path / "spool.ndjson").exists()
+
+
+def test_backpressure(db, user, tmp_path):
+    """
+    A full queue refuses measurements once the put timeout is over
+    """
+    writer = MeasurementWriter(lambda: None, queue_size=2, spool_path=str(tmp_path / "spool.ndjson"))
+    writer.submit(_values(db, user))
+    writer.submit(_values(db, user))
+    with pytest.raises(QueueFull):
+        writer.submit(_values(db, user), timeout=0.01)
+
+
+def test_spill_and_replay(engine, db, user, tmp_path):
+    """
+    Rows still queued at shutdown are spooled, then written by the next writer
+    """
+    spool = tmp_path / "spool.ndjson"
+    stopped = MeasurementWriter(lambda: None, spool_path=str(spool))
+    provisional_id = stopped.submit(_values(db, user, 80.0))
+    stopped.stop()
+    assert stopped.status(provisional_id)["status"] == "spilled"
+    assert spool.exists()
+    with pytest.raises(WriterStopped):
+        stopped.submit(_values(db, user))
+
+    writer = MeasurementWriter(sessionmaker(bind=engine), spool_path=str(spool))
+    writer.start()
+    writer.stop()
+    assert writer.status(provisional_id)["status"] == "written"
+    assert [row.weight for row in db.query(Measurement)] == [80.0]
+    assert not spool.exists()
+
+
+def test_replay_failure_is_quarantined(db, user, tmp_path, monkeypatch):
+    """
+    Spilled rows that fail again on replay are set aside, not spilled
+    back to be retried at every start
+    """
+    monkeypatch.setattr(write_behind, "RETRY_DELAY", 0.0)
+    spool = tmp_path / "spool.ndjson"
+    stopped = MeasurementWriter(lambda: None, spool_path=str(spool))
+    provisional_id = stopped.submit(_values(db, user))
+    stopped.stop()
+
+    # No tables: every commit fails
+    broken = create_engine("sqlite://")
+    writer = MeasurementWriter(sessionmaker(bind=broken), spool_path=str(spool))
+    writer.start()
+    writer.stop()
+    broken.dispose()
+    assert writer.status(provisional_id)["status"] == "quarantined"
+    assert not spool.exists()
+    assert len((tmp_path / "spool.ndjson.failed").read_text().splitlines()) == 1
+
+
+def test_stop_past_drain_timeout_spills_without_writing(db, user, tmp_path):
+    """
+    Once the drain timeout is over the writer makes no further attempt:
+    the queued rows are spilled
+    """
+    broken = create_engine("sqlite://")
+    sessions = []
+
+    def session_factory():
+        sessions.append(None)
+        return sessionmaker(bind=broken)()
+
+    spool = tmp_path / "spool.ndjson"
+    writer = MeasurementWriter(session_factory, batch_size=1, drain_timeout=0.1, spool_path=str(spool))
+    provisional = [writer.submit(_values(db, user)) for _ in range(20)]
+    writer.start()
+    writer.stop()
+    broken.dispose()
+    assert len(sessions) <= 2
+    assert {writer.status(provisional_id)["status"] for provisional_id in provisional} == {"spilled"}
+    assert len(spool.read_text().splitlines()) == 20
+
+
+def test_interrupted_replay_is_taken_over(engine, db, user, tmp_path):
+    """
+    The replay file of a process that died replaying is replayed by the
+    next writer
+    """
+    spool = tmp_path / "spool.ndjson"
+    stopped = MeasurementWriter(lambda: None, spool_path=str(spool))
+    provisional_id = stopped.submit(_values(db, user, 80.0))
+    stopped.stop()
+    dead = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+    spool.rename(f"{spool}.{dead.pid}.replay")
+
+    writer = MeasurementWriter(sessionmaker(bind=engine), spool_path=str(spool))
+    writer.start()
+    writer.stop()
+    assert writer.status(provisional_id)["status"] == "written"
+    assert [row.weight for row in db.query(Measurement)] == [80.0]
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_create_measurement_endpoint(api, db, user, engine, tmp_path, monkeypatch):
+    """
+    Test POST /measurements/, synchronous and write-behind
+    """
+    body = {"user_id": user.id, "height": 175, "height_unit": "cm", "weight": 70, "weight_unit": "kg"}
+    response = api.post("/measurements/", json=body)
+    assert response.status_code == 201
+    assert response.json()["bmi"] == 22.86
+    assert api.post("/measurements/", json={**body, "user_id": "nobody"}).status_code == 404
+
+    monkeypatch.setattr(get_settings(), "measurement_write_behind", True)
+    monkeypatch.setattr(get_settings(), "write_behind_spool_path", str(tmp_path / "spool.ndjson"))
+    assert api.post("/measurements/", json=body).status_code == 503
+
+    writer = write_behind.start_writer(get_settings(), sessionmaker(bind=engine))
+    try:
+        response = api.post("/measurements/", json=body)
+        assert response.status_code == 202
+        provisional_id = response.json()["provisional_id"]
+        writer.stop()
+
+        status = api.get(f"/measurements/pending/{provisional_id}").json()
+        assert status["status"] == "written"
+        assert api.get(f"/measurements/users/{user.id}/latest").json()["id"] == status["id"]
+        assert api.get("/measurements/pending/unknown").status_code == 404
+    finally:
+        write_behind.stop_writer()